@@ -0,0 +1,242 @@
+#!/usr/bin/env python
+#-*- coding: utf-8 -*-
+#FILE: bench_engine.py
+#CREATE_TIME: 2026-10-18
+#AUTHOR: Sancho
+"""
+引擎热路径基准测试
+用合成行情驱动离线回放API，不需要登录天勤
+
+测量:
+* 每秒处理的更新数、每次更新的耗时分位数
+* 策略调度开销(`Dispatcher.dispatch`)
+* 订阅和创建策略(`Engine.setup`)的启动耗时
+* 每个合约占用的内存
+
+运行: `python bench_engine.py --symbols 1 10 100 500 --strategies 1 10 50`
+结果写入json文件，`--compare`与之前的结果对比
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import List
+import numpy as np
+
+sys.path.insert(
+    0,
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), '..',
+                 'quantitative_trading'))
+from main import Engine
+from monitor import Monitor
+from recorder import Store
+from utils import NS, parse_datetime
+
+DURATION = 20  # K线周期
+START = '2022-09-23 09:00:00'
+
+
+class Bench(Monitor):
+    """基准策略：读取最新价和最新K线，不下单"""
+    INPUTS = {'quote': 'last_price', 'kline': None}
+    SLOT = 0  # 同一合约的多个基准策略按参数区分
+
+    def execution(self):
+        if self.changed(self.quote, 'last_price'):
+            self.last_price = self.quote['last_price']
+        return 0
+
+
+def make_feed(root: str, symbols: int, bars: int, stagger: bool) -> List[str]:
+    """
+    生成合成K线，写入行情录制格式的目录
+
+    Args:
+        stagger: 各合约的K线时间错开，每次更新只有一个合约变化 \n
+    """
+    store = Store(root)
+    rng = np.random.default_rng(0)
+    t0 = parse_datetime(START)
+    names = [f'BENCH.s{i}' for i in range(symbols)]
+    for i, symbol in enumerate(names):
+        offset = i * DURATION * NS // symbols if stagger else 0
+        close = np.cumsum(rng.normal(0, 1, bars)) + 1000
+        rows = [(t0 + offset + j * DURATION * NS, j, close[j], close[j] + 1,
+                 close[j] - 1, close[j], 1.0, 0.0, 0.0) for j in range(bars)]
+        store.append(f'kline_{DURATION}', symbol, rows)
+    return names
+
+
+def percentiles(samples: List[float]) -> dict:
+    a = np.asarray(samples) * 1e6  # 微秒
+    if not len(a):
+        return {}
+    ps = {f'p{p}_us': float(np.percentile(a, p)) for p in (50, 90, 99)}
+    return {**ps, 'max_us': float(a.max()), 'mean_us': float(a.mean())}
+
+
+def bench(symbols: int, strategies: int, bars: int, data_length: int,
+          stagger: bool) -> dict:
+    """运行一组基准，`strategies`为每个合约的策略数量"""
+    root = tempfile.mkdtemp(prefix='bench_')
+    try:
+        names = make_feed(root, symbols, bars, stagger)
+        config = dict(tq_username='',
+                      tq_password='',
+                      type='replay',
+                      gui=False,
+                      balance=9999999,
+                      accounts=None,
+                      quotes=names,
+                      klines={s: [DURATION, data_length]
+                              for s in names},
+                      merge=False,
+                      strategies=[{
+                          f'{__name__}:Bench': {
+                              'SLOT': i
+                          }
+                      } for i in range(strategies)],
+                      replay=dict(path=root, speed=0))
+        # 订阅、创建策略的启动耗时和内存，与`Engine.run`相同经过`setup`
+        tracemalloc.start()
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            engine = Engine(config)
+            engine.setup()
+        startup = time.perf_counter() - start
+        memory = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        assert len(engine.strategies) == symbols * strategies
+
+        # 调度耗时
+        dispatch_samples = []
+        _dispatch = engine.dispatcher.dispatch
+
+        def dispatch():
+            t = time.perf_counter()
+            result = _dispatch()
+            dispatch_samples.append(time.perf_counter() - t)
+            return result
+
+        engine.dispatcher.dispatch = dispatch
+
+        api = engine.tq.api
+        wait_samples, step_samples = [], []
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            while True:
+                t0 = time.perf_counter()
+                if not api.wait_update():
+                    break
+                t1 = time.perf_counter()
+                engine.step()
+                t2 = time.perf_counter()
+                wait_samples.append(t1 - t0)
+                step_samples.append(t2 - t1)
+            engine._close()
+        elapsed = time.perf_counter() - start
+        updates = len(step_samples)
+        return {
+            'symbols':
+            symbols,
+            'strategies_per_symbol':
+            strategies,
+            'bars':
+            bars,
+            'updates':
+            updates,
+            'updates_per_sec':
+            updates / elapsed if elapsed else 0.0,
+            'engine_updates_per_sec':
+            updates / sum(step_samples) if step_samples else 0.0,
+            'step':
+            percentiles(step_samples),
+            'wait_update':
+            percentiles(wait_samples),
+            'dispatch':
+            percentiles(dispatch_samples),
+            'dispatch_share':
+            sum(dispatch_samples) / sum(step_samples) if step_samples else 0.0,
+            'startup_sec':
+            startup,
+            'memory_per_symbol_kb':
+            memory / symbols / 1024,
+        }
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+
+def compare(old: dict, new: dict) -> None:
+    """对比两次结果中相同规模的吞吐量和p99耗时"""
+    index = {(r['symbols'], r['strategies_per_symbol']): r
+             for r in old['results']}
+    for r in new['results']:
+        key = (r['symbols'], r['strategies_per_symbol'])
+        if key not in index:
+            continue
+        o = index[key]
+        print(
+            f'symbols={key[0]:<4} strategies={key[1]:<3} '
+            f'updates/s {o["engine_updates_per_sec"]:>10.0f} -> '
+            f'{r["engine_updates_per_sec"]:>10.0f} '
+            f'({r["engine_updates_per_sec"] / o["engine_updates_per_sec"] - 1:+.1%}), '
+            f'step p99 {o["step"]["p99_us"]:.1f}us -> {r["step"]["p99_us"]:.1f}us'
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='引擎热路径基准测试')
+    parser.add_argument('--symbols',
+                        type=int,
+                        nargs='+',
+                        default=[1, 10, 100, 500])
+    parser.add_argument('--strategies',
+                        type=int,
+                        nargs='+',
+                        default=[1, 10, 50],
+                        help='每个合约的策略数量')
+    parser.add_argument('--bars', type=int, default=200, help='每个合约的K线数量')
+    parser.add_argument('--data-length', type=int, default=200, help='K线序列长度')
+    parser.add_argument('--no-stagger', action='store_true', help='所有合约同时更新')
+    parser.add_argument('--out', default=None, help='结果文件，默认results/时间.json')
+    parser.add_argument('--compare', default=None, help='对比的历史结果文件')
+    args = parser.parse_args()
+
+    results = []
+    for symbols in args.symbols:
+        for strategies in args.strategies:
+            r = bench(symbols, strategies, args.bars, args.data_length,
+                      not args.no_stagger)
+            results.append(r)
+            print(f'symbols={symbols:<4} strategies={strategies:<3} '
+                  f'updates/s={r["engine_updates_per_sec"]:>10.0f} '
+                  f'step p50={r["step"]["p50_us"]:.1f}us '
+                  f'p99={r["step"]["p99_us"]:.1f}us '
+                  f'dispatch={r["dispatch_share"]:.0%} '
+                  f'startup={r["startup_sec"]:.3f}s '
+                  f'mem/symbol={r["memory_per_symbol_kb"]:.1f}KB')
+    out = args.out or os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                   'results',
+                                   time.strftime('%Y%m%d_%H%M%S') + '.json')
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    report = {
+        'time': time.strftime('%Y-%m-%d %H:%M:%S'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'args': vars(args),
+        'results': results,
+    }
+    with open(out, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f'结果已写入: {out}')
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            compare(json.load(f), report)
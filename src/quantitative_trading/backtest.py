@@ -0,0 +1,228 @@
+#!/usr/bin/env python
+#-*- coding: utf-8 -*-
+#FILE: backtest.py
+#CREATE_TIME: 2026-10-18
+#AUTHOR: Sancho
+"""
+向量化回测
+从本地K线文件离线加载数据，不经过`wait_update()`，批量模拟目标持仓成交
+"""
+
+import csv
+import math
+import os
+from typing import Dict
+import numpy as np
+import pandas
+from utils import CST, DAY, NIGHT, _trading_day
+
+COLUMNS = ('datetime', 'id', 'open', 'high', 'low', 'close', 'volume')
+TRADING_DAYS = 252  # 每年交易日数
+
+
+def load_klines(path: str) -> Dict[str, np.ndarray]:
+    """
+    加载本地K线文件，返回`{字段: ndarray}`
+
+    Args:
+        path: `.npz`文件(每个字段一个数组)、天勤`DataDownloader`导出的`.csv`文件，
+            或行情录制目录如`./data/kline_20/KQ.m@DCE.a` \n
+    """
+    if os.path.isdir(path):
+        from recorder import Store
+        path = os.path.normpath(path)
+        kind_path, symbol = os.path.split(path)
+        root, kind = os.path.split(kind_path)
+        data = Store(root).read(kind, symbol)
+    elif path.endswith('.npz'):
+        with np.load(path) as f:
+            data = {k: f[k] for k in f.files}
+    elif path.endswith('.csv'):
+        with open(path, 'r', encoding='utf-8') as f:
+            rows = list(csv.reader(f))
+        # `SHFE.rb2110.close`形式的表头只保留字段名
+        header = [h.rsplit('.', 1)[-1] for h in rows[0]]
+        cols = list(zip(*rows[1:]))
+        data = {}
+        for name, col in zip(header, cols):
+            if name == 'datetime':
+                # 北京时间转换为与天勤一致的UTC纳秒时间戳
+                data[name] = np.array(col, dtype='datetime64[ns]').astype(
+                    np.int64) - 8 * 3600 * 10**9
+            elif name in COLUMNS or name in ('open_oi', 'close_oi'):
+                data[name] = np.array(col, dtype=np.float64)
+    else:
+        raise ValueError(f'不支持的K线文件: {path}')
+    if 'id' not in data:
+        data['id'] = np.arange(len(data['close']), dtype=np.float64)
+    return data
+
+
+def annual_bars(times: np.ndarray) -> float:
+    """按每个交易日的平均K线数估计每年的K线数，非交易时段不计入"""
+    if not len(times):
+        return 0.0
+    ns = np.asarray(times).astype(np.int64) + CST
+    days = ns // DAY + (ns % DAY >= NIGHT)
+    count = len({_trading_day(int(d)) for d in np.unique(days)})
+    return len(times) / count * TRADING_DAYS
+
+
+def rolling_max(x: np.ndarray, n: int) -> np.ndarray:
+    """截至每根K线(含)的N根K线最大值，不足N根时取已有数据"""
+    pad = np.concatenate([np.full(n - 1, -np.inf), x])
+    return np.lib.stride_tricks.sliding_window_view(pad, n).max(axis=1)
+
+
+def rolling_min(x: np.ndarray, n: int) -> np.ndarray:
+    """截至每根K线(含)的N根K线最小值，不足N根时取已有数据"""
+    pad = np.concatenate([np.full(n - 1, np.inf), x])
+    return np.lib.stride_tricks.sliding_window_view(pad, n).min(axis=1)
+
+
+def shift(x: np.ndarray, n: int = 1) -> np.ndarray:
+    """序列后移n根K线，前n个值为`nan`"""
+    if n == 0:
+        return np.asarray(x, dtype=float).copy()
+    out = np.full(len(x), np.nan)
+    out[n:] = x[:-n]
+    return out
+
+
+class Backtest:
+    def __init__(self,
+                 data: Dict[str, np.ndarray],
+                 volume_multiple: float = 1,
+                 fee: float = 0,
+                 slippage: float = 0,
+                 bars_per_year: float = None) -> None:
+        """
+        向量化回测
+
+        Args:
+            data: K线列数组，参考`load_klines` \n
+            volume_multiple: 合约乘数 \n
+            fee: 每手手续费 \n
+            slippage: 每手成交滑点(价格) \n
+            bars_per_year: 每年K线数，用于年化夏普比率，默认按`datetime`估计 \n
+        """
+        self.data = data
+        self.volume_multiple = volume_multiple
+        self.fee = fee
+        self.slippage = slippage
+        if not bars_per_year:
+            if 'datetime' not in data:
+                raise ValueError('K线缺少datetime，需指定bars_per_year')
+            bars_per_year = annual_bars(data['datetime'])
+        self.bars_per_year = bars_per_year
+
+    def run(self, strategy, **params) -> dict:
+        """
+        运行策略的向量化信号，返回回测结果
+        策略的`signals(data, **params)`类方法返回每根K线收盘时的目标持仓，
+        `nan`表示不调整持仓，可参考`DualThrust.signals`
+
+        Args:
+            strategy: `Monitor`子类，需实现`signals`类方法 \n
+            params: 覆盖策略的类属性参数 \n
+        """
+        if not callable(getattr(strategy, 'signals', None)):
+            raise ValueError(f'{strategy.__name__}未实现向量化信号`signals`')
+        return self.simulate(strategy.signals(self.data, **params))
+
+    def simulate(self, target: np.ndarray) -> dict:
+        """
+        以K线收盘价批量成交目标持仓
+
+        Args:
+            target: 每根K线的目标持仓，`nan`表示不调整 \n
+        """
+        close = self.data['close']
+        # 目标持仓向后填充即为持仓
+        idx = np.where(np.isnan(target), 0, np.arange(len(target)))
+        np.maximum.accumulate(idx, out=idx)
+        position = np.nan_to_num(target[idx], nan=0.0)
+        trades = np.diff(position, prepend=0.0)
+        volume = np.abs(trades)
+        # 持仓盈亏 + 成交成本
+        pnl = np.zeros(len(close))
+        pnl[1:] = position[:-1] * np.diff(close)
+        pnl *= self.volume_multiple
+        cost = volume * (self.fee + self.slippage * self.volume_multiple)
+        equity = np.cumsum(pnl - cost)
+        drawdown = np.maximum.accumulate(np.maximum(equity, 0)) - equity
+        net = pnl - cost
+        std = net.std()
+        return {
+            'pnl':
+            float(equity[-1]) if len(equity) else 0.0,
+            'trades':
+            int(np.count_nonzero(trades)),
+            'volume':
+            float(volume.sum()),
+            'cost':
+            float(cost.sum()),
+            'max_drawdown':
+            float(drawdown.max()) if len(equity) else 0.0,
+            # 每根K线收益的夏普比率按每年K线数年化
+            'sharpe':
+            float(net.mean() / std *
+                  math.sqrt(self.bars_per_year)) if std > 0 else 0.0,
+            'position':
+            position,
+            'equity':
+            equity,
+        }
+
+    def event_targets(self,
+                      strategy,
+                      data_length: int = 200,
+                      **params) -> np.ndarray:
+        """
+        逐根K线调用`Monitor.execution`得到目标持仓，用于核对向量化信号
+
+        Args:
+            strategy: `Monitor`子类 \n
+            data_length: 传给策略的K线序列长度 \n
+            params: 覆盖策略的类属性参数 \n
+        """
+        cols = [c for c in COLUMNS if c in self.data]
+        # 与`get_kline_serial`一致：定长序列，数据不足时以`nan`补齐
+        arrays = {
+            c: np.concatenate(
+                [np.full(data_length - 1, np.nan), self.data[c].astype(float)])
+            for c in cols
+        }
+        stacked = np.column_stack([arrays[c] for c in cols])
+        # 与天勤一致：原地更新序列底层的数组
+        buf = stacked[:data_length].copy()
+        kline = pandas.DataFrame(buf, columns=cols, copy=False)
+        quote = {'last_price': math.nan}
+        s = strategy(**params)
+        s.init(_BarApi(), None, None, None, quote, kline, None)
+        target = np.full(len(self.data['close']), np.nan)
+        for i in range(len(target)):
+            buf[:] = stacked[i:i + data_length]
+            quote['last_price'] = self.data['close'][i]
+            if volume := s.execution():
+                target[i] = volume
+        return target
+
+
+class _BarApi:
+    """逐根K线核对时使用，每根K线所有行情都视为已更新"""
+    def is_changing(self, obj, key=None) -> bool:
+        return True
+
+
+if __name__ == "__main__":
+    from main import Engine
+    import monitor
+    config = Engine.get_config()['backtest']
+    bt = Backtest(load_klines(config['data']),
+                  config['volume_multiple'], config['fee'], config['slippage'],
+                  config.get('bars_per_year'))
+    result = bt.run(getattr(monitor, config['strategy']))
+    for k, v in result.items():
+        if not isinstance(v, np.ndarray):
+            print(f'{k}: {v}')
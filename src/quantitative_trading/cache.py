@@ -0,0 +1,294 @@
+#!/usr/bin/env python
+#-*- coding: utf-8 -*-
+#FILE: cache.py
+#CREATE_TIME: 2026-10-18
+#AUTHOR: Sancho
+"""
+因子/指标计算结果的磁盘缓存
+结果按(合约, 周期, 数据起点, 函数, 参数)索引，存储为内存映射的定长类型文件，
+数据追加新的K线后只计算新增部分，总大小超过上限时淘汰最久未使用的结果
+
+* 函数标识包括函数本身和它调用的项目内函数的源码，修改其中任何一个后重新计算
+* 元数据记录已缓存部分数据的摘要，数据修正或重新下载后重新计算
+
+目录结构: {root}/{key}.bin(数据，时间在第一维) + {key}.json(元数据)
+"""
+
+import hashlib
+import inspect
+import json
+import os
+import sysconfig
+from types import CodeType
+from typing import Callable, Dict, List, Union
+import numpy as np
+
+# 标准库和第三方库的目录，其中的函数不计入函数标识
+_EXTERNAL = tuple({
+    sysconfig.get_paths()[k]
+    for k in ('stdlib', 'platstdlib', 'purelib', 'platlib')
+})
+_SIMPLE = (int, float, str, bool, tuple, type(None))
+
+
+def _names(code: CodeType) -> List[str]:
+    """代码(含嵌套的函数、lambda)中引用的全局名称"""
+    names = list(code.co_names)
+    for const in code.co_consts:
+        if isinstance(const, CodeType):
+            names += _names(const)
+    return names
+
+
+def _sources(fn: Callable, seen: set) -> List[str]:
+    """函数及其通过全局名称、闭包引用的项目内函数的源码、默认参数和闭包中的简单值"""
+    seen.add(fn)
+    try:
+        source = inspect.getsource(fn)
+    except (OSError, TypeError):
+        code = getattr(fn, '__code__', None)
+        source = code.co_code.hex() if code else repr(fn)
+    parts = [
+        source,
+        repr(getattr(fn, '__defaults__', None)),
+        repr(getattr(fn, '__kwdefaults__', None))
+    ]
+    code = getattr(fn, '__code__', None)
+    if code is None:
+        return parts
+    refs = [fn.__globals__.get(name) for name in _names(code)]
+    for cell in fn.__closure__ or ():
+        try:
+            value = cell.cell_contents
+        except ValueError:  # 尚未赋值的闭包变量
+            continue
+        if isinstance(value, _SIMPLE):
+            parts.append(repr(value))
+        refs.append(value)
+    for ref in refs:
+        if (inspect.isfunction(ref) and ref not in seen
+                and not ref.__code__.co_filename.startswith(_EXTERNAL)):
+            parts += _sources(ref, seen)
+    return parts
+
+
+def fn_id(fn: Callable) -> str:
+    """
+    函数标识：模块名、限定名，以及函数和它调用的项目内函数的源码、默认参数，
+    修改其中任何一个后缓存失效
+    """
+    text = '\0'.join(_sources(fn, set()))
+    return (f'{getattr(fn, "__module__", "")}.'
+            f'{getattr(fn, "__qualname__", repr(fn))}:'
+            f'{hashlib.sha1(text.encode()).hexdigest()}')
+
+
+def digest(data: Dict[str, np.ndarray], length: int, rows: int) -> str:
+    """数据前`rows`个时间点的摘要，长度不同的数组(如常量)整体计入"""
+    h = hashlib.blake2b(digest_size=16)
+    for k in sorted(data):
+        v = data[k]
+        h.update(k.encode())
+        if isinstance(v, np.ndarray):
+            if v.ndim and v.shape[-1] == length:
+                v = v[..., :rows]
+            h.update(str(v.dtype).encode())
+            h.update(np.ascontiguousarray(v).tobytes())
+        else:
+            h.update(repr(v).encode())
+    return h.hexdigest()
+
+
+def _slice(data: Dict[str, np.ndarray], length: int,
+           start: int) -> Dict[str, np.ndarray]:
+    """截取时间轴(最后一维)从`start`开始的部分，长度不同的数组(如常量)保持不变"""
+    return {
+        k: v[..., start:]
+        if isinstance(v, np.ndarray) and v.ndim and v.shape[-1] == length
+        else v
+        for k, v in data.items()
+    }
+
+
+class Cache:
+    def __init__(self, root: str = './cache', max_size: float = 1024) -> None:
+        """
+        Args:
+            root: 缓存目录 \n
+            max_size: 缓存总大小上限(MB) \n
+
+        Example:
+            cache = Cache('./cache')
+            data = Store('./data').read('kline_60', 'KQ.m@DCE.a')
+            mom = cache.call(lambda d, n: d['close'] / shift(d['close'], n) - 1,
+                             data, 'KQ.m@DCE.a', 60, lookback=20, n=20)
+        """
+        self.root = root
+        self.max_bytes = int(max_size * 1024 * 1024)
+        os.makedirs(root, exist_ok=True)
+        self.hits, self.misses, self.appends = 0, 0, 0
+
+    def key(self, symbol: str, period: Union[int, str], start: int,
+            fn: Callable, params: dict) -> str:
+        text = json.dumps(
+            [symbol, str(period), int(start), fn_id(fn), params],
+            sort_keys=True,
+            default=repr)
+        return hashlib.sha1(text.encode()).hexdigest()
+
+    def _path(self, key: str, ext: str) -> str:
+        return os.path.join(self.root, f'{key}.{ext}')
+
+    def _load_meta(self, key: str) -> Union[dict, None]:
+        try:
+            with open(self._path(key, 'json'), encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _save_meta(self, key: str, meta: dict) -> None:
+        tmp = self._path(key, 'json.tmp')
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(meta, f)
+        os.replace(tmp, self._path(key, 'json'))
+
+    def _open(self, meta: dict, key: str) -> np.ndarray:
+        """内存映射的结果，时间轴移回最后一维"""
+        shape = (meta['rows'], ) + tuple(meta['shape'])
+        if not meta['rows']:
+            arr = np.empty(shape, meta['dtype'])
+        else:
+            arr = np.memmap(self._path(key, 'bin'), meta['dtype'], 'r',
+                            shape=shape)
+        return np.moveaxis(arr, 0, -1)
+
+    # |-------------------- 读写 --------------------|
+
+    def call(self,
+             fn: Callable,
+             data: Dict[str, np.ndarray],
+             symbol: str,
+             period: Union[int, str],
+             lookback: int = None,
+             **params) -> np.ndarray:
+        """
+        返回`fn(data, **params)`，优先读取缓存
+
+        Args:
+            fn: 计算函数，返回以时间为最后一维的数组，时间长度与`data['datetime']`相同 \n
+            data: 列数组，必须包含`datetime`，如`Store.read`的返回值 \n
+            symbol: 合约(或合约组合)标识 \n
+            period: 周期，如`60`或`kline_60` \n
+            lookback: 计算每个时间点需要的历史K线数，`None`表示不支持增量计算，
+                数据变化时全部重新计算 \n
+            params: 传给`fn`的参数，同时作为缓存的键 \n
+
+        Returns:
+            只读数组(内存映射)
+        """
+        times = np.asarray(data['datetime'])
+        length = len(times)
+        if not length:
+            return fn(data, **params)
+        key = self.key(symbol, period, times[0], fn, params)
+        meta = self._load_meta(key)
+        rows = meta['rows'] if meta else 0
+        # 已缓存部分的数据没有变化，说明数据只是在后面追加
+        valid = bool(meta) and 0 < rows <= length and int(
+            times[rows - 1]) == meta['last'] and meta.get('digest') == digest(
+                data, length, rows)
+        if valid and rows == length:
+            self.hits += 1
+            os.utime(self._path(key, 'json'))
+            return self._open(meta, key)
+        if valid and lookback is not None:
+            self.appends += 1
+            start = max(rows - lookback, 0)
+            result = np.asarray(fn(_slice(data, length, start), **params))
+            meta['digest'] = digest(data, length, length)
+            self._append(key, meta, result[..., rows - start:], times)
+        else:
+            self.misses += 1
+            result = np.asarray(fn(data, **params))
+            meta = {
+                'symbol': symbol,
+                'period': str(period),
+                'params': repr(params),
+                'dtype': result.dtype.str,
+                'shape': list(result.shape[:-1]),
+                'rows': 0,
+                'last': None,
+                'digest': digest(data, length, length)
+            }
+            self._write(key, meta, result, times)
+        self._evict(keep=key)
+        return self._open(meta, key)
+
+    def _write(self, key: str, meta: dict, result: np.ndarray,
+               times: np.ndarray) -> None:
+        """整体重写结果"""
+        tmp = self._path(key, 'bin.tmp')
+        with open(tmp, 'wb') as f:
+            f.write(np.ascontiguousarray(np.moveaxis(result, -1, 0)).tobytes())
+        os.replace(tmp, self._path(key, 'bin'))
+        meta['rows'] = result.shape[-1]
+        meta['last'] = int(times[meta['rows'] - 1])
+        self._save_meta(key, meta)
+
+    def _append(self, key: str, meta: dict, result: np.ndarray,
+                times: np.ndarray) -> None:
+        """在已有结果后追加新的时间点"""
+        rows = np.ascontiguousarray(
+            np.moveaxis(result.astype(meta['dtype'], copy=False), -1, 0))
+        with open(self._path(key, 'bin'), 'r+b') as f:
+            # 截断上次中断写入的多余部分
+            f.truncate(meta['rows'] * rows[0:1].nbytes)
+            f.seek(0, os.SEEK_END)
+            f.write(rows.tobytes())
+        meta['rows'] += len(rows)
+        meta['last'] = int(times[meta['rows'] - 1])
+        self._save_meta(key, meta)
+
+    # |-------------------- 淘汰 --------------------|
+
+    def size(self) -> int:
+        """缓存总大小(字节)"""
+        return sum(
+            os.path.getsize(os.path.join(self.root, name))
+            for name in os.listdir(self.root))
+
+    def _evict(self, keep: str = None) -> None:
+        """总大小超过上限时，按最后访问时间从旧到新删除"""
+        entries, total = [], 0
+        for name in os.listdir(self.root):
+            if not name.endswith('.json'):
+                continue
+            key = name[:-5]
+            try:
+                used = os.path.getmtime(self._path(key, 'json'))
+                size = os.path.getsize(self._path(key, 'bin'))
+            except OSError:
+                continue
+            entries.append((used, key, size))
+            total += size
+        if total <= self.max_bytes:
+            return
+        for _, key, size in sorted(entries):
+            if key == keep:
+                continue
+            self.remove(key)
+            total -= size
+            if total <= self.max_bytes:
+                break
+
+    def remove(self, key: str) -> None:
+        for ext in ('json', 'bin'):
+            try:
+                os.remove(self._path(key, ext))
+            except OSError:
+                pass
+
+    def clear(self) -> None:
+        for name in os.listdir(self.root):
+            if name.endswith('.json'):
+                self.remove(name[:-5])
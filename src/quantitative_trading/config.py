@@ -0,0 +1,103 @@
+#!/usr/bin/env python
+#-*- coding: utf-8 -*-
+#FILE: config.py
+#CREATE_TIME: 2026-10-18
+#AUTHOR: Sancho
+"""
+配置加载
+`config.yml`解析、校验后的结果缓存在同目录的`.config.cache`中(pickle)，
+文件未修改时直接读取缓存，不再解析YAML，同一进程内多次读取也只加载一次
+"""
+
+import os
+import pickle
+from typing import Dict, List
+
+VERSION = 1  # 校验规则变化时递增，使旧缓存失效
+TYPES = (None, 'moni', 'shipan', 'kq', 'huice', 'replay')
+MODES = (None, 'sync', 'async', 'shard')
+_LOADED: Dict[str, tuple] = {}  # {路径: (文件状态, pickle数据)}
+
+
+def _stamp(path: str) -> tuple:
+    st = os.stat(path)
+    return VERSION, st.st_mtime_ns, st.st_size
+
+
+def _is_date(value) -> bool:
+    return isinstance(value, list) and len(value) == 3 and all(
+        isinstance(v, int) for v in value)
+
+
+def validate(config: dict) -> dict:
+    """
+    检查配置，所有问题一起报告
+
+    Raises:
+        ValueError: 配置有误
+    """
+    errors: List[str] = []
+    if not isinstance(config, dict):
+        raise ValueError('配置文件为空或格式错误')
+    if config.get('type') not in TYPES:
+        errors.append(f'type应为{TYPES[1:]}之一: {config.get("type")}')
+    if config.get('mode') not in MODES:
+        errors.append(f'mode应为{MODES[1:]}之一: {config.get("mode")}')
+    if config.get('type') == 'huice':
+        for key in ('start_dt', 'end_dt'):
+            if not _is_date(config.get(key)):
+                errors.append(f'回测需要{key}，如[2022,01,01]')
+    if config.get('type') == 'replay' and not (config.get('replay')
+                                               or {}).get('path'):
+        errors.append('离线回放需要replay.path')
+    quotes = config.get('quotes')
+    if quotes is not None and not isinstance(quotes, list):
+        errors.append('quotes应为合约代码列表')
+    for symbol, value in (config.get('klines') or {}).items():
+        if not (isinstance(value, list) and len(value) == 2
+                and all(isinstance(v, int) for v in value)):
+            errors.append(f'klines.{symbol}应为[数据周期/秒, 序列长度]')
+    for symbol, value in (config.get('ticks') or {}).items():
+        if not isinstance(value, int):
+            errors.append(f'ticks.{symbol}应为序列长度')
+    strategies = config.get('strategies')
+    if not strategies or not isinstance(strategies, (str, list, dict)):
+        errors.append('strategies应为策略类名、类名列表或{合约: 类名}')
+    if errors:
+        raise ValueError('配置有误:\n' + '\n'.join(errors))
+    return config
+
+
+def load_config(path: str) -> dict:
+    """
+    读取配置，优先使用校验后的缓存
+
+    Args:
+        path: `config.yml`路径 \n
+    """
+    path = os.path.abspath(path)
+    stamp = _stamp(path)
+    loaded = _LOADED.get(path)
+    if loaded and loaded[0] == stamp:
+        return pickle.loads(loaded[1])  # 每次返回独立的副本
+    cache = os.path.join(os.path.dirname(path), '.config.cache')
+    try:
+        with open(cache, 'rb') as f:
+            cached_stamp, data = pickle.load(f)
+        if cached_stamp != stamp:
+            data = None
+    except (OSError, EOFError, pickle.UnpicklingError, ValueError,
+            TypeError):
+        data = None
+    if data is None:
+        import yaml
+        loader = getattr(yaml, 'CLoader', yaml.SafeLoader)
+        with open(path, 'r', encoding='utf-8') as f:
+            data = pickle.dumps(validate(yaml.load(f, Loader=loader)))
+        try:
+            with open(cache, 'wb') as f:
+                pickle.dump((stamp, data), f)
+        except OSError:  # 目录不可写时只在进程内缓存
+            pass
+    _LOADED[path] = (stamp, data)
+    return pickle.loads(data)
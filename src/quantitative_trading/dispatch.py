@@ -0,0 +1,192 @@
+#!/usr/bin/env python
+#-*- coding: utf-8 -*-
+#FILE: dispatch.py
+#CREATE_TIME: 2026-10-18
+#AUTHOR: Sancho
+"""
+策略调度
+每次`wait_update()`后只计算一次变化集合，仅唤醒输入发生变化的策略
+
+开启合并更新(`conflate`)时，每个策略两次执行之间至少间隔设置的秒数，
+间隔内的变化合并到下一次执行，策略执行时读取的是最新行情(新值覆盖旧值)，
+`changed`对间隔内发生过的变化同样返回`True`；K线收盘(出现新K线)总是立即执行
+"""
+
+import time
+from typing import TYPE_CHECKING, Any, Dict, List, Set, Tuple, Union
+from pandas import DataFrame
+from subscription import resolve
+
+if TYPE_CHECKING:
+    from tqsdk import TqApi, TargetPosTask
+
+
+class Dispatcher:
+    """变化驱动的策略调度器"""
+    def __init__(self,
+                 api: 'TqApi',
+                 resampler=None,
+                 conflate: dict = None,
+                 metrics=None) -> None:
+        """
+        Args:
+            api: 天勤API \n
+            resampler: （可选）本地多周期K线合成，判断合成K线的变化 \n
+            conflate: （可选）合并更新设置，`interval`=默认最小间隔(秒)，
+                `symbols`={合约: 秒}，`strategies`={策略类名: 秒}，同时配置时取较大值 \n
+            metrics: （可选）耗时统计，记录`conflated`和`bar_close`事件 \n
+        """
+        self.api = api
+        self.resampler = resampler
+        self.conflate = conflate
+        self.metrics = metrics
+        self.strategies = []  # [(strategy, task), ...]，按注册顺序
+        # {(id(obj), key): [obj, key, [策略序号, ...]]}
+        self._inputs: Dict[Tuple[int, Any], list] = {}
+        self._state: Dict[Tuple[int, Any], bool] = {}  # 本次更新的变化结果
+        self._first = True  # 首次更新唤醒全部策略
+        # 合并更新: 各策略的输入、最小间隔和最近执行时间
+        self._keys: List[List[tuple]] = []
+        self._intervals: List[float] = []
+        self._last_run: List[float] = []
+        self._carry: Dict[int, Set[tuple]] = {}  # {策略序号: 被合并的变化}
+        self._carried: Dict[int, Set[tuple]] = {}  # {id(策略): 本次执行补上的变化}
+        self._bars: Dict[tuple, float] = {}  # {K线输入: 最后一根K线id}
+        # 计数: {(策略类名, 合约): 被合并的更新数}，间隔内因K线收盘执行的次数
+        self.conflated: Dict[Tuple[str, str], int] = {}
+        self.bar_closes = 0
+
+    @staticmethod
+    def _key(key: Union[str, List[str], None]) -> Union[str, tuple, None]:
+        return tuple(key) if isinstance(key, list) else key
+
+    def _interval(self, strategy) -> float:
+        """策略的最小执行间隔"""
+        conflate = self.conflate
+        values = [
+            v for v in ((conflate.get('strategies') or {}).get(
+                type(strategy).__name__), (conflate.get('symbols')
+                                           or {}).get(strategy.symbol))
+            if v is not None
+        ]
+        return max(values) if values else conflate.get('interval', 0)
+
+    def register(self, strategy, task: 'TargetPosTask' = None) -> None:
+        """
+        注册策略，按策略声明的输入建立索引
+
+        Args:
+            strategy: 已初始化的`Monitor`对象 \n
+            task: 策略对应合约的目标持仓对象 \n
+        """
+        index = len(self.strategies)
+        self.strategies.append((strategy, task))
+        strategy.dispatcher = self
+        keys = []
+        for obj, key in strategy.inputs():
+            obj = resolve(obj)  # 声明的输入需要持续订阅才能判断变化
+            k = (id(obj), self._key(key))
+            if k not in self._inputs:
+                self._inputs[k] = [obj, key, []]
+                if self.conflate and isinstance(
+                        obj, DataFrame) and 'duration' in obj.columns:
+                    self._bars[k] = obj['id'].iat[-1]
+            self._inputs[k][2].append(index)
+            keys.append(k)
+        if self.conflate:
+            self._keys.append(keys)
+            self._intervals.append(self._interval(strategy))
+            self._last_run.append(0.0)
+
+    def dispatch(self) -> List[tuple]:
+        """
+        计算本次更新的变化集合，返回需要执行的`(strategy, task)`列表
+        """
+        woken = set()
+        state = {}
+        is_changing = (self.is_changing
+                       if self.resampler else self.api.is_changing)
+        for k, (obj, key, subs) in self._inputs.items():
+            if changed := is_changing(obj, key):
+                woken.update(subs)
+            state[k] = changed
+        self._state = state
+        if self._first:
+            self._first = False
+            if self.conflate:
+                self._last_run = [time.monotonic()] * len(self.strategies)
+            return list(self.strategies)
+        if self.conflate:
+            return self._conflate(woken, state)
+        return [self.strategies[i] for i in sorted(woken)]
+
+    def _closed(self, state: Dict[tuple, bool]) -> set:
+        """本次更新中出现新K线的输入所对应的策略"""
+        closed = set()
+        for k, last in self._bars.items():
+            if state.get(k):
+                obj, _, subs = self._inputs[k]
+                if (bar := obj['id'].iat[-1]) != last:
+                    self._bars[k] = bar
+                    closed.update(subs)
+        return closed
+
+    def _conflate(self, woken: set, state: Dict[tuple, bool]) -> List[tuple]:
+        """
+        按最小间隔合并更新，间隔内的变化记录下来，到期后在下一次更新时执行
+        """
+        now = time.monotonic()
+        closed = self._closed(state) if self._bars else ()
+        self._carried = {}
+        due = []
+        for i in sorted(woken.union(self._carry)):
+            strategy = self.strategies[i][0]
+            keys = {k for k in self._keys[i] if state.get(k)}
+            if i in closed or now - self._last_run[i] >= self._intervals[i]:
+                if i in closed and now - self._last_run[i] < self._intervals[i]:
+                    self.bar_closes += 1
+                    if self.metrics:
+                        self.metrics.count('bar_close', 1,
+                                           type(strategy).__name__,
+                                           strategy.symbol)
+                if (carry := self._carry.pop(i, None)) is not None:
+                    self._carried[id(strategy)] = carry | keys
+                self._last_run[i] = now
+                due.append(self.strategies[i])
+            elif keys:
+                self._carry.setdefault(i, set()).update(keys)
+                name = (type(strategy).__name__, strategy.symbol)
+                self.conflated[name] = self.conflated.get(name, 0) + 1
+                if self.metrics:
+                    self.metrics.count('conflated', 1, *name)
+        return due
+
+    def is_changing(self,
+                    obj: Any,
+                    key: Union[str, List[str], None] = None) -> bool:
+        """与`api.is_changing`相同，同时支持合成K线"""
+        if self.resampler is not None:
+            if (changed := self.resampler.is_changing(obj, key)) is not None:
+                return changed
+        return self.api.is_changing(obj, key)
+
+    def cached(self,
+               obj: Any,
+               key: Union[str, List[str], None] = None,
+               strategy=None) -> Union[bool, None]:
+        """
+        查询本次更新中已计算的变化结果，未声明的输入返回`None`，
+        传入`strategy`时包括合并更新中被合并的变化
+        """
+        k = (id(obj), self._key(key))
+        if self._carried and k in self._carried.get(id(strategy), ()):
+            return True
+        return self._state.get(k)
+
+    def status(self) -> Dict[str, int]:
+        """合并更新的计数"""
+        return {
+            'conflated': sum(self.conflated.values()),
+            'pending': len(self._carry),
+            'bar_closes': self.bar_closes
+        }
@@ -0,0 +1,347 @@
+#!/usr/bin/env python
+#-*- coding: utf-8 -*-
+#FILE: download.py
+#CREATE_TIME: 2026-10-18
+#AUTHOR: Sancho
+"""
+历史数据下载
+把(合约 × 日期区间)拆分为按交易日划分的块，在线程池中并行下载，写入与行情录制相同格式的本地列式缓存
+
+* 每个交易日整体写入，重复下载结果相同；每块完成后记录在`{root}/{kind}/{symbol}/download.done`，
+  中断后重新运行只下载未完成的块
+* 数据来源可替换：`TqSource`从天勤下载，`StoreSource`读取另一个录制目录(测试数据或镜像)
+
+运行: `python .\\src\\quantitative_trading\\download.py`，按`config.yml`中的`klines`、`ticks`、
+`start_dt`、`end_dt`和`download`项下载
+"""
+
+import datetime
+import os
+import threading
+import time
+from abc import ABCMeta, abstractmethod
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, List, Tuple, Union
+import numpy as np
+from tqsdk import TqApi, TqAuth
+from recorder import Store, schema
+from utils import CST, DAY, NIGHT, to_ns, trading_day
+
+_CST = datetime.timezone(datetime.timedelta(hours=8))
+
+
+def weekdays(start: int, end: int) -> List[int]:
+    """
+    `[start, end)`中的周一至周五，即可能的交易日(不考虑节假日)
+
+    Args:
+        start: 如`20220101` \n
+        end: 如`20220201` \n
+    """
+    day = datetime.date(start // 10000, start // 100 % 100, start % 100)
+    stop = datetime.date(end // 10000, end // 100 % 100, end % 100)
+    days = []
+    while day < stop:
+        if day.weekday() < 5:
+            days.append(day.year * 10000 + day.month * 100 + day.day)
+        day += datetime.timedelta(days=1)
+    return days
+
+
+def day_range(first: int, last: int) -> Tuple[int, int]:
+    """
+    交易日区间`[first, last]`的行情时间范围(UTC纳秒)，从前一个工作日18:00(夜盘)到`last`的18:00
+    """
+    date = datetime.date(first // 10000, first // 100 % 100, first % 100)
+    date -= datetime.timedelta(days=3 if date.weekday() == 0 else 1)
+    start = to_ns([date.year, date.month, date.day]) + NIGHT
+    end = to_ns([last // 10000, last // 100 % 100, last % 100]) + NIGHT
+    return start, end
+
+
+def split_days(datetimes: np.ndarray) -> Dict[int, slice]:
+    """按时间排序的行情按交易日划分，返回{交易日: 行范围}"""
+    # 18:00之后归属下一天，周末由`trading_day`归属下周一
+    calendar = (np.asarray(datetimes, dtype=np.int64) + CST + DAY - NIGHT) // DAY
+    _, starts = np.unique(calendar, return_index=True)
+    bounds = list(starts) + [len(calendar)]
+    days = {}
+    for lo, hi in zip(bounds[:-1], bounds[1:]):
+        day = trading_day(datetimes[lo])
+        prev = days.get(day)
+        days[day] = slice(prev.start if prev else lo, hi)
+    return days
+
+
+# |-------------------- 数据来源 --------------------|
+
+
+class Source(metaclass=ABCMeta):
+    """
+    历史数据来源，`fetch`返回`schema(kind)`中全部字段的列数组，按时间排序，
+    可替换为本地测试服务或文件
+    """
+    @abstractmethod
+    def fetch(self, kind: str, symbol: str, start: int,
+              end: int) -> Dict[str, np.ndarray]:
+        """
+        Args:
+            kind: `tick`或`kline_{周期秒数}` \n
+            symbol: 合约代码 \n
+            start: 开始时间(UTC纳秒，含) \n
+            end: 结束时间(UTC纳秒，不含) \n
+        """
+        pass
+
+    def close(self) -> None:
+        pass
+
+
+class TqSource(Source):
+    def __init__(self, username: str, password: str) -> None:
+        """
+        从天勤下载，每个下载线程使用独立的连接(需要天勤历史数据权限)
+        """
+        self.auth = TqAuth(username, password)
+        self._local = threading.local()
+        self._apis: List[TqApi] = []
+        self._lock = threading.Lock()
+
+    def _api(self) -> TqApi:
+        api = getattr(self._local, 'api', None)
+        if api is None:
+            api = self._local.api = TqApi(auth=self.auth)
+            with self._lock:
+                self._apis.append(api)
+        return api
+
+    @staticmethod
+    def _datetime(ns: int) -> datetime.datetime:
+        """UTC纳秒时间戳转换为天勤接口使用的北京时间"""
+        return datetime.datetime.fromtimestamp(ns / 1e9, _CST).replace(
+            tzinfo=None)
+
+    def fetch(self, kind: str, symbol: str, start: int,
+              end: int) -> Dict[str, np.ndarray]:
+        api = self._api()
+        start_dt, end_dt = self._datetime(start), self._datetime(end)
+        if kind == 'tick':
+            df = api.get_tick_data_series(symbol, start_dt, end_dt)
+        else:
+            df = api.get_kline_data_series(symbol, int(kind.split('_')[1]),
+                                           start_dt, end_dt)
+        return {
+            name: df[name].to_numpy(dtype=dtype)
+            if name in df else np.full(len(df), np.nan)
+            for name, dtype in schema(kind).items()
+        }
+
+    def close(self) -> None:
+        for api in self._apis:
+            api.close()
+
+
+class StoreSource(Source):
+    def __init__(self, root: str) -> None:
+        """读取另一个行情录制/下载目录，用于测试或从共享盘上的镜像同步"""
+        self.store = Store(root)
+
+    def fetch(self, kind: str, symbol: str, start: int,
+              end: int) -> Dict[str, np.ndarray]:
+        cols = self.store.read(kind, symbol, trading_day(start),
+                               trading_day(end - 1))
+        lo, hi = np.searchsorted(cols['datetime'], [start, end])
+        return {name: col[lo:hi] for name, col in cols.items()}
+
+
+# |-------------------- 下载 --------------------|
+
+
+class Downloader:
+    DONE = 'download.done'
+
+    def __init__(self,
+                 root: str,
+                 source: Source = None,
+                 chunk_days: int = 20,
+                 workers: int = 4,
+                 retries: int = 3) -> None:
+        """
+        Args:
+            root: 本地缓存目录，格式与行情录制相同 \n
+            source: 数据来源，只检查缓存时可以不传 \n
+            chunk_days: 每块的交易日数 \n
+            workers: 同时下载的块数 \n
+            retries: 每块失败后的重试次数 \n
+
+        Example:
+            downloader = Downloader('./data', StoreSource('./fixtures'))
+            downloader.run([('kline_60', 'KQ.m@DCE.a')], 20220101, 20230101)
+        """
+        self.store = Store(root)
+        self.source = source
+        self.chunk_days = chunk_days
+        self.workers = workers
+        self.retries = retries
+        self._lock = threading.Lock()
+
+    def _done_path(self, kind: str, symbol: str) -> str:
+        return os.path.join(self.store.path(kind, symbol), self.DONE)
+
+    def done(self, kind: str, symbol: str) -> List[Tuple[int, int]]:
+        """已完成的块[(首个交易日, 最后一个交易日)]"""
+        try:
+            with open(self._done_path(kind, symbol), encoding='utf-8') as f:
+                return [
+                    tuple(int(x) for x in line.split())
+                    for line in f if line.strip()
+                ]
+        except OSError:
+            return []
+
+    @staticmethod
+    def _covered(done: List[Tuple[int, int]], days: List[int]) -> bool:
+        return all(
+            any(first <= d <= last for first, last in done) for d in days)
+
+    def covered(self, kind: str, symbol: str, start: int, end: int) -> bool:
+        """`[start, end)`中的交易日是否都已下载"""
+        return self._covered(self.done(kind, symbol), weekdays(start, end))
+
+    def jobs(self, kinds: List[Tuple[str, str]], start: int,
+             end: int) -> List[Tuple[str, str, int, int]]:
+        """
+        未完成的块[(kind, 合约, 首个交易日, 最后一个交易日)]
+
+        Args:
+            kinds: [(kind, 合约)]，如`[('kline_60', 'KQ.m@DCE.a'), ('tick', 'KQ.m@DCE.a')]` \n
+            start: 开始日期，如`20220101` \n
+            end: 结束日期(不含) \n
+        """
+        days = weekdays(start, end)
+        chunks = [
+            days[i:i + self.chunk_days]
+            for i in range(0, len(days), self.chunk_days)
+        ]
+        jobs = []
+        for kind, symbol in kinds:
+            done = self.done(kind, symbol)
+            for chunk in chunks:
+                if not self._covered(done, chunk):
+                    jobs.append((kind, symbol, chunk[0], chunk[-1]))
+        return jobs
+
+    def _run(self, job: Tuple[str, str, int, int]) -> int:
+        """下载一块并按交易日写入，返回行数"""
+        kind, symbol, first, last = job
+        start, end = day_range(first, last)
+        for attempt in range(self.retries + 1):
+            try:
+                cols = self.source.fetch(kind, symbol, start, end)
+                break
+            except Exception:
+                if attempt == self.retries:
+                    raise
+                time.sleep(2**attempt)
+        for day, rows in split_days(cols['datetime']).items():
+            if first <= day <= last:
+                self.store.write_day(kind, symbol, day,
+                                     {k: v[rows] for k, v in cols.items()})
+        with self._lock:
+            os.makedirs(self.store.path(kind, symbol), exist_ok=True)
+            with open(self._done_path(kind, symbol), 'a',
+                      encoding='utf-8') as f:
+                f.write(f'{first} {last}\n')
+        return len(cols['datetime'])
+
+    def run(self, kinds: List[Tuple[str, str]], start: int,
+            end: int) -> Dict[str, int]:
+        """
+        下载全部未完成的块
+
+        Returns:
+            {'jobs': 本次下载的块数, 'rows': 行数, 'failed': 失败的块数}
+        """
+        jobs = self.jobs(kinds, start, end)
+        rows, failed = 0, 0
+        begin = time.time()
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            futures = {pool.submit(self._run, job): job for job in jobs}
+            for i, future in enumerate(as_completed(futures), 1):
+                try:
+                    rows += future.result()
+                except Exception as e:
+                    failed += 1
+                    print(f'{e}\n下载失败: {futures[future]}')
+                if i % 10 == 0 or i == len(jobs):
+                    print(f'已完成 {i}/{len(jobs)}')
+        print(f'下载块数: {len(jobs)}, 行数: {rows}, 失败: {failed}, '
+              f'耗时: {time.time() - begin:.2f}s')
+        return {'jobs': len(jobs), 'rows': rows, 'failed': failed}
+
+
+# |-------------------- 配置 --------------------|
+
+
+def _day(date: list) -> int:
+    return date[0] * 10000 + date[1] * 100 + date[2]
+
+
+def kinds_of(config: dict) -> List[Tuple[str, str]]:
+    """配置中订阅的K线和Tick[(kind, 合约)]"""
+    kinds = [(f'kline_{int(v[0])}', s)
+             for s, v in (config.get('klines') or {}).items()]
+    kinds += [('tick', s) for s in config.get('ticks') or {}]
+    return kinds
+
+
+def date_range(config: dict) -> Tuple[int, int]:
+    """下载的日期区间，开始日期前多下载`warmup_days`个交易日用于预先填入序列"""
+    download = config.get('download') or {}
+    start, end = _day(config['start_dt']), _day(config['end_dt'])
+    warmup = download.get('warmup_days', 0)
+    if warmup:
+        date = datetime.date(*config['start_dt'])
+        while warmup:
+            date -= datetime.timedelta(days=1)
+            warmup -= date.weekday() < 5
+        start = date.year * 10000 + date.month * 100 + date.day
+    return start, end
+
+
+def cached_replay(config: dict) -> Union[dict, None]:
+    """
+    回测区间内订阅的K线/Tick都已下载时，返回离线回放设置，否则返回`None`
+    """
+    download = config.get('download') or {}
+    if not download.get('cache_first') or not download.get('path'):
+        return None
+    kinds = kinds_of(config)
+    downloader = Downloader(download['path'])
+    start, end = _day(config['start_dt']), _day(config['end_dt'])
+    if not kinds or not all(
+            downloader.covered(kind, symbol, start, end)
+            for kind, symbol in kinds):
+        return None
+    return dict(config.get('replay') or {},
+                path=download['path'],
+                start_dt=config['start_dt'],
+                end_dt=config['end_dt'])
+
+
+if __name__ == "__main__":
+    from main import Engine
+    config = Engine.get_config()
+    download = config['download']
+    if download.get('source', 'tq') == 'tq':
+        source = TqSource(config['tq_username'], config['tq_password'])
+    else:
+        source = StoreSource(download['source'])
+    downloader = Downloader(download['path'], source,
+                            download.get('chunk_days', 20),
+                            download.get('workers', 4),
+                            download.get('retries', 3))
+    try:
+        downloader.run(kinds_of(config), *date_range(config))
+    finally:
+        source.close()
@@ -0,0 +1,480 @@
+#!/usr/bin/env python
+#-*- coding: utf-8 -*-
+#FILE: factor.py
+#CREATE_TIME: 2026-10-18
+#AUTHOR: Sancho
+"""
+截面因子研究
+在`(合约 × 时间)`数组上向量化计算因子，评估IC、Rank IC、衰减和分组收益，
+数据按交易日分块读取，块之间只保留统计量，内存与数据总量无关
+
+运行: 配置`config.yml`中的`factor`项，`python .\\src\\quantitative_trading\\factor.py`
+"""
+
+import math
+from typing import Callable, Dict, Iterator, List, Sequence, Tuple
+import numpy as np
+from cache import Cache
+from recorder import Store
+from utils import trading_day
+
+FIELDS = ('close', 'volume', 'close_oi')  # 因子使用的K线字段
+FILL = {'volume': 0.0}  # 缺失K线的填充值，其他字段前向填充
+
+# |-------------------- 数组工具 --------------------|
+
+
+def shift(x: np.ndarray, n: int) -> np.ndarray:
+    """沿时间轴(axis=1)移动，`n > 0`取n根之前的值，`n < 0`取之后的值"""
+    out = np.full(x.shape, np.nan)
+    if n > 0:
+        out[:, n:] = x[:, :-n]
+    elif n < 0:
+        out[:, :n] = x[:, -n:]
+    else:
+        out[:] = x
+    return out
+
+
+def ffill(x: np.ndarray) -> np.ndarray:
+    """沿时间轴前向填充`nan`"""
+    idx = np.where(np.isnan(x), 0, np.arange(x.shape[1]))
+    np.maximum.accumulate(idx, axis=1, out=idx)
+    return x[np.arange(x.shape[0])[:, None], idx]
+
+
+def rolling_sum(x: np.ndarray, n: int) -> np.ndarray:
+    """沿时间轴的n根滚动求和，窗口内有`nan`时为`nan`"""
+    valid = ~np.isnan(x)
+    total = np.cumsum(np.where(valid, x, 0.0), axis=1)
+    count = np.cumsum(valid, axis=1)
+    total[:, n:] -= total[:, :-n].copy()
+    count[:, n:] -= count[:, :-n].copy()
+    total[count < n] = np.nan
+    return total
+
+
+def rank(x: np.ndarray) -> np.ndarray:
+    """沿合约轴(axis=0)的截面排名，从0开始，相同的值取平均排名，`nan`保持为`nan`"""
+    valid = ~np.isnan(x)
+    order = np.argsort(np.where(valid, x, np.inf), axis=0, kind='stable')
+    values = np.take_along_axis(np.where(valid, x, np.inf), order, axis=0)
+    index = np.arange(x.shape[0])[:, None] * np.ones((1, x.shape[1]), int)
+    # 每组相同值在排序后的第一个和最后一个位置
+    first = np.ones(x.shape, bool)
+    first[1:] = values[1:] != values[:-1]
+    last = np.ones(x.shape, bool)
+    last[:-1] = first[1:]
+    lo = np.maximum.accumulate(np.where(first, index, 0), axis=0)
+    hi = np.minimum.accumulate(np.where(last, index, x.shape[0])[::-1],
+                               axis=0)[::-1]
+    ranks = np.empty(x.shape)
+    np.put_along_axis(ranks, order, (lo + hi) / 2, axis=0)
+    ranks[~valid] = np.nan
+    return ranks
+
+
+# |-------------------- 因子库 --------------------|
+
+
+def momentum(close: np.ndarray, n: int) -> np.ndarray:
+    """动量：n根K线的收益率"""
+    return close / shift(close, n) - 1
+
+
+def volatility(close: np.ndarray, n: int) -> np.ndarray:
+    """波动率：n根K线对数收益率的标准差"""
+    r = np.log(close / shift(close, 1))
+    s1, s2 = rolling_sum(r, n), rolling_sum(r * r, n)
+    return np.sqrt(np.maximum((s2 - s1 * s1 / n) / (n - 1), 0))
+
+
+def volume_change(volume: np.ndarray, n: int) -> np.ndarray:
+    """成交量变化：最近n根的成交量相对之前n根的变化率"""
+    total = rolling_sum(volume, n)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return total / shift(total, n) - 1
+
+
+def oi_change(oi: np.ndarray, n: int) -> np.ndarray:
+    """持仓量变化：n根K线的持仓量变化率"""
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return oi / shift(oi, n) - 1
+
+
+def carry(close: np.ndarray, next_close: np.ndarray,
+          days: np.ndarray) -> np.ndarray:
+    """期限结构：主力相对次主力合约的年化升水，正值为近月升水(backwardation)"""
+    return (close - next_close) / next_close * 365 / days
+
+
+def default_factors(windows: Sequence[int] = (
+    20, 60)) -> Dict[str, Tuple[Callable, int]]:
+    """
+    默认因子库
+
+    Returns:
+        {因子名: (函数, 需要的历史K线数)}，函数接收`{字段: ndarray[合约数, 时间]}`
+    """
+    factors = {}
+    for n in windows:
+        factors[f'mom_{n}'] = (lambda d, n=n: momentum(d['close'], n), n)
+        factors[f'vol_{n}'] = (lambda d, n=n: volatility(d['close'], n), n + 1)
+        factors[f'volume_{n}'] = (lambda d, n=n: volume_change(d['volume'], n),
+                                  2 * n)
+        factors[f'oi_{n}'] = (lambda d, n=n: oi_change(d['close_oi'], n), n)
+    factors['carry'] = (
+        lambda d: carry(d['close'], d['next_close'], d['carry_days'])
+        if 'next_close' in d else np.full(d['close'].shape, np.nan), 0)
+    return factors
+
+
+# |-------------------- 数据 --------------------|
+
+
+def align(
+    columns: Dict[str, Dict[str, np.ndarray]],
+    fields: Sequence[str] = FIELDS
+) -> Tuple[np.ndarray, Dict[str, np.ndarray]]:
+    """
+    多个合约的列按时间对齐
+
+    Args:
+        columns: {合约: {字段: ndarray}}，如`Store.read`的返回值 \n
+        fields: 需要的字段 \n
+
+    Returns:
+        (时间轴, {字段: ndarray[合约数, 时间]})，顺序与`columns`相同
+    """
+    times = np.unique(
+        np.concatenate([np.asarray(c['datetime']) for c in columns.values()]))
+    data = {}
+    for f in fields:
+        a = np.full((len(columns), len(times)), np.nan)
+        for i, c in enumerate(columns.values()):
+            a[i, np.searchsorted(times, c['datetime'])] = c[f]
+        if f in FILL:
+            a[np.isnan(a)] = FILL[f]
+        else:
+            a = ffill(a)
+        data[f] = a
+    return times, data
+
+
+def _pad(counts: List[int], begin: int, step: int, bars: int) -> int:
+    """从第`begin`个交易日起沿`step`方向覆盖`bars`根K线需要的交易日数，数据不足时到边界为止"""
+    days, total = 0, 0
+    while total < bars and 0 <= begin < len(counts):
+        total += counts[begin]
+        days += 1
+        begin += step
+    return days
+
+
+def iter_chunks(
+    root: str,
+    kind: str,
+    symbols: List[str],
+    chunk_days: int = 20,
+    warmup: int = 0,
+    lookahead: int = 0,
+    next_symbols: Dict[str, str] = None,
+    carry_days: float = 30,
+    start: int = None,
+    end: int = None,
+    pad_days: int = None
+) -> Iterator[Tuple[np.ndarray, Dict[str, np.ndarray], slice]]:
+    """
+    按交易日分块读取行情录制目录中的K线并对齐
+
+    Args:
+        root: 行情录制目录 \n
+        kind: 如`kline_60` \n
+        symbols: 参与截面的合约 \n
+        chunk_days: 每块的交易日数 \n
+        warmup: 每块前面保留的历史K线数(因子回看) \n
+        lookahead: 每块后面保留的K线数(未来收益) \n
+        next_symbols: {合约: 次主力合约}，用于期限结构因子 \n
+        carry_days: 主力与次主力合约的交割间隔天数 \n
+        start: 开始交易日，如`20220101` \n
+        end: 结束交易日 \n
+        pad_days: 前后多读取的交易日数，默认按每个交易日的K线数从`warmup`和`lookahead`换算，
+            指定的天数不足以覆盖时报错 \n
+
+    Yields:
+        (时间轴, {字段: ndarray[合约数, 时间]}, 本块的评估区间)
+    """
+    store = Store(root)
+    next_symbols = next_symbols or {}
+    days = sorted({
+        d
+        for s in symbols for d in store.days(kind, s)
+        if (start is None or d >= start) and (end is None or d <= end)
+    })
+    # 每个交易日各合约中最少的K线数，用于把回看和未来收益的K线数换算为交易日数
+    counts = []
+    for d in days:
+        rows = [n for n in (store.rows(kind, s, d) for s in symbols) if n]
+        counts.append(min(rows) if rows else 0)
+    for k in range(0, len(days), chunk_days):
+        core = days[k:k + chunk_days]
+        before = _pad(counts, k - 1, -1, warmup)
+        after = _pad(counts, k + len(core), 1, lookahead)
+        if pad_days is not None:
+            if pad_days < max(before, after):
+                raise ValueError(
+                    f'pad_days={pad_days}不足以覆盖warmup={warmup}、'
+                    f'lookahead={lookahead}，至少需要{max(before, after)}')
+            before = after = pad_days
+        lo = days[max(k - before, 0)]
+        hi = days[min(k + len(core) - 1 + after, len(days) - 1)]
+        columns = {s: store.read(kind, s, lo, hi) for s in symbols}
+        pairs = [s for s in symbols if s in next_symbols]
+        nexts = {
+            f'next:{s}': store.read(kind, next_symbols[s], lo, hi)
+            for s in pairs
+        }
+        if not any(len(c['datetime']) for c in columns.values()):
+            continue
+        times, data = align(dict(columns, **nexts))
+        n = len(symbols)
+        if pairs:
+            next_close = np.full((n, len(times)), np.nan)
+            for j, s in enumerate(pairs):
+                next_close[symbols.index(s)] = data['close'][n + j]
+            data['next_close'] = next_close
+            data['carry_days'] = np.full((n, 1), float(carry_days))
+        for f in FIELDS:
+            data[f] = data[f][:n]
+        in_core = np.fromiter(
+            (core[0] <= trading_day(t) <= core[-1] for t in times),
+            dtype=bool,
+            count=len(times))
+        first = int(np.argmax(in_core))
+        last = len(in_core) - int(np.argmax(in_core[::-1]))
+        lo_row, hi_row = max(first - warmup, 0), min(last + lookahead,
+                                                     len(times))
+        yield (times[lo_row:hi_row], {
+            f: a[:, lo_row:hi_row] if a.shape[1] == len(times) else a
+            for f, a in data.items()
+        }, slice(first - lo_row, last - lo_row))
+
+
+# |-------------------- 评估 --------------------|
+
+
+def ic(factor: np.ndarray, ret: np.ndarray, min_count: int = 3) -> np.ndarray:
+    """每个时间点的截面相关系数(Pearson)，有效合约少于`min_count`时为`nan`"""
+    valid = ~(np.isnan(factor) | np.isnan(ret))
+    n = valid.sum(axis=0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        fm = np.where(valid, factor, 0.0).sum(axis=0) / n
+        rm = np.where(valid, ret, 0.0).sum(axis=0) / n
+        fd = np.where(valid, factor - fm, 0.0)
+        rd = np.where(valid, ret - rm, 0.0)
+        out = (fd * rd).sum(axis=0) / np.sqrt(
+            (fd * fd).sum(axis=0) * (rd * rd).sum(axis=0))
+    out[n < min_count] = np.nan
+    return out
+
+
+def rank_ic(factor: np.ndarray,
+            ret: np.ndarray,
+            min_count: int = 3) -> np.ndarray:
+    """每个时间点的截面秩相关系数(Spearman)"""
+    valid = ~(np.isnan(factor) | np.isnan(ret))
+    return ic(rank(np.where(valid, factor, np.nan)),
+              rank(np.where(valid, ret, np.nan)), min_count)
+
+
+def quantile_returns(factor: np.ndarray, ret: np.ndarray,
+                     quantiles: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    按因子值分组，每个时间点各组的平均收益
+
+    Returns:
+        (各组收益之和, 各组有效时间点数)，`ndarray[分组数]`
+    """
+    valid = ~(np.isnan(factor) | np.isnan(ret))
+    r = rank(np.where(valid, factor, np.nan))
+    n = valid.sum(axis=0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        group = np.floor(r * quantiles / n)
+    sums, counts = np.zeros(quantiles), np.zeros(quantiles)
+    for q in range(quantiles):
+        mask = group == q
+        k = mask.sum(axis=0)
+        mean = np.where(mask, ret, 0.0).sum(axis=0)[k > 0] / k[k > 0]
+        sums[q] += mean.sum()
+        counts[q] += len(mean)
+    return sums, counts
+
+
+class _Stats:
+    """一个因子在一个持有期上的累计统计量"""
+    __slots__ = ('ic', 'rank_ic', 'q_sum', 'q_count')
+
+    def __init__(self, quantiles: int) -> None:
+        self.ic = np.zeros(3)  # 和、平方和、数量
+        self.rank_ic = np.zeros(3)
+        self.q_sum = np.zeros(quantiles)
+        self.q_count = np.zeros(quantiles)
+
+    @staticmethod
+    def _add(acc: np.ndarray, x: np.ndarray) -> None:
+        x = x[~np.isnan(x)]
+        acc += (x.sum(), (x * x).sum(), len(x))
+
+    @staticmethod
+    def _summary(acc: np.ndarray) -> Tuple[float, float, float]:
+        total, sq, n = acc
+        if n < 2:
+            return math.nan, math.nan, math.nan
+        mean = total / n
+        std = math.sqrt(max(sq / n - mean * mean, 0) * n / (n - 1))
+        ir = mean / std if std else math.nan
+        return mean, std, ir
+
+
+class FactorEngine:
+    def __init__(self,
+                 factors: Dict[str, Tuple[Callable, int]] = None,
+                 horizons: Sequence[int] = (1, 5, 10, 20),
+                 quantiles: int = 5,
+                 min_count: int = 3,
+                 cache: Cache = None,
+                 key: str = '') -> None:
+        """
+        因子评估
+
+        Args:
+            factors: {因子名: (函数, 需要的历史K线数)}，默认`default_factors()` \n
+            horizons: 未来收益的持有期(K线数)，用于IC衰减 \n
+            quantiles: 分组数 \n
+            min_count: 每个时间点至少需要的有效合约数 \n
+            cache: 因子值的磁盘缓存，重复研究时不重新计算，新录制的K线只计算新增部分 \n
+            key: 数据标识(如K线类型和合约)，作为缓存的键 \n
+
+        Example:
+            engine = FactorEngine()
+            rows = engine.run(iter_chunks('./data', 'kline_60', symbols,
+                                          warmup=engine.warmup,
+                                          lookahead=engine.lookahead))
+        """
+        self.factors = factors or default_factors()
+        self.horizons = list(horizons)
+        self.quantiles = quantiles
+        self.min_count = min_count
+        self.cache = cache
+        self.key = key
+        self.warmup = max(lookback for _, lookback in self.factors.values())
+        self.lookahead = max(self.horizons)
+        self.stats = {(name, h): _Stats(quantiles)
+                      for name in self.factors for h in self.horizons}
+
+    def compute(self,
+                data: Dict[str, np.ndarray],
+                times: np.ndarray = None) -> Dict[str, np.ndarray]:
+        """计算全部因子，返回{因子名: ndarray[合约数, 时间]}，传入时间轴时使用缓存"""
+        with np.errstate(divide='ignore', invalid='ignore'):
+            if self.cache is None or times is None:
+                return {name: f(data) for name, (f, _) in self.factors.items()}
+            data = dict(data, datetime=times)
+            return {
+                name: self.cache.call(f, data, self.key, name, lookback)
+                for name, (f, lookback) in self.factors.items()
+            }
+
+    def evaluate(
+        self,
+        times: np.ndarray,
+        data: Dict[str, np.ndarray],
+        core: slice = slice(None)) -> None:
+        """
+        累计一块数据的评估统计量
+
+        Args:
+            times: 时间轴 \n
+            data: {字段: ndarray[合约数, 时间]} \n
+            core: 参与评估的区间，前后的数据只用于回看和未来收益 \n
+        """
+        close = data['close']
+        returns = {
+            h: (shift(close, -h) / close - 1)[:, core]
+            for h in self.horizons
+        }
+        for name, values in self.compute(data, times).items():
+            values = values[:, core]
+            for h, ret in returns.items():
+                stats = self.stats[name, h]
+                stats._add(stats.ic, ic(values, ret, self.min_count))
+                stats._add(stats.rank_ic, rank_ic(values, ret, self.min_count))
+                sums, counts = quantile_returns(values, ret, self.quantiles)
+                stats.q_sum += sums
+                stats.q_count += counts
+
+    def run(self, chunks: Iterator[tuple]) -> List[dict]:
+        """评估全部数据块，返回结果表"""
+        for times, data, core in chunks:
+            self.evaluate(times, data, core)
+        return self.report()
+
+    def report(self) -> List[dict]:
+        """
+        每个因子、持有期一行: IC均值/标准差/IR/t值、Rank IC均值/IR、各组平均收益、多空收益
+        """
+        rows = []
+        for (name, h), stats in self.stats.items():
+            mean, std, ir = stats._summary(stats.ic)
+            rank_mean, _, rank_ir = stats._summary(stats.rank_ic)
+            n = int(stats.ic[2])
+            row = {
+                'factor': name,
+                'horizon': h,
+                'ic_mean': mean,
+                'ic_std': std,
+                'ic_ir': ir,
+                'ic_t': ir * math.sqrt(n) if n else math.nan,
+                'rank_ic_mean': rank_mean,
+                'rank_ic_ir': rank_ir,
+                'periods': n,
+            }
+            with np.errstate(divide='ignore', invalid='ignore'):
+                q = stats.q_sum / stats.q_count
+            for i, v in enumerate(q):
+                row[f'q{i + 1}'] = float(v)
+            row['long_short'] = float(q[-1] - q[0])
+            rows.append(row)
+        return rows
+
+
+if __name__ == "__main__":
+    import os
+    from main import Engine
+    from sweep import save
+    config = Engine.get_config()['factor']
+    root, kind = config['path'], config['kind']
+    symbols = config.get('symbols') or sorted(
+        os.listdir(os.path.join(root, kind)))
+    cache = config.get('cache') or {}
+    engine = FactorEngine(
+        default_factors(config.get('windows', (20, 60))),
+        config.get('horizons', (1, 5, 10, 20)),
+        config.get('quantiles', 5),
+        cache=Cache(cache['path'], cache.get('max_size', 1024))
+        if cache.get('enabled') else None,
+        # 次主力合约和交割间隔影响期限结构因子，一并作为缓存的键
+        key=f'{kind}:{",".join(symbols)}:'
+        f'{sorted((config.get("next") or {}).items())}:'
+        f'{config.get("carry_days", 30)}')
+    rows = engine.run(
+        iter_chunks(root, kind, symbols, config.get('chunk_days', 20),
+                    engine.warmup, engine.lookahead, config.get('next'),
+                    config.get('carry_days', 30), config.get('start'),
+                    config.get('end')))
+    save(rows, config['output'])
+    for row in rows:
+        print(
+            f"{row['factor']:<12} h={row['horizon']:<3} "
+            f"IC={row['ic_mean']:+.4f} IR={row['ic_ir']:+.3f} "
+            f"RankIC={row['rank_ic_mean']:+.4f} L-S={row['long_short']:+.5f}")
@@ -0,0 +1,239 @@
+#!/usr/bin/env python
+#-*- coding: utf-8 -*-
+#FILE: indicators.py
+#CREATE_TIME: 2026-10-18
+#AUTHOR: Sancho
+"""
+增量指标库
+每根新K线只做O(1)更新，计算量不随序列长度增长
+"""
+
+import math
+from abc import ABCMeta, abstractmethod
+from collections import deque
+from typing import Dict, Tuple, Union
+import numpy as np
+from pandas import DataFrame
+from subscription import SerialView
+
+FIELDS = ('open', 'high', 'low', 'close', 'volume')  # 推送给指标的K线字段
+
+
+class Indicator(metaclass=ABCMeta):
+    """
+    增量指标基类，`update`接收一根已收盘的K线，
+    子类需实现`push`，需要多个字段时覆盖`extract`
+    """
+    def __init__(self, field: str = 'close') -> None:
+        self.field = field
+        self.value = math.nan
+        self.count = 0  # 已处理的K线数量
+
+    def update(self, bar: dict) -> float:
+        self.count += 1
+        self.value = self.push(self.extract(bar))
+        return self.value
+
+    def extract(self, bar: dict) -> float:
+        """从K线中取出`push`的输入，默认为`field`字段"""
+        return bar[self.field]
+
+    @abstractmethod
+    def push(self, x: float) -> float:
+        """
+        推入一个值，返回指标的最新值
+        """
+        pass
+
+    @property
+    def ready(self) -> bool:
+        return not math.isnan(self.value)
+
+
+class RollingMax(Indicator):
+    """N根K线最大值(单调队列)"""
+    def __init__(self, n: int, field: str = 'high') -> None:
+        super().__init__(field)
+        self.n = n
+        self._q = deque()  # [(序号, 值), ...]，值单调递减
+        self._i = 0
+
+    def _better(self, a: float, b: float) -> bool:
+        return a >= b
+
+    def push(self, x: float) -> float:
+        q = self._q
+        while q and self._better(x, q[-1][1]):
+            q.pop()
+        q.append((self._i, x))
+        if q[0][0] <= self._i - self.n:
+            q.popleft()
+        self._i += 1
+        return q[0][1]
+
+
+class RollingMin(RollingMax):
+    """N根K线最小值(单调队列)"""
+    def __init__(self, n: int, field: str = 'low') -> None:
+        super().__init__(n, field)
+
+    def _better(self, a: float, b: float) -> bool:
+        return a <= b
+
+
+class SMA(Indicator):
+    """简单移动平均"""
+    def __init__(self, n: int, field: str = 'close') -> None:
+        super().__init__(field)
+        self.n = n
+        self._q = deque()
+        self._sum = 0.0
+
+    def push(self, x: float) -> float:
+        self._q.append(x)
+        self._sum += x
+        if len(self._q) > self.n:
+            self._sum -= self._q.popleft()
+        return self._sum / len(self._q)
+
+
+class EMA(Indicator):
+    """指数移动平均，alpha=2/(n+1)"""
+    def __init__(self, n: int, field: str = 'close') -> None:
+        super().__init__(field)
+        self.alpha = 2 / (n + 1)
+
+    def push(self, x: float) -> float:
+        if math.isnan(self.value):
+            return x
+        return self.value + self.alpha * (x - self.value)
+
+
+class RollingStd(Indicator):
+    """N根K线标准差(总体)"""
+    def __init__(self, n: int, field: str = 'close') -> None:
+        super().__init__(field)
+        self.n = n
+        self._q = deque()
+        self._sum = 0.0
+        self._sumsq = 0.0
+
+    def push(self, x: float) -> float:
+        self._q.append(x)
+        self._sum += x
+        self._sumsq += x * x
+        if len(self._q) > self.n:
+            y = self._q.popleft()
+            self._sum -= y
+            self._sumsq -= y * y
+        n = len(self._q)
+        mean = self._sum / n
+        return math.sqrt(max(self._sumsq / n - mean * mean, 0.0))
+
+
+class ATR(Indicator):
+    """平均真实波幅，真实波幅的N周期简单平均"""
+    def __init__(self, n: int) -> None:
+        super().__init__()
+        self._tr = SMA(n)
+        self._close = math.nan  # 上一根K线收盘价
+
+    def extract(self, bar: dict) -> float:
+        """真实波幅"""
+        high, low = bar['high'], bar['low']
+        tr = high - low
+        if not math.isnan(self._close):
+            tr = max(tr, abs(high - self._close), abs(low - self._close))
+        self._close = bar['close']
+        return tr
+
+    def push(self, x: float) -> float:
+        return self._tr.push(x)
+
+
+class DualThrustRange(Indicator):
+    """Dual Thrust区间: max(HH-LC, HC-LL)"""
+    def __init__(self, n: int) -> None:
+        super().__init__()
+        self.hh = RollingMax(n, 'high')  # N日最高价的最高价
+        self.hc = RollingMax(n, 'close')  # N日收盘价的最高价
+        self.lc = RollingMin(n, 'close')  # N日收盘价的最低价
+        self.ll = RollingMin(n, 'low')  # N日最低价的最低价
+
+    def extract(self, bar: dict) -> float:
+        hh, hc = self.hh.update(bar), self.hc.update(bar)
+        lc, ll = self.lc.update(bar), self.ll.update(bar)
+        return max(hh - lc, hc - ll)
+
+    def push(self, x: float) -> float:
+        return x
+
+    def lines(self, current_open: float, k1: float,
+              k2: float) -> Tuple[float, float]:
+        """返回上下轨"""
+        return current_open + self.value * k1, current_open - self.value * k2
+
+
+class BarFeed:
+    """
+    从K线序列中取出新收盘的K线推送给指标
+    最后一根K线未收盘，不推送
+    """
+    def __init__(self, kline: Union[DataFrame, SerialView]) -> None:
+        self.kline = kline if isinstance(kline,
+                                         SerialView) else SerialView(kline)
+        self.indicators: Dict[str, Indicator] = {}
+        self.last_id = -1  # 已推送的最后一根K线id
+        self._restored: Dict[str, Indicator] = {}  # 快照中尚未挂载的指标
+
+    def add(self, name: str, indicator: Indicator) -> Indicator:
+        """挂载指标，快照中有同名同类型的指标时使用快照中的对象"""
+        restored = self._restored.pop(name, None)
+        if type(restored) is type(indicator):
+            indicator = restored
+        self.indicators[name] = indicator
+        return indicator
+
+    def state(self) -> Tuple[int, Dict[str, Indicator]]:
+        """快照：已推送的最后一根K线id和指标"""
+        return self.last_id, self.indicators
+
+    def restore(self, last_id: int, indicators: Dict[str, Indicator]) -> bool:
+        """
+        从快照恢复，在`add`之前调用，之后`update`只推送快照之后收盘的K线；
+        序列中已没有快照之后的K线(停机过久)或序列早于快照时不恢复
+
+        Returns:
+            是否恢复
+        """
+        ids = self.kline.col('id')
+        ids = ids[~np.isnan(ids)]
+        if not len(ids) or ids[0] > last_id + 1 or ids[-1] < last_id:
+            return False
+        self.last_id = last_id
+        self._restored = dict(indicators)
+        return True
+
+    def update(self) -> int:
+        """
+        推送上次调用之后收盘的K线，返回推送数量
+        """
+        ids = self.kline.col('id')
+        n = len(ids)
+        if n < 2 or math.isnan(ids[-2]):
+            return 0
+        count = min(int(ids[-2]) - self.last_id, n - 1)
+        if count <= 0:
+            return 0
+        cols = {f: self.kline.col(f) for f in FIELDS}
+        for i in range(n - 1 - count, n - 1):
+            if math.isnan(ids[i]):
+                continue
+            bar = {f: cols[f][i] for f in FIELDS}
+            for indicator in self.indicators.values():
+                indicator.update(bar)
+        self.last_id = int(ids[-2])
+        return count
+
+    def __getitem__(self, name: str) -> Indicator:
+        return self.indicators[name]
@@ -8,13 +8,23 @@
 天勤库的轻量级封装
 """
 
+import asyncio
 import sys
-from typing import Dict, List, Union
-import yaml
-from tq import Tq
-from subscription import Subscription
-from trade import Trade
-import monitor
+import time
+from typing import TYPE_CHECKING, Dict, List, Union
+from config import load_config
+from subscription import Subscription, resolve
+from registry import StrategyRegistry
+
+if TYPE_CHECKING:  # 天勤、可选功能和策略模块在使用时才导入
+    from dispatch import Dispatcher
+    from metrics import Metrics
+    from monitor import Monitor
+    from recorder import Recorder
+    from shm import ShmPublisher
+    from snapshot import Snapshot
+    from tq import Tq
+    from trade import Trade
 
 
 class Engine:
@@ -29,57 +39,256 @@ class Engine:
         if cls.PLATFORM.startswith('win'):
             _ = '\\'
         path = f'{sys.path[0]}{_}..{_}..{_}config.yml'
-        with open(path, 'r', encoding='utf-8') as f:
-            config = yaml.load(f, Loader=yaml.CLoader)
-        return config
+        return load_config(path)
 
-    def __init__(self) -> None:
+    def __init__(self, config: dict = None) -> None:
+        """
+        Args:
+            config: （可选）直接传入配置，默认读取`config.yml` \n
+        """
+        # 启动耗时{(阶段, 名称, 合约): 纳秒}
+        self.timings = {}
+        start = time.perf_counter_ns()
         # 获取配置文件
-        self.config = self.get_config()
+        self.config = config or self.get_config()
+        self.timings['config', '', ''] = time.perf_counter_ns() - start
+        # 策略注册表，策略模块在创建策略时才导入
+        self.registry = StrategyRegistry(self.config['strategies'],
+                                         self.timings)
         # 登录天勤
-        self.tq = self._get_tq_api()
+        with self.registry.timed('login'):
+            self.tq = self._get_tq_api()
         # 订阅合约
         self.subscription = Subscription(self.tq.api)
-        self.quotes_dict, self.klines_dict, self.ticks_dict = self._get_subs()
+        with self.registry.timed('subscribe'):
+            subs = self._get_subs()
+        self.quotes_dict, self.klines_dict, self.ticks_dict = subs
+        # 本地合成多周期K线
+        self.bars_dict = self._get_resampled()
+        # 多合约对齐面板
+        self.panel = self._get_panel()
         # 初始化账户
-        self.trade = Trade(self.tq.api, self.quotes_dict, self.tq.accounts)
+        self.trade = self._get_trade()
         self.accounts_info = self.trade.accounts_info
         self.positions = self.trade.positions
         self.orders = self.trade.orders
+        # 行情录制
+        self.recorder = self._get_recorder()
+        # 共享内存行情
+        self.publisher = self._get_publisher()
+        # 热重启快照
+        with self.registry.timed('snapshot'):
+            self.snapshot = self._get_snapshot()
+        # 每次更新在策略之前执行的阶段
+        resampler = self.subscription.resampler
+        risk = getattr(self.trade, 'risk', None)
+        self.stages = [
+            stage
+            for stage in (risk and risk.update, resampler and resampler.update,
+                          self.panel and self.panel.update,
+                          self.recorder and self.recorder.record,
+                          self.publisher and self.publisher.publish) if stage
+        ]
+        if self._lazy():
+            self._next_release = time.monotonic()
+            self.stages.append(self._release_idle)
+        if self.snapshot:
+            self.stages.append(self._save_snapshot)
+        # 耗时统计，关闭时不经过任何计时代码
+        self.metrics = self._get_metrics()
+        if self.metrics:
+            self.step = self._step_timed
+            if risk:
+                risk.attach(self.metrics)
 
-    def _get_tq_api(self) -> Tq:
+    def _get_tq_api(self) -> 'Tq':
         """
         登录天勤，返回天勤对象
         """
-        return Tq(self.config['tq_username'], self.config['tq_password'],
-                  self.config['type'], self.config['gui'],
-                  self.config['balance'], self.config['accounts'])
+        config = self.config
+        _type, replay = config['type'], config.get('replay')
+        # 回测区间的历史数据已下载到本地时离线回放，不再从天勤拉取
+        cached = None
+        if _type == 'huice' and (config.get('download')
+                                 or {}).get('cache_first'):
+            from download import cached_replay
+            cached = cached_replay(config)
+        if cached:
+            print(f'使用本地缓存回测: {cached["path"]}')
+            _type, replay = 'replay', cached
+        from tq import Tq
+        return Tq(config['tq_username'], config['tq_password'], _type,
+                  config['gui'], config['balance'], config['accounts'],
+                  config.get('start_dt'), config.get('end_dt'), replay)
+
+    def _get_trade(self) -> 'Trade':
+        """
+        初始化交易对象
+        """
+        from trade import Trade
+        return Trade(self.tq.api, self.quotes_dict, self.tq.accounts,
+                     self.config.get('netting'), self.tq.ratios,
+                     self.config.get('risk'))
 
     def _get_subs(self) -> List[Union[dict, None]]:
         """
         获取需要订阅的合约，返回订阅的对象
         """
-        subs = []
-        # quotes
-        if quotes := self.config.get('quotes', None):
-            subs.append(self.subscription.get_quotes(quotes))
-        else:
-            subs.append(None)
-        # klines
-        if klines := self.config.get('klines', None):
-            subs.append(
-                self.subscription.get_klines(klines, self.config['merge']))
-        else:
-            subs.append(None)
-        # ticks
-        if ticks := self.config.get('ticks', None):
-            subs.append(self.subscription.get_ticks(ticks))
+        quotes = self.config.get('quotes', None)
+        klines = self.config.get('klines', None)
+        ticks = self.config.get('ticks', None)
+        subscribe = self.config.get('subscribe') or {}
+        lazy = None
+        if (self.config.get('lazy')
+                or {}).get('enabled') and not hasattr(self.tq.api, 'release'):
+            print('天勤没有取消订阅的接口，延迟订阅只在离线回放中开启')
+        if self._lazy():
+            # K线/Tick在策略读取时才订阅
+            lazy = (self.subscription.lazy_klines(klines) if klines else None,
+                    self.subscription.lazy_ticks(ticks) if ticks else None)
+            klines, ticks = None, None
+        if subscribe.get('batch'):
+            # 一次发出全部订阅请求并同时等待，超时未就绪的合约在事件循环中继续等待
+            subs = self.subscription.subscribe(quotes, klines, ticks,
+                                               self.config['merge'])
         else:
-            subs.append(None)
+            subs = [
+                self.subscription.get_quotes(quotes) if quotes else None,
+                self.subscription.get_klines(klines, self.config['merge'])
+                if klines else None,
+                self.subscription.get_ticks(ticks) if ticks else None
+            ]
+        if lazy:
+            subs[1], subs[2] = lazy
         if not any(subs):
-            raise "\n请正确传入需要订阅的合约"
+            raise ValueError("\n请正确传入需要订阅的合约")
+        if subscribe.get('batch'):
+            self.subscription.wait_ready(subscribe.get('timeout', 30),
+                                         subscribe.get('interval', 1))
         return subs
 
+    def _get_resampled(self) -> Union[dict, None]:
+        """
+        按`config.yml`中的`resample`项由已订阅的K线/Tick合成多周期K线，未配置时返回`None`
+        """
+        config = self.config.get('resample') or {}
+        if not config.get('klines'):
+            return None
+        if self.config['merge']:
+            raise ValueError('合并的K线不支持本地合成多周期K线')
+        return self.subscription.resample(config['klines'], self.klines_dict,
+                                          self.ticks_dict,
+                                          config.get('data_length', 200))
+
+    def _get_panel(self):
+        """
+        按`config.yml`中的`panel`项把`klines`中的合约对齐为面板，未开启时返回`None`
+        """
+        config = self.config.get('panel') or {}
+        if not config.get('enabled'):
+            return None
+        if self.config['merge']:
+            raise ValueError('合并的K线不支持多合约对齐面板')
+        return self.subscription.get_panel(self.config['klines'],
+                                           config.get('data_length', 200),
+                                           self.klines_dict)
+
+    def _lazy(self) -> bool:
+        """
+        是否开启延迟订阅，合并的K线不支持；
+        天勤没有取消订阅的接口，只在支持释放订阅的离线回放中开启
+        """
+        return bool((self.config.get('lazy') or {}).get('enabled')
+                    and not self.config['merge']
+                    and hasattr(self.tq.api, 'release'))
+
+    @staticmethod
+    def _pinned(subs: Union[dict, None]) -> Union[dict, None]:
+        """录制、共享内存发布的行情需要持续订阅"""
+        return {s: resolve(obj) for s, obj in subs.items()} if subs else subs
+
+    def _release_idle(self) -> None:
+        """定时释放闲置的延迟订阅"""
+        now = time.monotonic()
+        if now < self._next_release:
+            return
+        idle = self.config['lazy'].get('idle', 600)
+        self._next_release = now + min(idle / 10, 60)
+        for handle in self.subscription.release_idle(idle):
+            print(f'释放闲置订阅: {handle.kind} {handle.symbol}')
+
+    def _get_recorder(self) -> Union['Recorder', None]:
+        """
+        按`config.yml`中的`record`项创建行情录制，未配置时返回`None`
+        """
+        record = self.config.get('record') or {}
+        if not record.get('path'):
+            return None
+        from recorder import Recorder
+        recorder = Recorder(self.tq.api, record['path'],
+                            record.get('flush_interval', 1.0),
+                            record.get('batch_size', 1000))
+        recorder.watch(
+            self.quotes_dict if record.get('quotes', True) else None,
+            # 合并的K线没有单合约字段，不录制
+            self._pinned(self.klines_dict) if record.get('klines', True)
+            and not self.config['merge'] else None,
+            self._pinned(self.ticks_dict)
+            if record.get('ticks', True) else None)
+        return recorder
+
+    def _get_publisher(self) -> Union['ShmPublisher', None]:
+        """
+        按`config.yml`中的`shm`项把订阅的K线/Tick发布到共享内存，未开启时返回`None`
+        """
+        config = self.config.get('shm') or {}
+        if not config.get('enabled'):
+            return None
+        from shm import ShmPublisher
+        return ShmPublisher(
+            self.tq.api,
+            None if self.config['merge'] else self._pinned(self.klines_dict),
+            self._pinned(self.ticks_dict), config.get('capacity', 10000))
+
+    def _get_snapshot(self) -> Union['Snapshot', None]:
+        """
+        按`config.yml`中的`snapshot`项读取热重启快照，未配置时返回`None`
+        """
+        config = self.config.get('snapshot') or {}
+        if not config.get('path'):
+            return None
+        from snapshot import Snapshot
+        return Snapshot(config['path'], config.get('interval', 60),
+                        config.get('max_age', 0))
+
+    def _save_snapshot(self) -> None:
+        """定时在后台写入快照"""
+        self.snapshot.tick(self.trade, self.strategies)
+
+    def _close(self) -> None:
+        """结束时释放录制和共享内存，写入最终的快照"""
+        if self.snapshot:
+            self.snapshot.close(self.trade, self.strategies)
+        if self.dispatcher.conflate:
+            print(f'----conflate----:\n{self.dispatcher.status()}\n')
+        if self.recorder:
+            self.recorder.close()
+        if self.publisher:
+            self.publisher.close()
+
+    def _get_metrics(self) -> Union['Metrics', None]:
+        """
+        按`config.yml`中的`metrics`项创建耗时统计，未开启时返回`None`
+        """
+        config = self.config.get('metrics') or {}
+        if not config.get('enabled'):
+            return None
+        from metrics import Metrics
+        metrics = Metrics()
+        metrics.export(config.get('path'), config.get('port'),
+                       config.get('interval', 10))
+        return metrics
+
     def run(self) -> None:
         """
         事件循环函数:
@@ -88,38 +297,205 @@ class Engine:
         * 让正在运行中的后台任务获得动作机会(如策略程序创建的后台调仓任务只会在wait_update()时发出交易指令).
         * 如果没有收到数据包，则挂起等待.
         """
-        # 初始化持仓对象
-        task_dict = self.trade.set_trades()
-
-        # 初始化策略
-        self.strategies = []
-        strategies = self.config['strategies']
-        for name, quote in self.quotes_dict.items():
-            kline = self.klines_dict.get(name, None)
-            tick = self.ticks_dict.get(name, None)
-            exec(f'self.strategies.append(monitor.{strategies}())')
-            for s in self.strategies:
-                s.init(self.tq.api, self.accounts_info, self.positions,
-                       self.orders, quote, kline, tick)  # 初始化策略
-
         # 事件循环
-        # TODO: 添加异步执行
+        if self.config.get('mode') == 'async':
+            return self.run_async()
+        self.setup()
+        wait_update = self.tq.api.wait_update
+        if self.metrics:
+            # 阻塞等待行情的时间是空闲时间，单独统计，处理耗时见`step`
+            wait_update = self.metrics.timed('wait', wait_update)
         try:
-            while self.tq.api.wait_update():  # 等待更新
-                for task in task_dict.values():  # 遍历合约对象
-                    for s in self.strategies:  # 遍历策略
-                        if volume := s.execution():  # 执行策略
-                            self.trade.trading(task, volume)  # 调仓
+            while wait_update():  # 等待更新
+                self.step()
         except Exception as e:
             self.tq.api.close()
+        finally:
+            self._close()
+            if self.metrics and (path := self.config['metrics'].get('path')):
+                self.metrics.write(path)
+
+    def run_async(self) -> None:
+        """
+        异步事件循环:
+        每个策略作为独立协程，只等待自己声明的输入更新，
+        `EXECUTOR = True`的策略在线程池中执行，不阻塞其他合约的信号计算，
+        执行时读取交出前复制的行情，不能调用天勤API
+        """
+        from concurrent.futures import ThreadPoolExecutor
+        self.setup()
+        api = self.tq.api
+        self.executor = ThreadPoolExecutor(self.config.get('workers'))
+        for s, task in self.dispatcher.strategies:
+            api.create_task(self._strategy_task(s, task))
+        try:
+            while api.wait_update():  # 驱动协程
+                for stage in self.stages:
+                    stage()
+                self.trade.flush()  # 下达本次更新中各策略的净目标持仓
+        finally:
+            # 先等待线程池中的策略执行完，再结束策略协程恢复快照
+            self.executor.shutdown(wait=True)
+            api.close()  # 结束策略协程
+            self._close()
+
+    async def _strategy_task(self, s: 'Monitor', task) -> None:
+        """
+        策略协程，在策略的输入发生变化时执行策略
+        """
+        loop = asyncio.get_running_loop()
+        clock = time.perf_counter_ns
+        name = type(s).__name__
+        resampler = self.subscription.resampler
+        objs = [resolve(obj) for obj, _ in s.inputs()]
+        if resampler:
+            # 合成K线随基础行情变化
+            objs = [resampler.source(obj) or obj for obj in objs]
+        async with self.tq.api.register_update_notify(objs) as update_chan:
+            async for _ in update_chan:
+                start = clock()
+                if resampler:
+                    resampler.update(clear=False)
+                if s.EXECUTOR:
+                    # 执行期间`wait_update()`继续更新行情，策略读取交出前的快照
+                    with s.frozen():
+                        volume = await loop.run_in_executor(
+                            self.executor, s.execution)
+                else:
+                    volume = s.execution()
+                if self.metrics:
+                    self.metrics.observe('execution',
+                                         clock() - start, name, s.symbol)
+                if volume:
+                    self.trade.trading(task, volume, s)
+
+    def setup(self) -> None:
+        """
+        初始化持仓对象和策略，每个合约按`strategies`创建一个或多个策略对象
+        """
+        with self.registry.timed('setup'):
+            self.task_dict = self.trade.set_trades()
+            conflate = self.config.get('conflate') or {}
+            from dispatch import Dispatcher
+            self.dispatcher = Dispatcher(
+                self.tq.api, self.subscription.resampler,
+                conflate if conflate.get('enabled') else None, self.metrics)
+            self.strategies = []
+            for name in self.quotes_dict:
+                if self.subscription.is_ready(name):
+                    self._setup_symbol(name)
+            if self.snapshot:
+                self.snapshot.restore(self.trade, self.task_dict,
+                                      self.strategies)
+        if self.subscription.pending:
+            # 订阅超时的合约就绪后再启动策略
+            self.stages.append(self._start_ready)
+        self._report_startup()
+
+    def _setup_symbol(self, name: str) -> None:
+        """创建合约的策略对象，每个(策略, 合约)只创建一次"""
+        for strategy in self.registry.create(name):
+            self.add_strategy(name, strategy)
+
+    def _report_startup(self) -> None:
+        """打印启动耗时，开启耗时统计时同时写入指标"""
+        print(f'----startup----:\n{self.registry.report()}\n')
+        if self.metrics:
+            for (stage, name, symbol), ns in self.timings.items():
+                self.metrics.observe(f'startup_{stage}', ns, name, symbol)
+
+    def _start_ready(self) -> None:
+        """
+        启动本次更新中新就绪合约的策略，全部就绪后移除此阶段
+        """
+        for name in self.subscription.poll():
+            if name not in self.quotes_dict:
+                continue
+            count = len(self.dispatcher.strategies)
+            self._setup_symbol(name)
+            if self.config.get('mode') == 'async':
+                for s, task in self.dispatcher.strategies[count:]:
+                    self.tq.api.create_task(self._strategy_task(s, task))
+        if not self.subscription.pending:
+            self.stages = [s for s in self.stages if s != self._start_ready]
+
+    def add_strategy(self, name: str, strategy: 'Monitor') -> None:
+        """
+        初始化策略并注册到调度器
+
+        Args:
+            name: 合约代码，需在`quotes`中 \n
+            strategy: 策略对象 \n
+        """
+        kline = (self.klines_dict or {}).get(name, None)
+        tick = (self.ticks_dict or {}).get(name, None)
+        strategy.symbol = name
+        strategy.bars = (self.bars_dict or {}).get(name, {})
+        strategy.panel = self.panel
+        # 快照中的指标在`init`中挂载时恢复，只补算之后收盘的K线
+        strategy.snapshot = self.snapshot.get(
+            strategy) if self.snapshot else None
+        with self.registry.timed('init', type(strategy).__name__, name):
+            strategy.init(self.tq.api, self.accounts_info, self.positions,
+                          self.orders, self.quotes_dict[name], kline,
+                          tick)  # 初始化策略
+            if strategy.snapshot:
+                strategy.set_state(strategy.snapshot)
+                strategy.snapshot = None
+        self.dispatcher.register(strategy, self.task_dict[name])  # 注册策略输入
+        self.strategies.append(strategy)
+
+    def step(self) -> None:
+        """
+        处理一次`wait_update()`的更新
+        """
+        for stage in self.stages:
+            stage()  # 录制行情、发布共享内存
+        # 只执行输入发生变化的策略
+        for s, task in self.dispatcher.dispatch():
+            if volume := s.execution():  # 执行策略
+                self.trade.trading(task, volume, s)  # 记录目标持仓
+        self.trade.flush()  # 调仓
+
+    def _step_timed(self) -> None:
+        """
+        与`step`相同，记录变化检测、每个策略执行和下单的耗时
+        """
+        clock = time.perf_counter_ns
+        metrics = self.metrics
+        start = clock()
+        for stage in self.stages:
+            stage()
+        woken = self.dispatcher.dispatch()
+        t = clock()
+        metrics.observe('detect', t - start)
+        for s, task in woken:
+            name = type(s).__name__
+            volume = s.execution()
+            t, last = clock(), t
+            metrics.observe('execution', t - last, name, s.symbol)
+            if volume:
+                self.trade.trading(task, volume, s)
+                t, last = clock(), t
+                metrics.observe('order', t - last, name, s.symbol)
+        self.trade.flush()
+        t, last = clock(), t
+        metrics.observe('flush', t - last)
+        metrics.observe('step', t - start)
 
 
 if __name__ == "__main__":
-    e = Engine()
+    config = Engine.get_config()
+    if config.get('mode') == 'shard':
+        # 多进程分片运行
+        from shard import Coordinator
+        Coordinator(config).run()
+        sys.exit()
+    e = Engine(config)
     # 打印订阅信息
     print(f'----quotes----:\n{e.quotes_dict}\n')
     print(f'----klines----:\n{e.klines_dict}\n')
     print(f'----ticks----:\n{e.ticks_dict}\n')
     # 打印账户信息
     print(f'----accounts_info----:\n{e.accounts_info}\n')  # 账户资金情况
-    e.run()
\ No newline at end of file
+    e.run()
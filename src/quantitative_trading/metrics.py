@@ -0,0 +1,165 @@
+#!/usr/bin/env python
+#-*- coding: utf-8 -*-
+#FILE: metrics.py
+#CREATE_TIME: 2026-10-18
+#AUTHOR: Sancho
+"""
+热路径耗时统计
+按阶段、策略、合约记录耗时直方图，导出Prometheus文本格式(文件或本地HTTP端口)
+"""
+
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Tuple
+
+BUCKETS = 32  # 第i个桶统计耗时 < 2**i 纳秒，最后一个桶约2.1秒，之后为溢出桶
+IDLE = ('wait', )  # 空闲等待的阶段，不是处理耗时
+
+
+class Histogram:
+    """固定内存的耗时直方图，按2的幂分桶"""
+    __slots__ = ('counts', 'sum', 'count')
+
+    def __init__(self) -> None:
+        self.counts = [0] * (BUCKETS + 1)
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, ns: int) -> None:
+        self.counts[min(ns.bit_length(), BUCKETS)] += 1
+        self.sum += ns
+        self.count += 1
+
+
+class Metrics:
+    def __init__(self, prefix: str = 'rookietest') -> None:
+        """
+        耗时统计
+
+        Args:
+            prefix: 指标名前缀 \n
+        """
+        self.prefix = prefix
+        # {(阶段, 策略, 合约): 直方图}
+        self.histograms: Dict[Tuple[str, str, str], Histogram] = {}
+        self.counters: Dict[Tuple[str, str, str], int] = {}
+        self._server = None
+
+    def observe(self,
+                stage: str,
+                ns: int,
+                strategy: str = '',
+                symbol: str = '') -> None:
+        """记录一次耗时(纳秒)"""
+        key = (stage, strategy, symbol)
+        if (h := self.histograms.get(key)) is None:
+            h = self.histograms[key] = Histogram()
+        h.observe(ns)
+
+    def count(self,
+              name: str,
+              n: int = 1,
+              strategy: str = '',
+              symbol: str = '') -> None:
+        """累加计数器"""
+        key = (name, strategy, symbol)
+        self.counters[key] = self.counters.get(key, 0) + n
+
+    def timed(self, stage: str, fn: Callable) -> Callable:
+        """包装函数，记录每次调用的耗时"""
+        clock = time.perf_counter_ns
+
+        def wrapper(*args, **kwargs):
+            t = clock()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                self.observe(stage, clock() - t)
+
+        return wrapper
+
+    def render(self) -> str:
+        """导出Prometheus文本格式，空闲等待单独导出，不计入各阶段耗时"""
+        histograms = list(self.histograms.items())
+        name = f'{self.prefix}_stage_seconds'
+        lines = [f'# HELP {name} 热路径各阶段耗时', f'# TYPE {name} histogram']
+        lines += self._render(name,
+                              [(k, h)
+                               for k, h in histograms if k[0] not in IDLE])
+        name = f'{self.prefix}_idle_seconds'
+        lines += [f'# HELP {name} 等待行情更新的空闲时间', f'# TYPE {name} histogram']
+        lines += self._render(name,
+                              [(k, h) for k, h in histograms if k[0] in IDLE])
+        name = f'{self.prefix}_events_total'
+        lines += [f'# HELP {name} 事件计数', f'# TYPE {name} counter']
+        for (event, strategy, symbol), n in list(self.counters.items()):
+            lines.append(f'{name}{{event="{event}",strategy="{strategy}",'
+                         f'symbol="{symbol}"}} {n}')
+        return '\n'.join(lines) + '\n'
+
+    @staticmethod
+    def _render(name: str, histograms: list) -> List[str]:
+        lines = []
+        for (stage, strategy, symbol), h in histograms:
+            labels = f'stage="{stage}",strategy="{strategy}",symbol="{symbol}"'
+            total = 0
+            for i, c in enumerate(h.counts[:BUCKETS]):
+                total += c
+                lines.append(
+                    f'{name}_bucket{{{labels},le="{2**i / 1e9:.9g}"}} {total}')
+            lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {h.count}')
+            lines.append(f'{name}_sum{{{labels}}} {h.sum / 1e9:.9f}')
+            lines.append(f'{name}_count{{{labels}}} {h.count}')
+        return lines
+
+    def write(self, path: str) -> None:
+        """写入文本文件(先写临时文件再替换，供node_exporter的textfile采集)"""
+        tmp = f'{path}.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            f.write(self.render())
+        os.replace(tmp, path)
+
+    def export(self,
+               path: str = None,
+               port: int = None,
+               interval: float = 10) -> None:
+        """
+        后台导出指标
+
+        Args:
+            path: 定时写入的文本文件 \n
+            port: 本地HTTP端口，访问`http://127.0.0.1:{port}/metrics` \n
+            interval: 写文件的间隔秒数 \n
+        """
+        if path:
+
+            def loop():
+                while True:
+                    time.sleep(interval)
+                    try:
+                        self.write(path)
+                    except Exception as e:
+                        print(f'{e}\n指标写入失败')
+
+            threading.Thread(target=loop, daemon=True).start()
+        if port:
+            metrics = self
+
+            class Handler(BaseHTTPRequestHandler):
+                def do_GET(self):
+                    body = metrics.render().encode('utf-8')
+                    self.send_response(200)
+                    self.send_header('Content-Type',
+                                     'text/plain; version=0.0.4')
+                    self.send_header('Content-Length', str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+
+                def log_message(self, *args):
+                    pass
+
+            self._server = ThreadingHTTPServer(('127.0.0.1', port), Handler)
+            threading.Thread(target=self._server.serve_forever,
+                             daemon=True).start()
@@ -7,30 +7,142 @@
 策略库
 """
 
+import copy
 from abc import ABCMeta, abstractmethod
+from contextlib import contextmanager
 import pandas
 from tqsdk import TqApi, TargetPosTask, TqAccount
 from typing import Union, List, Any
 from tqsdk.objs import Position, Order, Quote
+from indicators import BarFeed, Indicator, DualThrustRange
+from subscription import LazySerial, SerialView
 
 
 class Monitor(metaclass=ABCMeta):
-    def __init__(self) -> None:
-        pass
+    # 策略读取的行情: {'quote'|'kline'|'tick': 字段列表，`None`表示任意字段}
+    # 引擎只在这些输入发生变化时调用`execution`
+    INPUTS = {'quote': None, 'kline': None, 'tick': None}
+    # 异步模式下在线程池中执行，适用于计算量大的策略，
+    # 执行时读取的是交出前复制的行情和账户(参考`frozen`)，不能调用`self.api`
+    EXECUTOR = False
+    # 热重启时从快照恢复的属性名，`add_indicator`挂载的指标总是恢复
+    STATE = ()
+
+    def __init__(self, **params) -> None:
+        """
+        Args:
+            params: 覆盖策略的类属性参数，如`DualThrust(NDAY=10)` \n
+        """
+        for name, value in params.items():
+            if not hasattr(type(self), name):
+                raise AttributeError(f'{type(self).__name__}没有参数{name}')
+            setattr(self, name, value)
+        self.params = params
+        self.dispatcher = None  # 由`Dispatcher.register`设置
+        self.bars = {}  # 本地合成的多周期K线{周期: K线序列}，由引擎设置
+        self.panel = None  # 多合约对齐面板`KlinePanel`，由引擎设置
+        self.snapshot = None  # 快照中的状态，由引擎在`init`之前设置
+        self._changes = None  # `frozen`期间各输入的变化结果{(id(obj), 字段): 是否变化}
 
     def init(self, api: TqApi, account: TqAccount, position: Position,
              order: Order, quote: Quote, kline: pandas.DataFrame,
              tick: pandas.DataFrame):
         """
-        初始化策略函数
+        初始化策略函数，`kline`、`tick`包装为`SerialView`，
+        通过`self.kline.last('close')`等读取，`to_pandas()`返回原始序列，
+        开启延迟订阅时第一次读取才订阅
         """
         self.api = api
         self.account = account
         self.position = position
         self.order = order
         self.quote = quote
-        self.kline = kline
-        self.tick = tick
+        self.kline = SerialView(kline) if kline is not None else None
+        self.tick = SerialView(tick) if tick is not None else None
+        self.feed = None  # 增量指标，通过`add_indicator`挂载
+
+    def add_indicator(self, name: str, indicator: Indicator) -> Indicator:
+        """
+        挂载增量指标，由`self.kline`中新收盘的K线驱动，
+        调用`self.feed.update()`推送新K线
+
+        Example:
+            self.ma = self.add_indicator('ma', SMA(20))
+        """
+        if self.feed is None:
+            self.feed = BarFeed(self.kline)
+            if self.snapshot and self.snapshot.get('feed'):
+                # 使用快照中的指标，只推送快照之后收盘的K线
+                self.feed.restore(*self.snapshot['feed'])
+        return self.feed.add(name, indicator)
+
+    def get_state(self) -> dict:
+        """
+        写入快照的状态：`STATE`中的属性和挂载的指标
+        """
+        return {
+            'attrs': {name: getattr(self, name) for name in self.STATE},
+            'feed': self.feed.state() if self.feed else None
+        }
+
+    def set_state(self, state: dict) -> None:
+        """
+        从快照恢复`STATE`中的属性，在`init`之后调用
+        """
+        for name, value in state.get('attrs', {}).items():
+            if name in self.STATE:
+                setattr(self, name, value)
+
+    def inputs(self) -> List[tuple]:
+        """
+        返回策略声明的输入，`[(obj, key), ...]`
+        """
+        inputs = []
+        for name, key in self.INPUTS.items():
+            if (obj := getattr(self, name, None)) is not None:
+                inputs.append((obj, key))
+        return inputs
+
+    @contextmanager
+    def frozen(self):
+        """
+        输入快照，在线程池中执行`execution`前使用：
+        执行期间主线程的`wait_update()`继续原地更新行情和账户，
+        因此复制行情、账户和K线序列，`changed`返回复制时的结果，
+        `self.api`不可用，退出时恢复原对象
+        """
+        names = ('quote', 'kline', 'tick', 'account', 'position', 'order')
+        saved = {name: getattr(self, name, None) for name in names}
+        saved.update(api=self.api, bars=self.bars)
+        changes = {}
+        for name in names:
+            if (obj := saved[name]) is None:
+                continue
+            if isinstance(obj, SerialView):
+                frozen = SerialView(obj.to_pandas().copy())
+                fields = obj.to_pandas().columns
+            else:
+                frozen = copy.copy(obj)
+                fields = list(obj.keys()) if name == 'quote' else ()
+            if name in self.INPUTS:
+                # 只能在主线程调用`changed`，交出前计算各字段的结果
+                changes[(id(frozen), None)] = self.changed(obj)
+                for field in fields:
+                    changes[(id(frozen), field)] = self.changed(obj, field)
+            setattr(self, name, frozen)
+        self.bars = {k: v.copy() for k, v in saved['bars'].items()}
+        if self.feed is not None:
+            self.feed.kline = self.kline
+        self.api = _NoApi()
+        self._changes = changes
+        try:
+            yield self
+        finally:
+            self._changes = None
+            for name, obj in saved.items():
+                setattr(self, name, obj)
+            if self.feed is not None:
+                self.feed.kline = self.kline
 
     @abstractmethod
     def execution(self):
@@ -52,12 +164,36 @@ class Monitor(metaclass=ABCMeta):
         Example:
             changed(quote, "last_price")
         """
+        if self._changes is not None:
+            keys = key if isinstance(key, list) else [key]
+            try:
+                return any(self._changes[(id(obj), k)] for k in keys)
+            except KeyError:
+                raise RuntimeError(
+                    f'{type(self).__name__}在线程池中执行，只能判断`INPUTS`中输入的变化'
+                ) from None
+        if isinstance(obj, SerialView):
+            obj = obj.to_pandas()
+        elif isinstance(obj, LazySerial):
+            obj = obj.get()
+        if self.dispatcher is not None:
+            # 已声明的输入直接复用调度器本次计算的结果
+            if (result := self.dispatcher.cached(obj, key,
+                                                 self)) is not None:
+                return result
+            return self.dispatcher.is_changing(obj, key)
         return self.api.is_changing(obj, key)
 
     def send():
         pass
 
 
+class _NoApi:
+    """`frozen`期间代替`self.api`，天勤API不是线程安全的"""
+    def __getattr__(self, name):
+        raise RuntimeError('线程池中执行的策略不能调用天勤API')
+
+
 """
 添加策略时，需要继承`Monitor`类，并实现其中被`@abstractmethod`装饰的函数
 使用策略时，在`config.yml`中`strategies`项中指定策略的类，如`DualThrust`
@@ -68,6 +204,8 @@ class Demo(Monitor):
     """
     添加策略示例
     """
+    INPUTS = {'quote': 'last_price', 'kline': None}
+
     def __init__(self) -> None:
         super().__init__()
 
@@ -78,8 +216,8 @@ class Demo(Monitor):
         print('---------- 执行策略 ----------')
         if self.changed(self.quote, 'last_price'):
             print(f"最新价: {self.quote['last_price']}")
-        if self.changed(self.kline.iloc[-1]):
-            print(f"最新K线: {self.kline.iloc[-1]}")
+        if self.changed(self.kline):
+            print(f"最新K线: {self.kline.row()}")
         print('---------- 策略结束 ----------')
         return 0
 
@@ -93,28 +231,49 @@ class DualThrust(Monitor):
     NDAY = 5  # 天数
     K1 = 0.2  # 上轨K值
     K2 = 0.2  # 下轨K值
+    INPUTS = {'quote': 'last_price', 'kline': None}
 
-    def __init__(self, *args) -> None:
-        super().__init__(*args)
+    def init(self, *args, **kwargs):
+        super().init(*args, **kwargs)
+        self.range = self.add_indicator('range', DualThrustRange(self.NDAY))
         # 获取上下轨
+        self.bar = None  # 最新K线的(id, 开盘价)
         self.buy_line, self.sell_line = self.dual_thrust(self.kline)
 
-    def dual_thrust(self, kline: pandas.DataFrame):
-        current_open = kline.iloc[-1]["open"]
-        HH = max(kline['high'].iloc[-self.NDAY - 1:-1])  # N日最高价的最高价
-        HC = max(kline['close'].iloc[-self.NDAY - 1:-1])  # N日收盘价的最高价
-        LC = min(kline['close'].iloc[-self.NDAY - 1:-1])  # N日收盘价的最低价
-        LL = min(kline['low'].iloc[-self.NDAY - 1:-1])  # N日最低价的最低价
-        _range = max(HH - LC, HC - LL)
-        buy_line = current_open + _range * self.K1  # 上轨
-        sell_line = current_open - _range * self.K2  # 下轨
+    def dual_thrust(self, kline: SerialView):
+        self.feed.update()  # 只推送新收盘的K线
+        current_open = kline.last('open')
+        self.bar = (kline.last('id'), current_open)
+        buy_line, sell_line = self.range.lines(current_open, self.K1,
+                                               self.K2)  # 上轨,下轨
         print("当前开盘价: %f, 上轨: %f, 下轨: %f" %
               (current_open, buy_line, sell_line))
         return buy_line, sell_line
 
+    @classmethod
+    def signals(cls, data: dict, **params):
+        import numpy as np
+        from backtest import rolling_max, rolling_min, shift
+        n = params.get('NDAY', cls.NDAY)
+        k1 = params.get('K1', cls.K1)
+        k2 = params.get('K2', cls.K2)
+        # 当前K线之前N根K线的极值
+        HH = shift(rolling_max(data['high'], n))
+        HC = shift(rolling_max(data['close'], n))
+        LC = shift(rolling_min(data['close'], n))
+        LL = shift(rolling_min(data['low'], n))
+        _range = np.maximum(HH - LC, HC - LL)
+        buy_line = data['open'] + _range * k1  # 上轨
+        sell_line = data['open'] - _range * k2  # 下轨
+        last_price = data['close']
+        target = np.full(len(last_price), np.nan)
+        target[last_price > buy_line] = 3  # 高于上轨
+        target[last_price < sell_line] = -3  # 低于下轨
+        return target
+
     def execution(self):
         # 新产生一根日线或开盘价发生变化: 重新计算上下轨
-        if self.changed(self.kline.iloc[-1], ["datetime", "open"]):
+        if (self.kline.last('id'), self.kline.last('open')) != self.bar:
             self.buy_line, self.sell_line = self.dual_thrust(self.kline)
 
         # 如果最新价发生改变则判断信号
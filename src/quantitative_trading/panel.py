@@ -0,0 +1,172 @@
+#!/usr/bin/env python
+#-*- coding: utf-8 -*-
+#FILE: panel.py
+#CREATE_TIME: 2026-10-18
+#AUTHOR: Sancho
+"""
+多合约对齐面板
+把多个合约的K线对齐为`(合约 × 时间 × 字段)`的NumPy数组，便于截面计算
+
+* 时间轴由最小周期的K线时间组成，缺失的时间前向填充
+* 较大周期的K线收盘后才写入，位于收盘时间(起点+周期)对应的时间点，之后前向填充，
+  未收盘的K线不写入，历史和实时数据都不会看到未来
+* 每次更新只写入新的行，存储为双写的环形缓冲区，`values`始终是最近N行的视图
+"""
+
+import math
+from typing import Dict, List, Union
+import numpy as np
+from pandas import DataFrame
+from tqsdk import TqApi
+from utils import NS
+
+
+class KlinePanel:
+    FIELDS = ('open', 'high', 'low', 'close', 'volume', 'open_oi',
+              'close_oi')
+
+    def __init__(self,
+                 api: TqApi,
+                 klines: Dict[str, DataFrame],
+                 durations: Dict[str, int],
+                 data_length: int = 200,
+                 fields: List[str] = None) -> None:
+        """
+        Args:
+            api: 天勤API \n
+            klines: {合约: K线序列} \n
+            durations: {合约: K线周期(秒)}，可以不同 \n
+            data_length: 时间轴长度 \n
+            fields: 保留的字段，默认开高低收、成交量和持仓量 \n
+
+        Example:
+            panel = KlinePanel(api, klines, {s: 60 for s in klines})
+            close = panel['close']  # ndarray[合约数, 时间]
+            ret = close[:, -1] / close[:, -2] - 1  # 所有合约的最新收益率
+        """
+        self.api = api
+        self.symbols = list(klines)
+        self.fields = list(fields or self.FIELDS)
+        self.symbol_index = {s: i for i, s in enumerate(self.symbols)}
+        self.field_index = {f: i for i, f in enumerate(self.fields)}
+        self.length = data_length
+        self.base = min(durations[s] for s in self.symbols)  # 时间轴的周期
+        self._serials = [klines[s] for s in self.symbols]
+        self._is_base = [durations[s] == self.base for s in self.symbols]
+        # 较大周期的K线按收盘时间对齐
+        self._shift = [
+            0 if base else durations[s] * NS
+            for s, base in zip(self.symbols, self._is_base)
+        ]
+        self._last_id = [-1] * len(self.symbols)  # 各合约已处理的最后一根K线id
+        n = 2 * data_length
+        self._buf = np.full((len(self.symbols), n, len(self.fields)), np.nan)
+        self._time = np.full(n, np.nan)
+        self._count = 0  # 已写入的时间点数
+        self.updated = np.zeros(len(self.symbols), dtype=bool)  # 本次更新变化的合约
+        self.appended = 0  # 本次更新新增的时间点数
+        self.update()
+
+    # |-------------------- 读取 --------------------|
+
+    def _end(self) -> int:
+        if not self._count:
+            return self.length
+        return (self._count - 1) % self.length + self.length + 1
+
+    @property
+    def values(self) -> np.ndarray:
+        """最近的数据，`ndarray[合约数, 时间, 字段数]`，数据不足时前面为`nan`"""
+        end = self._end()
+        return self._buf[:, end - self.length:end]
+
+    @property
+    def datetime(self) -> np.ndarray:
+        """时间轴，K线起点的UTC纳秒时间戳"""
+        end = self._end()
+        return self._time[end - self.length:end]
+
+    def __getitem__(self, key: Union[str, tuple]) -> np.ndarray:
+        """
+        `panel['close']`返回`ndarray[合约数, 时间]`，
+        `panel['KQ.m@DCE.a', 'close']`返回单个合约的`ndarray[时间]`
+        """
+        if isinstance(key, tuple):
+            symbol, field = key
+            return self.values[self.symbol_index[symbol], :,
+                               self.field_index[field]]
+        return self.values[:, :, self.field_index[key]]
+
+    def last(self, field: str) -> np.ndarray:
+        """所有合约最新一行的某个字段，`ndarray[合约数]`"""
+        return self.values[:, -1, self.field_index[field]]
+
+    def symbol(self, symbol: str) -> np.ndarray:
+        """单个合约的数据，`ndarray[时间, 字段数]`"""
+        return self.values[self.symbol_index[symbol]]
+
+    # |-------------------- 更新 --------------------|
+
+    def _append(self, t: float) -> None:
+        """新增时间点，先复制上一行(前向填充)"""
+        p = self._count % self.length
+        if self._count:
+            prev = (self._count - 1) % self.length
+            self._buf[:, p] = self._buf[:, prev]
+            self._buf[:, p + self.length] = self._buf[:, prev]
+        self._time[p] = self._time[p + self.length] = t
+        self._count += 1
+
+    def _write(self, i: int, row: np.ndarray) -> None:
+        """写入合约在最新时间点的数据"""
+        p = (self._count - 1) % self.length
+        self._buf[i, p] = self._buf[i, p + self.length] = row
+        self.updated[i] = True
+
+    def update(self) -> None:
+        """
+        读取各合约K线的新数据，每次`wait_update()`后调用
+        """
+        self.updated[:] = False
+        start = self._count
+        last_time = self._time[(self._count - 1) % self.length +
+                               self.length] if self._count else -math.inf
+        pending, times = [], []
+        for i, serial in enumerate(self._serials):
+            if self._count and not self.api.is_changing(serial):
+                continue
+            ids = serial['id'].to_numpy()
+            if not len(ids) or math.isnan(ids[-1]):
+                continue
+            # 从上次处理的最后一根(可能未收盘)开始读取
+            count = len(ids) if self._last_id[i] < 0 else min(
+                int(ids[-1]) - self._last_id[i] + 1, len(ids))
+            rows = slice(len(ids) - count, len(ids))
+            valid = ~np.isnan(ids[rows])
+            dts = serial['datetime'].to_numpy()[rows][valid] + self._shift[i]
+            vals = np.column_stack(
+                [serial[f].to_numpy()[rows][valid] for f in self.fields])
+            self._last_id[i] = int(ids[-1])
+            pending.append([i, dts, vals, 0])
+            if self._is_base[i]:
+                times.append(dts[dts > last_time])
+        if not pending:
+            self.appended = 0
+            return
+        # 已有时间点内的更新写入最后一行
+        for item in pending:
+            i, dts, vals, _ = item
+            item[3] = j = int(np.searchsorted(dts, last_time, 'right'))
+            if j and self._count:
+                self._write(i, vals[j - 1])
+        # 新的时间点：前向填充，再写入时间不晚于该时间点的最新一根K线
+        for t in np.unique(np.concatenate(times)) if times else ():
+            self._append(t)
+            for item in pending:
+                i, dts, vals, done = item
+                j = int(np.searchsorted(dts, t, 'right'))
+                if j > done:
+                    self._write(i, vals[j - 1])
+                    item[3] = j
+        # 收盘时间晚于时间轴的较大周期K线(未收盘)不写入，收盘后随时间轴写入
+        self.appended = self._count - start
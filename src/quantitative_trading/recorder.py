@@ -0,0 +1,336 @@
+#!/usr/bin/env python
+#-*- coding: utf-8 -*-
+#FILE: recorder.py
+#CREATE_TIME: 2026-10-18
+#AUTHOR: Sancho
+"""
+行情录制
+把订阅的quotes、klines、ticks按交易日追加写入列式文件，每个字段一个定长类型文件，
+读取时使用内存映射，不需要重新从天勤拉取历史数据
+
+目录结构: {root}/{kind}/{symbol}/{交易日}/{字段}.bin
+kind: `quote`、`tick`、`kline_{周期秒数}`
+
+每个交易日的`length`文件记录已提交的行数，所有字段写入后才替换，
+进程中断时未提交的部分在读取时忽略，下次追加前截断，各字段始终对齐
+"""
+
+import math
+import os
+import queue
+import shutil
+import threading
+import time
+from collections import defaultdict
+from typing import Dict, List
+import numpy as np
+from pandas import DataFrame
+from tqsdk import TqApi
+from tqsdk.objs import Quote
+from utils import trading_day, parse_datetime
+
+# 各类行情的字段及类型
+QUOTE = {
+    'datetime': 'i8',
+    'last_price': 'f8',
+    'ask_price1': 'f8',
+    'ask_volume1': 'f8',
+    'bid_price1': 'f8',
+    'bid_volume1': 'f8',
+    'highest': 'f8',
+    'lowest': 'f8',
+    'open': 'f8',
+    'volume': 'f8',
+    'amount': 'f8',
+    'open_interest': 'f8',
+}
+KLINE = {
+    'datetime': 'i8',
+    'id': 'i8',
+    'open': 'f8',
+    'high': 'f8',
+    'low': 'f8',
+    'close': 'f8',
+    'volume': 'f8',
+    'open_oi': 'f8',
+    'close_oi': 'f8',
+}
+TICK = {
+    'datetime': 'i8',
+    'id': 'i8',
+    'last_price': 'f8',
+    'average': 'f8',
+    'highest': 'f8',
+    'lowest': 'f8',
+    'ask_price1': 'f8',
+    'ask_volume1': 'f8',
+    'bid_price1': 'f8',
+    'bid_volume1': 'f8',
+    'volume': 'f8',
+    'amount': 'f8',
+    'open_interest': 'f8',
+}
+
+
+def schema(kind: str) -> Dict[str, str]:
+    if kind == 'quote':
+        return QUOTE
+    if kind == 'tick':
+        return TICK
+    if kind.startswith('kline'):
+        return KLINE
+    raise ValueError(f'未知的行情类型: {kind}')
+
+
+class Store:
+    """列式行情文件的读写"""
+    LENGTH = 'length'  # 已提交的行数
+
+    def __init__(self, root: str) -> None:
+        self.root = root
+
+    def path(self, kind: str, symbol: str, day: int = None) -> str:
+        if day is None:
+            return os.path.join(self.root, kind, symbol)
+        return os.path.join(self.root, kind, symbol, str(day))
+
+    def append(self, kind: str, symbol: str, rows: List[tuple]) -> None:
+        """按交易日追加写入行，`rows`中每行字段顺序与`schema(kind)`一致"""
+        fields = schema(kind)
+        days = defaultdict(list)
+        for row in rows:
+            days[trading_day(row[0])].append(row)
+        for day, day_rows in days.items():
+            path = self.path(kind, symbol, day)
+            os.makedirs(path, exist_ok=True)
+            length = self._length(path, fields)
+            columns = zip(*day_rows)
+            for (name, dtype), col in zip(fields.items(), columns):
+                with open(os.path.join(path, f'{name}.bin'), 'ab') as f:
+                    # 丢弃上次中断时未提交的部分
+                    f.truncate(length * np.dtype(dtype).itemsize)
+                    f.write(np.asarray(col, dtype=dtype).tobytes())
+            self._commit(path, length + len(day_rows))
+
+    def _commit(self, path: str, length: int) -> None:
+        """记录已提交的行数，先写入临时文件再替换"""
+        file = os.path.join(path, self.LENGTH)
+        with open(f'{file}.tmp', 'w', encoding='utf-8') as f:
+            f.write(str(length))
+        os.replace(f'{file}.tmp', file)
+
+    def _length(self, path: str, fields: Dict[str, str]) -> int:
+        """已提交的行数，没有记录时(旧版本录制的数据)取最短的列"""
+        try:
+            with open(os.path.join(path, self.LENGTH), encoding='utf-8') as f:
+                return int(f.read())
+        except (OSError, ValueError):
+            sizes = []
+            for name, dtype in fields.items():
+                file = os.path.join(path, f'{name}.bin')
+                size = os.path.getsize(file) if os.path.exists(file) else 0
+                sizes.append(size // np.dtype(dtype).itemsize)
+            return min(sizes)
+
+    def last_id(self, kind: str, symbol: str) -> int:
+        """已录制的最后一行id，没有数据或没有id字段时返回-1"""
+        if 'id' not in schema(kind):
+            return -1
+        for day in reversed(self.days(kind, symbol)):
+            ids = self.read_day(kind, symbol, day)['id']
+            if len(ids):
+                return int(ids[-1])
+        return -1
+
+    def write_day(self, kind: str, symbol: str, day: int,
+                  columns: Dict[str, np.ndarray]) -> None:
+        """
+        整体写入一个交易日，先写入临时目录再替换，重复写入结果相同(用于历史数据下载)
+        """
+        path = self.path(kind, symbol, day)
+        tmp = f'{path}.tmp'
+        shutil.rmtree(tmp, ignore_errors=True)
+        os.makedirs(tmp)
+        for name, dtype in schema(kind).items():
+            with open(os.path.join(tmp, f'{name}.bin'), 'wb') as f:
+                f.write(np.asarray(columns[name], dtype=dtype).tobytes())
+        self._commit(tmp, len(columns['datetime']))
+        shutil.rmtree(path, ignore_errors=True)
+        os.rename(tmp, path)
+
+    def days(self, kind: str, symbol: str) -> List[int]:
+        """已录制的交易日"""
+        path = self.path(kind, symbol)
+        if not os.path.isdir(path):
+            return []
+        return sorted(int(d) for d in os.listdir(path) if d.isdigit())
+
+    def rows(self, kind: str, symbol: str, day: int) -> int:
+        """一个交易日已录制的行数，不读取数据"""
+        path = self.path(kind, symbol, day)
+        return self._length(path, schema(kind)) if os.path.isdir(path) else 0
+
+    def read_day(self, kind: str, symbol: str,
+                 day: int) -> Dict[str, np.ndarray]:
+        """读取一个交易日，返回内存映射的只读列(零拷贝)"""
+        return self._read(self.path(kind, symbol, day), schema(kind))
+
+    def read(self,
+             kind: str,
+             symbol: str,
+             start: int = None,
+             end: int = None) -> Dict[str, np.ndarray]:
+        """
+        读取交易日区间`[start, end]`并拼接为连续的列
+
+        Args:
+            start: 开始交易日，如`20220901`，默认最早 \n
+            end: 结束交易日，默认最新 \n
+        """
+        days = [
+            d for d in self.days(kind, symbol)
+            if (start is None or d >= start) and (end is None or d <= end)
+        ]
+        parts = [self.read_day(kind, symbol, d) for d in days]
+        if len(parts) == 1:
+            return parts[0]
+        return {
+            name: np.concatenate([p[name] for p in parts])
+            if parts else np.empty(0, dtype)
+            for name, dtype in schema(kind).items()
+        }
+
+    def _read(self, path: str,
+              fields: Dict[str, str]) -> Dict[str, np.ndarray]:
+        cols = {}
+        for name, dtype in fields.items():
+            file = os.path.join(path, f'{name}.bin')
+            if not os.path.exists(file) or not os.path.getsize(file):
+                cols[name] = np.empty(0, dtype)
+            else:
+                cols[name] = np.memmap(file, dtype=dtype, mode='r')
+        # 只读取已提交的行
+        length = self._length(path, fields)
+        return {name: c[:length] for name, c in cols.items()}
+
+
+class Recorder:
+    def __init__(self,
+                 api: TqApi,
+                 root: str,
+                 flush_interval: float = 1.0,
+                 batch_size: int = 1000) -> None:
+        """
+        行情录制，在事件循环中每次`wait_update()`后调用`record()`，
+        写文件在后台线程完成，不阻塞事件循环
+
+        Args:
+            api: 天勤API \n
+            root: 录制目录 \n
+            flush_interval: 缓冲区最长等待写入的秒数 \n
+            batch_size: 单个合约缓冲多少行后写入 \n
+        """
+        self.api = api
+        self.store = Store(root)
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.quotes: Dict[str, Quote] = {}
+        self.klines: Dict[str, DataFrame] = {}
+        self.ticks: Dict[str, DataFrame] = {}
+        self._last_id = {}  # {(kind, symbol): 已录制的最后一行id}
+        self._buffer = defaultdict(list)  # {(kind, symbol): [row, ...]}
+        self._last_flush = time.time()
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._write, daemon=True)
+        self._thread.start()
+
+    def watch(self,
+              quotes: Dict[str, Quote] = None,
+              klines: Dict[str, DataFrame] = None,
+              ticks: Dict[str, DataFrame] = None) -> None:
+        """添加需要录制的行情，参数为`Subscription`返回的字典"""
+        self.quotes.update(quotes or {})
+        self.klines.update(klines or {})
+        self.ticks.update(ticks or {})
+
+    def record(self) -> None:
+        """收集本次更新中发生变化的行，达到批量或时间间隔后交给后台线程写入"""
+        for symbol, quote in self.quotes.items():
+            if self.api.is_changing(quote):
+                self._record_quote(symbol, quote)
+        for symbol, kline in self.klines.items():
+            if self.api.is_changing(kline):
+                kind = f'kline_{int(kline["duration"].iloc[-1])}'
+                self._record_serial(kind, symbol, kline, KLINE, closed=True)
+        for symbol, tick in self.ticks.items():
+            if self.api.is_changing(tick):
+                self._record_serial('tick', symbol, tick, TICK)
+        if time.time() - self._last_flush >= self.flush_interval:
+            self.flush()
+
+    def _record_quote(self, symbol: str, quote: Quote) -> None:
+        if not quote['datetime']:
+            return
+        row = (parse_datetime(quote['datetime']), ) + tuple(
+            quote[f] for f in list(QUOTE)[1:])
+        self._append(('quote', symbol), [row])
+
+    def _record_serial(self,
+                       kind: str,
+                       symbol: str,
+                       serial: DataFrame,
+                       fields: dict,
+                       closed: bool = False) -> None:
+        """
+        录制序列中的新行
+
+        Args:
+            closed: 为`True`时只录制已收盘的K线(不含最后一根) \n
+        """
+        ids = serial['id'].to_numpy()
+        end = len(ids) - 1 if closed else len(ids)
+        if end <= 0 or math.isnan(ids[end - 1]):
+            return
+        if (kind, symbol) not in self._last_id:
+            # 重启后从已录制的最后一行继续，不重复录制
+            self._last_id[(kind, symbol)] = self.store.last_id(kind, symbol)
+        last = self._last_id[(kind, symbol)]
+        count = min(int(ids[end - 1]) - last, end)
+        if count <= 0:
+            return
+        cols = [serial[f].to_numpy() for f in fields]
+        rows = [
+            tuple(c[i] for c in cols) for i in range(end - count, end)
+            if not math.isnan(ids[i])
+        ]
+        self._last_id[(kind, symbol)] = int(ids[end - 1])
+        self._append((kind, symbol), rows)
+
+    def _append(self, key: tuple, rows: List[tuple]) -> None:
+        buffer = self._buffer[key]
+        buffer.extend(rows)
+        if len(buffer) >= self.batch_size:
+            self._queue.put(key + (buffer, ))
+            self._buffer[key] = []
+
+    def flush(self) -> None:
+        """把所有缓冲区交给后台线程"""
+        for key, buffer in self._buffer.items():
+            if buffer:
+                self._queue.put(key + (buffer, ))
+        self._buffer.clear()
+        self._last_flush = time.time()
+
+    def close(self) -> None:
+        """写入剩余数据并等待后台线程结束"""
+        self.flush()
+        self._queue.put(None)
+        self._thread.join()
+
+    def _write(self) -> None:
+        while (item := self._queue.get()) is not None:
+            kind, symbol, rows = item
+            try:
+                self.store.append(kind, symbol, rows)
+            except Exception as e:
+                print(f'{e}\n行情录制失败: {kind} {symbol}')
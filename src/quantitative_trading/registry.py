@@ -0,0 +1,103 @@
+#!/usr/bin/env python
+#-*- coding: utf-8 -*-
+#FILE: registry.py
+#CREATE_TIME: 2026-10-18
+#AUTHOR: Sancho
+"""
+策略注册表
+按`config.yml`中的`strategies`项为每个合约创建策略，策略模块在第一次使用时才导入，
+每个(策略, 合约)只创建一次，并记录导入和初始化的耗时
+
+`strategies`的格式:
+* `Demo`: 所有合约使用同一个策略
+* `[Demo, DualThrust]`: 每个合约使用多个策略
+* `{KQ.m@DCE.a: [DualThrust, Demo], default: Demo}`: 按合约指定，`default`用于其他合约
+* 列表中的元素可以是`{DualThrust: {NDAY: 10}}`形式以覆盖策略参数，
+  类名可以是`模块:类名`形式以使用`monitor.py`以外的策略
+"""
+
+import importlib
+import sys
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Tuple, Union
+
+DEFAULT_MODULE = 'monitor'
+
+
+class StrategyRegistry:
+    def __init__(self,
+                 spec: Union[str, list, dict],
+                 timings: Dict[tuple, int] = None) -> None:
+        """
+        Args:
+            spec: `config.yml`中的`strategies` \n
+            timings: 记录耗时的字典{(阶段, 名称, 合约): 纳秒}，默认新建 \n
+        """
+        self.spec = spec
+        self.timings = {} if timings is None else timings
+        self._classes: Dict[str, type] = {}
+        self.created = set()  # {(合约, 类名, 参数)}
+
+    def entries(self, symbol: str) -> List[Tuple[str, dict]]:
+        """合约使用的策略[(类名, 参数)]"""
+        spec = self.spec
+        if isinstance(spec, dict):
+            spec = spec.get(symbol, spec.get('default'))
+        if not spec:
+            return []
+        entries = []
+        for item in [spec] if isinstance(spec, (str, dict)) else spec:
+            if isinstance(item, dict):
+                entries.extend((name, params or {})
+                               for name, params in item.items())
+            else:
+                entries.append((item, {}))
+        return entries
+
+    def get(self, name: str) -> type:
+        """策略类，第一次使用时导入所在模块"""
+        if (cls := self._classes.get(name)) is not None:
+            return cls
+        module, _, attr = name.rpartition(':')
+        module = module or DEFAULT_MODULE
+        if module not in sys.modules:
+            with self.timed('import', module):
+                importlib.import_module(module)
+        cls = getattr(sys.modules[module], attr, None)
+        if not isinstance(cls, type) or not callable(
+                getattr(cls, 'execution', None)):
+            raise ValueError(f'没有找到策略类: {name}')
+        self._classes[name] = cls
+        return cls
+
+    def create(self, symbol: str) -> list:
+        """创建合约尚未创建的策略对象"""
+        strategies = []
+        for name, params in self.entries(symbol):
+            key = (symbol, name, repr(sorted(params.items())))
+            if key in self.created:
+                continue
+            self.created.add(key)
+            strategies.append(self.get(name)(**params))
+        return strategies
+
+    # |-------------------- 耗时 --------------------|
+
+    @contextmanager
+    def timed(self, stage: str, name: str = '', symbol: str = ''):
+        """记录一段代码的耗时"""
+        start = time.perf_counter_ns()
+        try:
+            yield
+        finally:
+            key = (stage, name, symbol)
+            self.timings[key] = self.timings.get(
+                key, 0) + time.perf_counter_ns() - start
+
+    def report(self) -> str:
+        """按耗时从大到小排列的启动耗时"""
+        rows = sorted(self.timings.items(), key=lambda x: -x[1])
+        return '\n'.join(
+            f'{stage:<10}{" ".join(filter(None, (name, symbol))):<40}'
+            f'{ns / 1e6:>10.2f}ms' for (stage, name, symbol), ns in rows)
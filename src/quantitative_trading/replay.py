@@ -0,0 +1,499 @@
+#!/usr/bin/env python
+#-*- coding: utf-8 -*-
+#FILE: replay.py
+#CREATE_TIME: 2026-10-18
+#AUTHOR: Sancho
+"""
+离线回放
+用行情录制的本地文件代替天勤服务器，实现项目用到的`TqApi`接口，
+不需要登录即可运行、压测和分析引擎
+"""
+
+import asyncio
+import heapq
+import itertools
+import math
+import os
+import time
+from typing import Dict, List, Union
+import numpy as np
+import pandas
+from recorder import Store, KLINE, QUOTE, TICK
+from utils import NS, format_datetime, to_ns
+
+
+class _Obj(dict):
+    """同时支持`obj['key']`和`obj.key`访问的业务对象"""
+    def __getattr__(self, name):
+        try:
+            return self[name]
+        except KeyError:
+            raise AttributeError(name)
+
+    def __setattr__(self, name, value):
+        self[name] = value
+
+
+class _Stream:
+    """一个合约一类行情的录制数据"""
+    def __init__(self, kind: str, symbol: str, cols: Dict[str,
+                                                          np.ndarray]) -> None:
+        self.kind = kind
+        self.symbol = symbol
+        self.cols = cols
+        self.datetime = cols['datetime']
+        self.pos = 0  # 下一行
+        self.targets = []  # 每行数据回调 fn(i)
+
+
+class _UpdateChan:
+    """`register_update_notify`返回的通知通道，多次更新只保留最新一次"""
+    def __init__(self, api, objs: list) -> None:
+        self.api = api
+        self.objs = objs
+        self._event = None
+
+    async def __aenter__(self):
+        self._event = asyncio.Event()
+        self.api._chans.append(self)
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        self.api._chans.remove(self)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self) -> bool:
+        await self._event.wait()
+        self._event.clear()
+        return True
+
+    def notify(self) -> None:
+        if self._event is not None and (not self.objs or any(
+                self.api.is_changing(obj) for obj in self.objs)):
+            self._event.set()
+
+
+class ReplayTargetPosTask:
+    def __init__(self,
+                 api,
+                 symbol: str,
+                 price: str = 'ACTIVE',
+                 offset_priority: str = '今昨,开',
+                 min_volume: int = None,
+                 max_volume: int = None,
+                 trade_chan=None,
+                 trade_objs_chan=None,
+                 account=None) -> None:
+        """
+        回放用目标持仓任务，参数与`TargetPosTask`一致，
+        目标持仓在下一次`wait_update()`时按当时的盘口价一次成交
+        """
+        self.api = api
+        self.symbol = symbol
+        self.price = price
+        self.account = account
+        self.target = None  # 未成交的目标持仓
+        api._tasks.append(self)
+
+    def set_target_volume(self, volume: int) -> None:
+        self.target = int(volume)
+
+    def cancel(self) -> None:
+        self.target = None
+        if self in self.api._tasks:
+            self.api._tasks.remove(self)
+
+    def is_finished(self) -> bool:
+        return self.target is None
+
+
+class ReplayApi:
+    TargetPosTask = ReplayTargetPosTask  # `Trade`使用回放的目标持仓任务
+
+    def __init__(self,
+                 path: str,
+                 speed: float = 0,
+                 start_dt: list = None,
+                 end_dt: list = None,
+                 balance: float = 9999999,
+                 volume_multiple: float = 1,
+                 fee: float = 0) -> None:
+        """
+        离线回放API，数据来自`Recorder`录制的目录
+
+        Args:
+            path: 行情录制目录 \n
+            speed: 回放速度，0=尽可能快，1=按录制时的时间间隔，10=10倍速 \n
+            start_dt: 回放开始日期，如`[2022,01,01]`，之前的K线/Tick预先填入序列 \n
+            end_dt: 回放结束日期 \n
+            balance: 初始资金 \n
+            volume_multiple: 合约乘数 \n
+            fee: 每手手续费 \n
+        """
+        self.store = Store(path)
+        self.speed = speed
+        self.start = to_ns(start_dt) if start_dt else None
+        self.end = to_ns(end_dt) if end_dt else None
+        self.volume_multiple = volume_multiple
+        self.fee = fee
+        self._streams: Dict[tuple, _Stream] = {}
+        self._heap = None  # [(datetime, 序号, stream)]，首次`wait_update`时建立
+        self._seq = itertools.count()
+        self._clock = None  # (回放起点数据时间, 起点墙钟时间)
+        self._now = 0  # 当前回放的数据时间
+        self._changed: Dict[int, Union[set, None]] = {}  # {id(obj): 变化字段}
+        self._changed_rows = set()  # 本次更新中变化的K线/Tick行
+        self._quotes: Dict[str, _Obj] = {}
+        self._positions = _Obj()  # {symbol: 持仓}
+        self._orders = _Obj()
+        self._order_id = itertools.count(1)
+        self._tasks: List[ReplayTargetPosTask] = []
+        self._commission = 0.0
+        self._close_profit = 0.0
+        self._balance = balance
+        self.account = _Obj(balance=balance,
+                            available=balance,
+                            float_profit=0.0,
+                            position_profit=0.0,
+                            close_profit=0.0,
+                            commission=0.0,
+                            margin=0.0,
+                            risk_ratio=0.0)
+        self._account = self.account
+        self._loop = asyncio.new_event_loop()  # 运行`create_task`创建的协程
+        self._chans: List[_UpdateChan] = []
+        self._targets = {}  # {id(序列): (行情流, 更新函数)}
+
+    # |-------------------- 行情 --------------------|
+
+    def _stream(self, kind: str, symbol: str) -> Union[_Stream, None]:
+        key = (kind, symbol)
+        if key not in self._streams:
+            if not self.store.days(kind, symbol):
+                return None
+            cols = self.store.read(kind, symbol)
+            if self.end is not None:
+                n = np.searchsorted(cols['datetime'], self.end)
+                cols = {k: v[:n] for k, v in cols.items()}
+            stream = _Stream(kind, symbol, cols)
+            if self.start is not None:
+                stream.pos = int(np.searchsorted(stream.datetime, self.start))
+            self._streams[key] = stream
+            if self._heap is not None:
+                self._push(stream)
+        return self._streams[key]
+
+    def _push(self, stream: _Stream) -> None:
+        if stream.pos < len(stream.datetime):
+            heapq.heappush(
+                self._heap,
+                (int(stream.datetime[stream.pos]), next(self._seq), stream))
+
+    def _mark(self, obj, fields=None) -> None:
+        if fields is None or self._changed.get(id(obj), 0) is None:
+            self._changed[id(obj)] = None
+        else:
+            self._changed.setdefault(id(obj), set()).update(fields)
+
+    def get_quote(self, symbol: str) -> _Obj:
+        """
+        获取实时行情，没有录制quote时由Tick或K线推算最新价
+        """
+        if symbol in self._quotes:
+            return self._quotes[symbol]
+        # 与天勤的`Quote`相同包含全部行情字段，没有录制的字段为`nan`
+        quote = _Obj({f: math.nan
+                      for f in QUOTE},
+                     instrument_id=symbol,
+                     datetime='',
+                     volume_multiple=self.volume_multiple)
+        self._quotes[symbol] = quote
+        if stream := self._stream('quote', symbol):
+            stream.targets.append(self._on_quote(quote, stream.cols))
+        elif stream := self._stream('tick', symbol):
+            stream.targets.append(self._on_quote(quote, stream.cols))
+        elif kinds := self._kline_kinds(symbol):
+            stream = self._stream(kinds[0], symbol)
+            cols = dict(stream.cols, last_price=stream.cols['close'])
+            stream.targets.append(
+                self._on_quote(quote, cols, ('datetime', 'last_price')))
+        return quote
+
+    def _kline_kinds(self, symbol: str) -> List[str]:
+        """已录制的K线周期，按周期从小到大"""
+        kinds = [
+            k for k in os.listdir(self.store.root)
+            if k.startswith('kline_') and self.store.days(k, symbol)
+        ] if os.path.isdir(self.store.root) else []
+        return sorted(kinds, key=lambda k: int(k.split('_')[1]))
+
+    def _on_quote(self, quote: _Obj, cols: dict, fields: tuple = None):
+        fields = [
+            f for f in (fields or cols) if f in cols and f not in ('id', )
+        ]
+
+        def on_row(i: int) -> None:
+            for f in fields:
+                quote[f] = cols[f][i].item()
+            quote['datetime'] = format_datetime(cols['datetime'][i])
+            self._mark(quote, fields)
+
+        return on_row
+
+    def _serial(self,
+                kind: str,
+                symbol: str,
+                fields: dict,
+                data_length: int,
+                duration: int = None) -> pandas.DataFrame:
+        fields = list(fields)
+        # 与天勤一致：序列由一个二维数组构造，原地更新
+        buf = np.full((data_length, len(fields)), np.nan)
+        df = pandas.DataFrame(buf, columns=fields, copy=False)
+        df['symbol'] = symbol
+        if duration is not None:
+            df['duration'] = duration
+        if not (stream := self._stream(kind, symbol)):
+            print(f'没有录制的行情: {kind} {symbol}')
+            return df
+        cols = stream.cols
+        # 回放起点之前的数据预先填入序列
+        n = min(stream.pos, data_length)
+        for j, f in enumerate(fields):
+            buf[data_length - n:, j] = cols[f][stream.pos - n:stream.pos]
+        key = ('kline', symbol, duration) if duration is not None else ('tick',
+                                                                        symbol)
+        columns = [cols[f] for f in fields]
+
+        def on_row(i: int) -> None:
+            buf[:-1] = buf[1:]
+            buf[-1] = [c[i] for c in columns]
+            self._mark(df)
+            self._changed_rows.add(key + (int(cols['id'][i]), ))
+
+        stream.targets.append(on_row)
+        self._targets[id(df)] = (stream, on_row)
+        return df
+
+    def release(self, serial: pandas.DataFrame) -> None:
+        """停止更新序列，用于释放闲置的订阅"""
+        if target := self._targets.pop(id(serial), None):
+            stream, on_row = target
+            stream.targets.remove(on_row)
+
+    def get_kline_serial(self,
+                         symbol: str,
+                         duration_seconds: int,
+                         data_length: int = 200) -> pandas.DataFrame:
+        if not isinstance(symbol, str):
+            raise ValueError('回放不支持多合约K线')
+        return self._serial(f'kline_{int(duration_seconds)}', symbol, KLINE,
+                            data_length, int(duration_seconds))
+
+    def get_tick_serial(self,
+                        symbol: str,
+                        data_length: int = 200) -> pandas.DataFrame:
+        return self._serial('tick', symbol, TICK, data_length)
+
+    # |-------------------- 账户 --------------------|
+
+    def get_account(self, account=None) -> _Obj:
+        return self.account
+
+    def get_position(self, symbol: str = None, account=None) -> _Obj:
+        if symbol is None:
+            return self._positions
+        if symbol not in self._positions:
+            self._positions[symbol] = _Obj(symbol=symbol,
+                                           pos=0,
+                                           pos_long=0,
+                                           pos_short=0,
+                                           open_price=math.nan,
+                                           float_profit=0.0,
+                                           close_profit=0.0)
+        return self._positions[symbol]
+
+    def get_order(self, order_id: str = None, account=None) -> _Obj:
+        if order_id is None:
+            return self._orders
+        return self._orders[order_id]
+
+    def _fill(self) -> None:
+        """按当前盘口价成交未完成的目标持仓"""
+        for task in self._tasks:
+            if task.target is None:
+                continue
+            quote = self.get_quote(task.symbol)
+            position = self.get_position(task.symbol)
+            volume = task.target - position.pos
+            task.target = None
+            if not volume or math.isnan(quote.last_price):
+                continue
+            price = quote.ask_price1 if (volume > 0) == (
+                task.price == 'ACTIVE') else quote.bid_price1
+            if math.isnan(price):
+                price = quote.last_price
+            self._trade(position, volume, price, quote.volume_multiple)
+
+    def _trade(self, position: _Obj, volume: int, price: float,
+               multiple: float) -> None:
+        pos = position.pos
+        if pos and (pos > 0) != (volume > 0):  # 平仓部分
+            closed = min(abs(volume), abs(pos)) * (1 if pos > 0 else -1)
+            profit = (price - position.open_price) * closed * multiple
+            position.close_profit += profit
+            self._close_profit += profit
+        new = pos + volume
+        if not new:
+            position.open_price = math.nan
+        elif not pos or (pos > 0) != (new > 0):  # 开仓或反手
+            position.open_price = price
+        elif abs(new) > abs(pos):  # 加仓
+            position.open_price = (position.open_price * abs(pos) +
+                                   price * abs(volume)) / abs(new)
+        position.pos = new
+        position.pos_long, position.pos_short = max(new, 0), max(-new, 0)
+        self._commission += abs(volume) * self.fee
+        order_id = f'replay_{next(self._order_id)}'
+        self._orders[order_id] = order = _Obj(
+            order_id=order_id,
+            instrument_id=position.symbol,
+            direction='BUY' if volume > 0 else 'SELL',
+            volume_orign=abs(volume),
+            volume_left=0,
+            limit_price=price,
+            trade_price=price,
+            status='FINISHED',
+            insert_date_time=self._now)
+        self._mark(order)
+        self._mark(self._orders)
+        self._mark(position)
+        self._mark(self._positions)
+
+    def _settle(self) -> None:
+        """按最新价更新持仓盈亏和账户资金"""
+        float_profit = 0.0
+        for symbol, position in self._positions.items():
+            quote = self._quotes.get(symbol)
+            if quote is None or not position.pos:
+                profit = 0.0
+            else:
+                profit = (quote.last_price - position.open_price
+                          ) * position.pos * quote.volume_multiple
+            if profit != position.float_profit:
+                position.float_profit = profit
+                self._mark(position, ('float_profit', ))
+            float_profit += profit
+        balance = (self._balance + self._close_profit + float_profit -
+                   self._commission)
+        if balance != self.account.balance:
+            self.account.update(balance=balance,
+                                available=balance,
+                                float_profit=float_profit,
+                                position_profit=float_profit,
+                                close_profit=self._close_profit,
+                                commission=self._commission)
+            self._mark(self.account)
+
+    # |-------------------- 事件循环 --------------------|
+
+    def wait_update(self, deadline: float = None) -> bool:
+        """
+        回放下一个时间点的全部行情，数据回放完毕时返回`False`
+
+        Args:
+            deadline: 墙钟截止时间，`speed`不为0时到达截止时间返回`False` \n
+        """
+        self._changed.clear()
+        self._changed_rows.clear()
+        if self._heap is None:
+            # 开始回放前先运行已创建的协程(如批量订阅)
+            if self._loop_tasks():
+                self._loop.run_until_complete(self._yield())
+            self._heap = []
+            for stream in self._streams.values():
+                self._push(stream)
+        self._fill()  # 上一轮设置的目标持仓在本轮成交
+        if not self._heap:
+            return False
+        now = self._heap[0][0]
+        if self.speed:
+            if self._clock is None:
+                self._clock = (now, time.time())
+            wake = self._clock[1] + (now - self._clock[0]) / NS / self.speed
+            if deadline is not None and deadline < wake:
+                time.sleep(max(deadline - time.time(), 0))
+                return False
+            time.sleep(max(wake - time.time(), 0))
+        self._now = now
+        while self._heap and self._heap[0][0] == now:
+            _, _, stream = heapq.heappop(self._heap)
+            for on_row in stream.targets:
+                on_row(stream.pos)
+            stream.pos += 1
+            self._push(stream)
+        self._settle()
+        if self._chans or self._loop_tasks():
+            for chan in self._chans:
+                chan.notify()
+            self._loop.run_until_complete(self._yield())
+        return True
+
+    # |-------------------- 协程 --------------------|
+
+    def _loop_tasks(self) -> bool:
+        return bool(asyncio.all_tasks(self._loop))
+
+    @staticmethod
+    async def _yield(rounds: int = 3) -> None:
+        """让协程在本次更新中运行，与`TqApi.wait_update()`驱动后台任务一致"""
+        for _ in range(rounds):
+            await asyncio.sleep(0)
+
+    def create_task(self, coro) -> asyncio.Task:
+        """创建协程任务，在每次`wait_update()`时运行"""
+        return self._loop.create_task(coro)
+
+    def register_update_notify(self, obj=None) -> _UpdateChan:
+        """
+        注册更新通知，`obj`中任一对象变化时通知，`obj`为空时任意更新都通知
+
+        Example:
+            async with api.register_update_notify(quote) as update_chan:
+                async for _ in update_chan:
+                    ...
+        """
+        if obj is None:
+            objs = []
+        elif isinstance(obj, (list, tuple)):
+            objs = list(obj)
+        else:
+            objs = [obj]
+        return _UpdateChan(self, objs)
+
+    def is_changing(self,
+                    obj,
+                    key: Union[str, List[str], None] = None) -> bool:
+        if isinstance(obj, pandas.Series):  # 序列中的一行，如`kline.iloc[-1]`
+            if math.isnan(obj['id']):
+                return False
+            if 'duration' in obj.index:
+                row = ('kline', obj['symbol'], int(obj['duration']))
+            else:
+                row = ('tick', obj['symbol'])
+            return row + (int(obj['id']), ) in self._changed_rows
+        fields = self._changed.get(id(obj), False)
+        if fields is False:
+            return False
+        if key is None or fields is None:
+            return True
+        return any(k in fields
+                   for k in ([key] if isinstance(key, str) else key))
+
+    def close(self) -> None:
+        for task in asyncio.all_tasks(self._loop):
+            task.cancel()
+        self._loop.run_until_complete(self._yield())
+        self._loop.close()
@@ -0,0 +1,316 @@
+#!/usr/bin/env python
+#-*- coding: utf-8 -*-
+#FILE: resample.py
+#CREATE_TIME: 2026-10-18
+#AUTHOR: Sancho
+"""
+本地多周期K线合成
+由每个合约的一路基础K线或Tick增量合成任意多个更大周期的K线，不额外订阅
+
+K线划分:
+* 日内周期按北京时间从零点对齐，如5分钟K线起点为09:00、09:05...
+* 不跨交易日：夜盘(18:00之后)归属下一交易日，跨越18:00的K线从18:00重新开始
+* 日线按交易日划分，起点为交易日零点，周五夜盘归属下周一
+"""
+
+import math
+from functools import lru_cache
+from typing import Dict, List, Tuple, Union
+import numpy as np
+from pandas import DataFrame, Series
+from tqsdk import TqApi
+from utils import CST, DAY, NIGHT, NS, to_ns, trading_day
+
+FIELDS = ('datetime', 'id', 'open', 'high', 'low', 'close', 'volume',
+          'open_oi', 'close_oi')
+DAILY = 86400
+_INDEX = {f: j for j, f in enumerate(FIELDS)}
+_VALUES = [(j, f) for j, f in enumerate(FIELDS) if f not in ('datetime', 'id')]
+
+
+@lru_cache(maxsize=1024)
+def _day_start(day: int) -> int:
+    return to_ns([day // 10000, day // 100 % 100, day % 100])
+
+
+def bucket(ns: int, duration: int) -> int:
+    """
+    时间戳所属K线的起点
+
+    Args:
+        ns: UTC纳秒时间戳 \n
+        duration: K线周期(秒)，整除86400或等于86400 \n
+    """
+    if duration == DAILY:
+        return _day_start(trading_day(ns))
+    local = ns + CST
+    start = local - local % (duration * NS) - CST
+    # 不早于所属交易日的开始(前一天18:00)
+    return max(start, ns - (ns + CST - NIGHT) % DAY)
+
+
+def _ns(value: float) -> int:
+    """序列中的浮点时间戳取整到微秒，消除浮点误差"""
+    return int(round(value / 1000)) * 1000
+
+
+class _Bars:
+    """一个周期的合成K线，与天勤K线序列的字段相同，原地更新"""
+    def __init__(self, symbol: str, duration: int, data_length: int) -> None:
+        self.symbol = symbol
+        self.duration = duration
+        # 与天勤一致：序列由一个二维数组构造，原地更新
+        self.buf = np.full((data_length, len(FIELDS)), np.nan)
+        self.df = DataFrame(self.buf, columns=list(FIELDS), copy=False)
+        self.df['symbol'] = symbol
+        self.df['duration'] = duration
+        self.start = None  # 当前K线起点
+        self.acc = None  # 当前K线中已收盘的基础K线的合计
+        self.next_id = 0
+        # Tick合成: 当前K线开始前的累计成交量、最新累计成交量、交易日
+        self.base_volume, self.last_volume, self.day = 0.0, 0.0, None
+
+    def new(self, start: int, bar: dict) -> tuple:
+        """开始新的K线，返回变化的字段"""
+        self.buf[:-1] = self.buf[1:]
+        self.start = start
+        bar['datetime'] = start
+        bar['id'] = self.next_id
+        self.next_id += 1
+        self.buf[-1] = [bar[f] for f in FIELDS]
+        return FIELDS
+
+    def set(self, bar: dict) -> list:
+        """更新最后一根K线，返回变化的字段"""
+        changed = []
+        last = self.buf[-1]
+        for j, f in _VALUES:
+            if last[j] != bar[f]:
+                last[j] = bar[f]
+                changed.append(f)
+        return changed
+
+    def last(self, field: str) -> float:
+        return self.buf[-1, _INDEX[field]]
+
+    @property
+    def row(self) -> tuple:
+        return self.symbol, self.duration, int(self.buf[-1, _INDEX['id']])
+
+
+def _fold(acc: Union[dict, None], bar: dict) -> dict:
+    """合并两根连续的K线"""
+    if acc is None:
+        return dict(bar)
+    return dict(acc,
+                high=max(acc['high'], bar['high']),
+                low=min(acc['low'], bar['low']),
+                close=bar['close'],
+                volume=acc['volume'] + bar['volume'],
+                close_oi=bar['close_oi'])
+
+
+class _Feed:
+    """一路基础K线或Tick及由其合成的各周期K线"""
+    def __init__(self, source: DataFrame, base: Union[int, None]) -> None:
+        self.source = source
+        self.base = base  # 基础K线周期，`None`表示Tick
+        self.bars: List[_Bars] = []
+        self.last_id = -1  # 已处理的最后一根已收盘K线(或Tick)的id
+        self.ready = False
+
+
+class Resampler:
+    def __init__(self, api: TqApi) -> None:
+        """
+        多周期K线合成，每次`wait_update()`后调用`update()`
+
+        Example:
+            resampler = Resampler(api)
+            bars = resampler.add(api.get_kline_serial(symbol, 60, 2000), [300, 86400], 60)
+            bars[300].iloc[-1]  # 最新的5分钟K线
+        """
+        self.api = api
+        self.feeds: List[_Feed] = []
+        self._series = set()  # {(合约, 周期)}
+        self._frames: Dict[int, _Feed] = {}  # {id(合成序列): 基础行情}
+        self._changed: Dict[int, set] = {}  # {id(序列): 变化的字段}
+        self._changed_rows: Dict[tuple, set] = {}  # {(合约, 周期, id): 变化的字段}
+
+    def add(self,
+            source: DataFrame,
+            durations: List[int],
+            base: int = None,
+            data_length: int = 200) -> Dict[int, DataFrame]:
+        """
+        由一路行情合成多个周期的K线
+
+        Args:
+            source: 基础K线或Tick序列(单合约) \n
+            durations: 合成的周期(秒) \n
+            base: 基础K线的周期，`None`表示`source`为Tick序列 \n
+            data_length: 合成序列的长度 \n
+
+        Returns:
+            {周期: K线序列}，字段与`get_kline_serial`相同
+        """
+        symbol = source['symbol'].iloc[-1]
+        feed = _Feed(source, base)
+        for d in durations:
+            d = int(d)
+            if d > DAILY or DAILY % d:
+                raise ValueError(f'不支持的合成周期: {d}秒，需整除86400或等于86400')
+            if base and (d <= base or d % base):
+                raise ValueError(f'合成周期{d}秒需大于基础K线周期{base}秒且为其整数倍')
+            bars = _Bars(symbol, d, data_length)
+            feed.bars.append(bars)
+            self._series.add((symbol, d))
+            self._frames[id(bars.df)] = feed
+        self.feeds.append(feed)
+        return {bars.duration: bars.df for bars in feed.bars}
+
+    # |-------------------- 更新 --------------------|
+
+    def update(self, clear: bool = True) -> None:
+        """
+        处理本次更新中的新数据
+
+        Args:
+            clear: 清除上次的变化记录，异步模式下各策略协程在同一次更新中调用时为`False` \n
+        """
+        if clear:
+            self._changed.clear()
+            self._changed_rows.clear()
+        for feed in self.feeds:
+            if feed.ready and not self.api.is_changing(feed.source):
+                continue
+            if feed.base is None:
+                self._update_ticks(feed)
+            else:
+                self._update_klines(feed)
+
+    def _mark(self, bars: _Bars, fields) -> None:
+        if fields:
+            self._changed.setdefault(id(bars.df), set()).update(fields)
+            self._changed_rows.setdefault(bars.row, set()).update(fields)
+
+    def _new_rows(self, feed: _Feed,
+                  closed: bool) -> Tuple[Union[DataFrame, None], range]:
+        """
+        未处理的新数据的行号，`closed`为`True`时不含最后一行(未收盘K线)
+        """
+        source = feed.source
+        ids = source['id'].to_numpy()
+        end = len(ids) - 1 if closed else len(ids)
+        if end <= 0 or math.isnan(ids[end - 1]):
+            return None, range(0)
+        count = min(int(ids[end - 1]) - feed.last_id, end)
+        if count <= 0:
+            return None, range(0)
+        feed.last_id = int(ids[end - 1])
+        return source, range(end - count, end)
+
+    def _update_klines(self, feed: _Feed) -> None:
+        feed.ready = True
+        source, rows = self._new_rows(feed, closed=True)
+        cols = {f: source[f].to_numpy() for f in FIELDS} if rows else {}
+        for i in rows:
+            if math.isnan(cols['id'][i]):
+                continue
+            bar = {f: cols[f][i] for f in FIELDS}
+            ns = _ns(bar['datetime'])
+            for bars in feed.bars:
+                start = bucket(ns, bars.duration)
+                if start != bars.start:
+                    bars.acc = dict(bar)
+                    self._mark(bars, bars.new(start, dict(bar)))
+                else:
+                    bars.acc = _fold(bars.acc, bar)
+                    self._mark(bars, bars.set(dict(bars.acc)))
+        # 未收盘的基础K线每次都重新合并，重复调用结果相同
+        last = feed.source.iloc[-1]
+        if math.isnan(last['id']):
+            return
+        bar = {f: last[f] for f in FIELDS}
+        ns = _ns(bar['datetime'])
+        for bars in feed.bars:
+            start = bucket(ns, bars.duration)
+            if start != bars.start:
+                bars.acc = None
+                self._mark(bars, bars.new(start, dict(bar)))
+            else:
+                self._mark(bars, bars.set(_fold(bars.acc, bar)))
+
+    def _update_ticks(self, feed: _Feed) -> None:
+        feed.ready = True
+        source, rows = self._new_rows(feed, closed=False)
+        if not rows:
+            return
+        cols = {
+            f: source[f].to_numpy()
+            for f in ('datetime', 'id', 'last_price', 'volume',
+                      'open_interest')
+        }
+        for i in rows:
+            if math.isnan(cols['id'][i]):
+                continue
+            ns = _ns(cols['datetime'][i])
+            price, volume = cols['last_price'][i], cols['volume'][i]
+            oi = cols['open_interest'][i]
+            day = trading_day(ns)
+            for bars in feed.bars:
+                start = bucket(ns, bars.duration)
+                if start != bars.start:
+                    # Tick的成交量为交易日内累计值
+                    bars.base_volume = bars.last_volume if day == bars.day else 0.0
+                    bars.day = day
+                    bar = dict(open=price,
+                               high=price,
+                               low=price,
+                               close=price,
+                               volume=volume - bars.base_volume,
+                               open_oi=oi,
+                               close_oi=oi)
+                    self._mark(bars, bars.new(start, bar))
+                else:
+                    bar = dict(open=bars.last('open'),
+                               high=max(bars.last('high'), price),
+                               low=min(bars.last('low'), price),
+                               close=price,
+                               volume=volume - bars.base_volume,
+                               open_oi=bars.last('open_oi'),
+                               close_oi=oi)
+                    self._mark(bars, bars.set(bar))
+                bars.last_volume = volume
+
+    # |-------------------- 变化 --------------------|
+
+    def is_changing(self,
+                    obj,
+                    key: Union[str, List[str], None] = None
+                    ) -> Union[bool, None]:
+        """
+        合成序列(或其中一行)在本次更新中是否变化，其他对象返回`None`
+        """
+        if isinstance(obj, Series):
+            if 'duration' not in obj.index or math.isnan(obj['id']):
+                return None
+            row = (obj['symbol'], int(obj['duration']))
+            if row not in self._series:
+                return None
+            fields = self._changed_rows.get(row + (int(obj['id']), ))
+        elif id(obj) in self._frames:
+            fields = self._changed.get(id(obj))
+        else:
+            return None
+        if not fields:
+            return False
+        if key is None:
+            return True
+        return any(k in fields
+                   for k in ([key] if isinstance(key, str) else key))
+
+    def source(self, obj) -> Union[DataFrame, None]:
+        """合成序列对应的基础行情，异步模式下用于注册更新通知"""
+        feed = self._frames.get(id(obj))
+        return feed.source if feed else None
@@ -0,0 +1,252 @@
+#!/usr/bin/env python
+#-*- coding: utf-8 -*-
+#FILE: risk.py
+#CREATE_TIME: 2026-10-18
+#AUTHOR: Sancho
+"""
+交易前风控
+持仓、名义价值、保证金和委托数随持仓、行情和委托的更新增量维护，
+每个目标持仓下达前以O(1)检查，超限时截断或拒绝
+
+* 减仓和平仓的目标总是允许
+* 已下达但尚未成交的目标按与持仓中较大的手数计入名义价值和保证金，
+  同一次更新中多个合约的目标合计也不会超限
+* 检查耗时记录在直方图中，超限决定累计计数并保留最近的记录，开启耗时统计时一并导出
+"""
+
+import math
+import time
+from collections import deque
+from typing import Dict, Union
+from tqsdk import TqApi
+from metrics import Histogram
+
+
+class RiskEngine:
+    RULES = ('position', 'exposure', 'margin', 'rate')
+    ACTIONS = ('clip', 'reject')
+    LIMITS = ('max_position', 'max_exposure', 'max_margin_ratio', 'max_orders')
+
+    @classmethod
+    def limited(cls, config: dict) -> bool:
+        """
+        风控设置中是否有非0的上限，全部为0时不需要创建风控
+
+        Args:
+            config: `config.yml`中的`risk`项 \n
+        """
+        for name in cls.LIMITS:
+            limit = config.get(name)
+            if any(limit.values()) if isinstance(limit, dict) else limit:
+                return True
+        return False
+
+    def __init__(self,
+                 api: TqApi,
+                 quotes: dict,
+                 accounts: list,
+                 accounts_info: list,
+                 action: str = 'clip',
+                 max_position: Union[int, Dict[str, int]] = 0,
+                 max_exposure: float = 0,
+                 max_margin_ratio: float = 0,
+                 max_orders: int = 0,
+                 window: float = 60) -> None:
+        """
+        Args:
+            api: 天勤API \n
+            quotes: 交易的合约{合约: quote} \n
+            accounts: 账户列表 \n
+            accounts_info: 各账户资金，与`accounts`一一对应 \n
+            action: `clip`=超限时截断到允许的最大目标，`reject`=拒绝本次目标 \n
+            max_position: 单合约最大持仓手数，或{合约: 手数}，0=不限制 \n
+            max_exposure: 所有合约持仓名义价值(价格×合约乘数×手数)之和的上限，0=不限制 \n
+            max_margin_ratio: 保证金占账户权益的比例上限，0=不限制 \n
+            max_orders: `window`秒内最多的委托数，0=不限制 \n
+            window: 委托数统计窗口(秒) \n
+        """
+        if action not in self.ACTIONS:
+            raise ValueError(f'不支持的风控动作: {action}，可选{self.ACTIONS}')
+        self.api = api
+        self.quotes = quotes
+        self.accounts_info = accounts_info
+        self.action = action
+        self.max_position = max_position
+        self.max_exposure = max_exposure
+        self.max_margin_ratio = max_margin_ratio
+        self.max_orders = max_orders
+        self.window = window
+        # 各合约在所有账户的持仓对象
+        self._positions = {
+            name: [api.get_position(name, account=a) for a in accounts]
+            for name in quotes
+        }
+        self._orders = [api.get_order(account=a) for a in accounts]
+        self._order_counts = [len(o) for o in self._orders]
+        self._order_times = deque()  # 窗口内的(时间, 新委托数)
+        self.orders_in_window = 0
+        # 各合约的净持仓、名义价值、保证金及其合计
+        self.pos = dict.fromkeys(quotes, 0)
+        self.targets: Dict[str, int] = {}  # {合约: 已下达尚未成交的目标持仓}
+        self.exposure = dict.fromkeys(quotes, 0.0)
+        self.margin = dict.fromkeys(quotes, 0.0)
+        self.total_exposure = 0.0
+        self.total_margin = 0.0
+        self._lot = {}  # {合约: (每手名义价值, 每手保证金)}，随行情更新
+        # 可观测：检查耗时、各规则各合约的超限次数、最近的超限记录
+        self.latency = Histogram()
+        self.breaches: Dict[tuple, int] = {}
+        self.recent = deque(maxlen=1000)
+        self._last = {}  # {合约: 最近打印的决定}
+        self.metrics = None
+        for name in quotes:
+            self._refresh(name)
+
+    def attach(self, metrics) -> None:
+        """导出到耗时统计：检查耗时为`risk_check`阶段，超限为`risk_{规则}`事件"""
+        self.metrics = metrics
+        metrics.histograms['risk_check', '', ''] = self.latency
+
+    # |-------------------- 增量更新 --------------------|
+
+    def _per_lot(self, name: str) -> tuple:
+        """每手的名义价值和保证金，没有行情时为0"""
+        quote = self.quotes[name]
+        price = getattr(quote, 'last_price', math.nan)
+        multiple = getattr(quote, 'volume_multiple', 1) or 1
+        notional = 0.0 if math.isnan(price) else price * multiple
+        margin = getattr(quote, 'margin', math.nan)
+        return notional, 0.0 if margin is None or math.isnan(
+            margin) else margin
+
+    def _refresh(self, name: str) -> None:
+        """重新读取一个合约的持仓和行情"""
+        self.pos[name] = sum(p.pos for p in self._positions[name])
+        self._lot[name] = self._per_lot(name)
+        self._commit(name)
+
+    def _commit(self, name: str) -> None:
+        """
+        按持仓和未成交的目标中较大的手数计算合约的名义价值和保证金，合计按差值更新
+        """
+        pos, target = self.pos[name], self.targets.get(name)
+        if target == pos:  # 目标已成交
+            del self.targets[name]
+            target = None
+        lots = abs(pos) if target is None else max(abs(pos), abs(target))
+        notional, margin = self._lot[name]
+        exposure, margin = lots * notional, lots * margin
+        self.total_exposure += exposure - self.exposure[name]
+        self.total_margin += margin - self.margin[name]
+        self.exposure[name], self.margin[name] = exposure, margin
+
+    def update(self) -> None:
+        """每次`wait_update()`后调用，只处理本次变化的持仓、行情和委托"""
+        is_changing = self.api.is_changing
+        for name, positions in self._positions.items():
+            if is_changing(self.quotes[name], ['last_price', 'margin']) or any(
+                    is_changing(p) for p in positions):
+                self._refresh(name)
+        now = time.monotonic()
+        for i, orders in enumerate(self._orders):
+            if (n := len(orders)) > self._order_counts[i]:
+                self._order_times.append((now, n - self._order_counts[i]))
+                self.orders_in_window += n - self._order_counts[i]
+                self._order_counts[i] = n
+        self._expire(now)
+
+    def _expire(self, now: float) -> None:
+        times = self._order_times
+        while times and now - times[0][0] > self.window:
+            self.orders_in_window -= times.popleft()[1]
+
+    # |-------------------- 检查 --------------------|
+
+    def _limit(self, name: str) -> int:
+        if isinstance(self.max_position, dict):
+            return self.max_position.get(name, 0)
+        return self.max_position
+
+    def _balance(self) -> float:
+        return sum(a.balance for a in self.accounts_info)
+
+    def check(self, name: str, target: int) -> Union[int, None]:
+        """
+        检查目标持仓，允许的目标记为未成交，计入之后的检查
+
+        Returns:
+            允许下达的目标持仓(可能被截断)，`None`表示拒绝
+        """
+        start = time.perf_counter_ns()
+        pos = self.pos.get(name, 0)
+        result, rule = target, None
+        # 减仓、平仓不检查
+        if name in self.pos and not (abs(target) <= abs(pos)
+                                     and target * pos >= 0):
+            allowed = abs(target)
+            notional, margin = self._lot[name]
+            if (limit := self._limit(name)) and allowed > limit:
+                allowed, rule = limit, 'position'
+            if self.max_exposure and notional:
+                room = self.max_exposure - (self.total_exposure -
+                                            self.exposure[name])
+                if (n := int(room // notional)) < allowed:
+                    allowed, rule = max(n, 0), 'exposure'
+            if self.max_margin_ratio and margin:
+                room = self.max_margin_ratio * self._balance() - (
+                    self.total_margin - self.margin[name])
+                if (n := int(room // margin)) < allowed:
+                    allowed, rule = max(n, 0), 'margin'
+            if self.max_orders:
+                self._expire(time.monotonic())
+                if self.orders_in_window >= self.max_orders:
+                    rule = 'rate'
+            if rule:
+                if rule == 'rate' or self.action == 'reject':
+                    result = None
+                else:
+                    # 同方向不因截断而减仓
+                    if target * pos > 0:
+                        allowed = max(allowed, abs(pos))
+                    result = allowed if target > 0 else -allowed
+        if result is not None and name in self.pos:
+            self.targets[name] = result
+            self._commit(name)
+        self.latency.observe(time.perf_counter_ns() - start)
+        if rule:
+            self._breach(rule, name, target, result)
+        return result
+
+    def _breach(self, rule: str, name: str, target: int,
+                result: Union[int, None]) -> None:
+        key = (rule, name)
+        self.breaches[key] = self.breaches.get(key, 0) + 1
+        self.recent.append((time.time(), rule, name, target, result))
+        if self.metrics:
+            self.metrics.count(f'risk_{rule}', 1, '', name)
+        if self._last.get(name) != (rule, target, result):
+            self._last[name] = (rule, target, result)
+            action = '拒绝' if result is None else f'截断为{result}'
+            print(f'风控超限({rule}): {name} 目标持仓{target}，{action}')
+
+    def status(self) -> dict:
+        """当前的风控状态"""
+        return {
+            'pos':
+            dict(self.pos),
+            'targets':
+            dict(self.targets),
+            'total_exposure':
+            self.total_exposure,
+            'total_margin':
+            self.total_margin,
+            'orders_in_window':
+            self.orders_in_window,
+            'breaches':
+            dict(self.breaches),
+            'checks':
+            self.latency.count,
+            'check_mean_ns':
+            self.latency.sum /
+            self.latency.count if self.latency.count else 0.0,
+        }
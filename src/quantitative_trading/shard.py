@@ -0,0 +1,219 @@
+#!/usr/bin/env python
+#-*- coding: utf-8 -*-
+#FILE: shard.py
+#CREATE_TIME: 2026-10-18
+#AUTHOR: Sancho
+"""
+多进程分片
+按合约把订阅拆分到N个工作进程，每个进程有独立的天勤连接和策略对象，
+协调进程持有`Trade`和账户，通过管道接收各进程的目标持仓
+"""
+
+import multiprocessing
+import struct
+import time
+from multiprocessing.connection import Connection, wait
+from typing import Dict, List
+from main import Engine
+from subscription import Subscription
+from tq import Tq
+from trade import Netting, Trade
+
+PACK = struct.Struct('<iq')  # (合约序号, 目标持仓)
+PUMP = 0.001  # 有未完成的目标持仓时驱动天勤更新的间隔(秒)
+
+
+def symbols_of(config: dict) -> List[str]:
+    """配置中订阅的全部合约，保持配置中的顺序"""
+    symbols = list(config.get('quotes') or [])
+    for key in ('klines', 'ticks'):
+        for symbol in config.get(key) or {}:
+            if symbol not in symbols:
+                symbols.append(symbol)
+    return symbols
+
+
+def split(config: dict, shards: int) -> List[dict]:
+    """
+    把订阅按合约轮流分配到各分片，同一合约的quote、kline、tick在同一分片
+
+    Returns:
+        各分片的配置
+    """
+    if config['type'] == 'huice':
+        # 各进程的回测时钟相互独立，无法与协调进程的回测账户对齐
+        raise ValueError('回测(huice)不支持分片运行，请使用离线回放(replay)或关闭分片')
+    owner = {s: i % shards for i, s in enumerate(symbols_of(config))}
+    parts = []
+    for i in range(shards):
+        part = dict(config)
+        part['quotes'] = [
+            s for s in config.get('quotes') or [] if owner[s] == i
+        ]
+        for key in ('klines', 'ticks'):
+            part[key] = {
+                s: v
+                for s, v in (config.get(key) or {}).items() if owner[s] == i
+            }
+        part['mode'] = 'sync'
+        if part['type'] != 'replay':
+            part['type'] = 'moni'  # 工作进程只接收行情，不登录交易账户
+        metrics = dict(config.get('metrics') or {})
+        if metrics.get('port'):
+            metrics['port'] += i + 1
+        if metrics.get('path'):
+            metrics['path'] = f'{metrics["path"]}.shard{i}'
+        part['metrics'] = metrics
+        snapshot = dict(config.get('snapshot') or {})
+        if snapshot.get('path'):
+            snapshot['path'] = f'{snapshot["path"]}.shard{i}'
+        part['snapshot'] = snapshot
+        parts.append(part)
+    return parts
+
+
+class _PipeTrade:
+    """工作进程中的交易对象，把目标持仓批量发送给协调进程"""
+    def __init__(self,
+                 conn: Connection,
+                 index: Dict[str, int],
+                 netting: dict = None) -> None:
+        self.conn = conn
+        self.index = index  # {合约: 全局序号}
+        self.accounts_info, self.positions, self.orders = None, None, None
+        self.risk = None  # 风控在协调进程的`Trade`中检查
+        # 同一合约的策略都在本分片，在发送前轧差
+        self.netting = Netting(**(netting or {}))
+
+    def set_trades(self, *args, **kwargs) -> dict:
+        # 目标持仓对象由协调进程持有，这里用合约代码代替
+        return {symbol: symbol for symbol in self.index}
+
+    def trading(self, symbol: str, volume: int, strategy=None) -> None:
+        self.netting.update(symbol, strategy, volume)
+
+    def flush(self) -> None:
+        """一次更新中的所有净目标持仓合并为一条消息发送"""
+        if targets := self.netting.net():
+            self.conn.send_bytes(b''.join(
+                PACK.pack(self.index[symbol], volume)
+                for symbol, volume in targets))
+
+    def state(self, key) -> dict:
+        return {'netting': self.netting.state(str, key)}
+
+    def restore(self, state: dict, tasks: dict, strategies: dict) -> None:
+        # 恢复的净目标在下次`flush`时重新发送给协调进程
+        self.netting.restore(state.get('netting', {}), tasks, strategies)
+
+
+class ShardEngine(Engine):
+    def __init__(self, config: dict, conn: Connection,
+                 index: Dict[str, int]) -> None:
+        """
+        分片工作进程的引擎
+
+        Args:
+            config: 分片配置 \n
+            conn: 发送目标持仓的管道 \n
+            index: 本分片交易合约的全局序号 \n
+        """
+        self.conn = conn
+        self.index = index
+        super().__init__(config)
+
+    def _get_trade(self) -> _PipeTrade:
+        return _PipeTrade(self.conn, self.index, self.config.get('netting'))
+
+
+def _worker(config: dict, conn: Connection, index: Dict[str, int]) -> None:
+    engine = ShardEngine(config, conn, index)
+    try:
+        engine.run()
+    finally:
+        conn.close()
+
+
+class Coordinator:
+    def __init__(self, config: dict, shards: int = None) -> None:
+        """
+        分片协调进程，持有交易账户，执行各分片发来的目标持仓
+
+        Args:
+            config: 完整配置 \n
+            shards: 分片数，默认取配置中的`shards`，未配置时按CPU核心数 \n
+        """
+        self.config = config
+        shards = shards or config.get('shards') or multiprocessing.cpu_count()
+        self.shards = min(shards, len(symbols_of(config)))
+        self.symbols = list(config.get('quotes') or [])  # 可交易的合约
+        self.index = {s: i for i, s in enumerate(self.symbols)}
+        self.parts = split(config, self.shards)
+        self._stop_recv, self._stop_send = multiprocessing.Pipe(duplex=False)
+        self.tq = Tq(config['tq_username'],
+                     config['tq_password'],
+                     config['type'],
+                     config['gui'],
+                     config['balance'],
+                     config['accounts'],
+                     config.get('start_dt'),
+                     config.get('end_dt'),
+                     replay=config.get('replay'))
+        quotes = Subscription(self.tq.api).get_quotes(self.symbols)
+        self.trade = Trade(self.tq.api, quotes, self.tq.accounts,
+                           ratios=self.tq.ratios,
+                           risk=config.get('risk'))
+        self.accounts_info = self.trade.accounts_info
+        self.positions = self.trade.positions
+        self.orders = self.trade.orders
+
+    def run(self) -> None:
+        """
+        启动分片进程，循环执行收到的目标持仓，所有分片退出后结束
+        """
+        tasks = self.trade.set_trades()
+        tasks = [tasks[s] for s in self.symbols]
+        ctx = multiprocessing.get_context('spawn')
+        conns, processes = [], []
+        for part in self.parts:
+            index = {s: self.index[s] for s in part['quotes']}
+            recv, send = ctx.Pipe(duplex=False)
+            p = ctx.Process(target=_worker,
+                            args=(part, send, index),
+                            daemon=True)
+            p.start()
+            send.close()
+            conns.append(recv)
+            processes.append(p)
+        api = self.tq.api
+        timeout = None
+        try:
+            while conns:
+                # 阻塞等待目标持仓、分片退出或`stop`，委托未完成时按间隔驱动天勤更新
+                ready = wait(conns + [self._stop_recv], timeout)
+                if self._stop_recv in ready:
+                    break
+                for conn in ready:
+                    try:
+                        data = conn.recv_bytes()
+                    except EOFError:  # 分片进程退出
+                        conns.remove(conn)
+                        continue
+                    # 分片已经轧差，相同目标不重复下达
+                    for i, volume in PACK.iter_unpack(data):
+                        self.trade.trading(tasks[i], volume)
+                # 发出委托并更新账户
+                api.wait_update(deadline=time.time() + PUMP)
+                if self.trade.risk:
+                    self.trade.risk.update()
+                timeout = PUMP if self.trade.pending() else None
+        finally:
+            for p in processes:
+                p.join(timeout=1)
+                if p.is_alive():
+                    p.terminate()
+            api.close()
+
+    def stop(self) -> None:
+        """结束`run`，可在其他线程中调用"""
+        self._stop_send.send_bytes(b'')
@@ -0,0 +1,312 @@
+#!/usr/bin/env python
+#-*- coding: utf-8 -*-
+#FILE: shm.py
+#CREATE_TIME: 2026-10-18
+#AUTHOR: Sancho
+"""
+共享内存行情
+一个进程订阅K线/Tick并写入`multiprocessing.shared_memory`中的定长环形缓冲区，
+其他进程(研究、监控等)直接挂载读取NumPy视图，不重复订阅也不各自复制数据
+
+缓冲区布局:
+* 头部 int64[8]: 版本号(写入时为奇数)、已写入行数、容量、字段数
+* 数据 float64[2 * 容量, 字段数]: 每行同时写入`i`和`i + 容量`两个位置，
+  最近N行(N <= 容量)始终是一段连续内存，可以零拷贝返回
+"""
+
+import math
+import re
+import time
+from multiprocessing import resource_tracker, shared_memory
+from typing import Dict, List, Tuple
+import numpy as np
+from pandas import DataFrame
+from tqsdk import TqApi
+from recorder import KLINE, TICK
+from subscription import Subscription
+
+HEADER = 8
+VERSION, COUNT, CAPACITY, FIELDS = range(4)
+TIMEOUT = 1.0  # 读取时等待写入完成的默认最长秒数
+
+
+def shm_name(kind: str, symbol: str) -> str:
+    """共享内存名，如`rt_kline_20_KQ_m_DCE_a`"""
+    return 'rt_' + re.sub(r'[^0-9A-Za-z]', '_', f'{kind}_{symbol}')
+
+
+def attach(name: str) -> shared_memory.SharedMemory:
+    """
+    挂载其他进程创建的共享内存，读进程退出时不删除，
+    由创建的进程负责`unlink`
+
+    Args:
+        name: 共享内存名 \n
+    """
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:  # Python < 3.13 没有`track`参数，挂载时跳过登记
+        register = resource_tracker.register
+        resource_tracker.register = lambda *args: None
+        try:
+            return shared_memory.SharedMemory(name=name)
+        finally:
+            resource_tracker.register = register
+
+
+class Ring:
+    def __init__(self,
+                 name: str,
+                 fields: List[str] = None,
+                 capacity: int = None) -> None:
+        """
+        共享内存环形缓冲区，传入`fields`和`capacity`时创建，否则挂载
+
+        Args:
+            name: 共享内存名 \n
+            fields: 字段名 \n
+            capacity: 保留的行数 \n
+        """
+        self.name = name
+        if fields is not None:
+            size = (HEADER + 2 * capacity * len(fields)) * 8
+            try:
+                self.shm = shared_memory.SharedMemory(name, create=True,
+                                                      size=size)
+            except FileExistsError:  # 上次未正常退出，重新创建
+                old = attach(name)
+                old.close()
+                old.unlink()
+                self.shm = shared_memory.SharedMemory(name, create=True,
+                                                      size=size)
+            self.owner = True
+            self.header = np.ndarray(HEADER, np.int64, self.shm.buf)
+            self.header[:] = 0
+            self.header[CAPACITY] = capacity
+            self.header[FIELDS] = len(fields)
+        else:
+            self.shm = attach(name)
+            self.owner = False
+            self.header = np.ndarray(HEADER, np.int64, self.shm.buf)
+        self.capacity = int(self.header[CAPACITY])
+        nfields = int(self.header[FIELDS])
+        self.data = np.ndarray((2 * self.capacity, nfields), np.float64,
+                               self.shm.buf, HEADER * 8)
+        if not self.owner:
+            self.data.flags.writeable = False
+            self.header.flags.writeable = False
+
+    # |-------------------- 写 --------------------|
+
+    def write(self, rows: np.ndarray, replace_last: bool = False) -> None:
+        """
+        追加行，`replace_last`为`True`时第一行覆盖最后一行(如未收盘K线的更新)
+        """
+        header, cap = self.header, self.capacity
+        count = int(header[COUNT])
+        if replace_last and count:
+            count -= 1
+        header[VERSION] += 1  # 奇数：写入中
+        for row in rows[-cap:] if len(rows) > cap else rows:
+            i = count % cap
+            self.data[i] = row
+            self.data[i + cap] = row
+            count += 1
+        header[COUNT] = count
+        header[VERSION] += 1  # 偶数：写入完成
+
+    # |-------------------- 读 --------------------|
+
+    @property
+    def version(self) -> int:
+        return int(self.header[VERSION])
+
+    @property
+    def count(self) -> int:
+        return int(self.header[COUNT])
+
+    def view(self,
+             n: int = None,
+             timeout: float = TIMEOUT) -> Tuple[np.ndarray, int]:
+        """
+        最近n行的零拷贝视图和读取时的版本号，
+        用`valid(version)`确认读取期间没有写入
+
+        Args:
+            n: 行数，默认全部 \n
+            timeout: 等待写入完成的最长秒数，超时(写进程在写入中退出)抛出`TimeoutError` \n
+
+        Returns:
+            (ndarray[n, 字段数], version)
+        """
+        deadline = None
+        while (version := self.version) & 1:
+            if deadline is None:
+                deadline = time.monotonic() + timeout
+            elif time.monotonic() > deadline:
+                raise TimeoutError(f'{self.shm.name}等待写入完成超时，写进程可能已退出')
+        count = self.count
+        n = min(count, self.capacity) if n is None else min(
+            n, count, self.capacity)
+        end = count % self.capacity + self.capacity
+        return self.data[end - n:end], version
+
+    def valid(self, version: int) -> bool:
+        """读取之后没有发生写入"""
+        return self.version == version
+
+    def snapshot(self, n: int = None, timeout: float = TIMEOUT) -> np.ndarray:
+        """最近n行的一致性拷贝(seqlock重试)，超过`timeout`秒抛出`TimeoutError`"""
+        deadline = time.monotonic() + timeout
+        while True:
+            view, version = self.view(n, max(deadline - time.monotonic(), 0))
+            copy = view.copy()
+            if self.valid(version):
+                return copy
+            if time.monotonic() > deadline:
+                raise TimeoutError(f'{self.shm.name}读取一致性拷贝超时')
+
+    def close(self) -> None:
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+
+class ShmReader:
+    def __init__(self, kind: str, symbol: str) -> None:
+        """
+        读取其他进程发布的K线/Tick
+
+        Args:
+            kind: `kline_{周期秒数}`或`tick` \n
+            symbol: 合约代码 \n
+
+        Example:
+            r = ShmReader('kline_20', 'KQ.m@DCE.a')
+            close, version = r.column('close', 100)
+        """
+        self.fields = list(TICK if kind == 'tick' else KLINE)
+        self.index = {f: i for i, f in enumerate(self.fields)}
+        self.ring = Ring(shm_name(kind, symbol))
+
+    def view(self,
+             n: int = None,
+             timeout: float = TIMEOUT) -> Tuple[np.ndarray, int]:
+        return self.ring.view(n, timeout)
+
+    def column(self,
+               field: str,
+               n: int = None,
+               timeout: float = TIMEOUT) -> Tuple[np.ndarray, int]:
+        """某个字段最近n行的零拷贝视图"""
+        view, version = self.ring.view(n, timeout)
+        return view[:, self.index[field]], version
+
+    def valid(self, version: int) -> bool:
+        return self.ring.valid(version)
+
+    def snapshot(self,
+                 n: int = None,
+                 timeout: float = TIMEOUT) -> Dict[str, np.ndarray]:
+        data = self.ring.snapshot(n, timeout)
+        return {f: data[:, i] for f, i in self.index.items()}
+
+    def close(self) -> None:
+        self.ring.close()
+
+
+class ShmPublisher:
+    def __init__(self,
+                 api: TqApi,
+                 klines: Dict[str, DataFrame] = None,
+                 ticks: Dict[str, DataFrame] = None,
+                 capacity: int = 10000) -> None:
+        """
+        把`Subscription`订阅的K线/Tick发布到共享内存，
+        在事件循环中每次`wait_update()`后调用`publish()`
+
+        Args:
+            api: 天勤API \n
+            klines: `Subscription.get_klines`返回的字典(不支持合并的K线) \n
+            ticks: `Subscription.get_ticks`返回的字典 \n
+            capacity: 每个合约保留的行数 \n
+        """
+        self.api = api
+        self.capacity = capacity
+        # [(serial, ring, 字段, 是否K线, [已发布的最后一行id])]
+        self._serials = []
+        for symbol, kline in (klines or {}).items():
+            kind = f'kline_{int(kline["duration"].iloc[-1])}'
+            self._add(kind, symbol, kline, list(KLINE), True)
+        for symbol, tick in (ticks or {}).items():
+            self._add('tick', symbol, tick, list(TICK), False)
+
+    @classmethod
+    def subscribe(cls,
+                  subscription: Subscription,
+                  klines: dict = None,
+                  ticks: dict = None,
+                  capacity: int = 10000) -> 'ShmPublisher':
+        """按`config.yml`中的`klines`、`ticks`格式订阅并发布"""
+        return cls(subscription.api,
+                   subscription.get_klines(klines) if klines else None,
+                   subscription.get_ticks(ticks) if ticks else None,
+                   capacity)
+
+    def _add(self, kind: str, symbol: str, serial: DataFrame,
+             fields: List[str], is_kline: bool) -> None:
+        ring = Ring(shm_name(kind, symbol), fields, self.capacity)
+        last = [-1]
+        self._serials.append((serial, ring, fields, is_kline, last))
+        self._publish(serial, ring, fields, is_kline, last)
+
+    def publish(self) -> None:
+        """写入本次更新中变化的行"""
+        for serial, ring, fields, is_kline, last in self._serials:
+            if self.api.is_changing(serial):
+                self._publish(serial, ring, fields, is_kline, last)
+
+    @staticmethod
+    def _publish(serial: DataFrame, ring: Ring, fields: List[str],
+                 is_kline: bool, last: list) -> None:
+        ids = serial['id'].to_numpy()
+        if not len(ids) or math.isnan(ids[-1]):
+            return
+        new_last = int(ids[-1])
+        # K线最后一根会持续更新：从已发布的最后一根开始覆盖写入
+        start_id = last[0] if is_kline and last[0] >= 0 else last[0] + 1
+        count = min(new_last - start_id + 1, len(ids))
+        if count <= 0:
+            return
+        rows = np.column_stack(
+            [serial[f].to_numpy(dtype=np.float64)[-count:] for f in fields])
+        rows = rows[~np.isnan(rows[:, fields.index('id')])]
+        ring.write(rows, replace_last=is_kline and last[0] >= 0)
+        last[0] = new_last
+
+    def close(self) -> None:
+        for _, ring, *_ in self._serials:
+            ring.close()
+
+
+if __name__ == "__main__":
+    # 单独运行发布进程，按`config.yml`订阅K线/Tick并发布到共享内存
+    from main import Engine
+    from tq import Tq
+    config = Engine.get_config()
+    _type = 'replay' if config['type'] == 'replay' else 'moni'  # 只接收行情
+    tq = Tq(config['tq_username'],
+            config['tq_password'],
+            _type,
+            replay=config.get('replay'))
+    publisher = ShmPublisher.subscribe(Subscription(tq.api),
+                                       config.get('klines'),
+                                       config.get('ticks'),
+                                       (config.get('shm') or {}).get(
+                                           'capacity', 10000))
+    try:
+        while tq.api.wait_update():
+            publisher.publish()
+    finally:
+        publisher.close()
+        tq.api.close()
@@ -0,0 +1,179 @@
+#!/usr/bin/env python
+#-*- coding: utf-8 -*-
+#FILE: snapshot.py
+#CREATE_TIME: 2026-10-18
+#AUTHOR: Sancho
+"""
+热重启快照
+定期把策略状态、增量指标和目标持仓写入二进制文件(pickle + zlib)，重启后恢复，
+指标只补算快照之后收盘的K线，不再从整个K线序列重新计算
+
+* 状态在主线程中序列化(得到一致的副本)，压缩和写入在后台线程中进行，不阻塞事件循环，
+  上一次写入未完成时跳过本次
+* 策略按(合约, 类名, 参数)识别，策略代码、基类(如`Monitor`)或增量指标(`indicators.py`)
+  修改后快照中的状态不再恢复
+* 快照与行情进度无关，回测和离线回放时不要使用上一次运行的快照
+"""
+
+import hashlib
+import inspect
+import os
+import pickle
+import struct
+import threading
+import time
+import zlib
+from functools import lru_cache
+from typing import Dict, List, Union
+from cache import fn_id
+
+MAGIC = b'QTSS'
+HEADER = struct.Struct('<4sHd')  # (MAGIC, 版本, 写入时间)
+VERSION = 1
+
+
+@lru_cache(maxsize=None)
+def identity(cls: type) -> str:
+    """策略状态的版本：策略类和全部基类的源码，以及状态中增量指标所在模块的源码"""
+    import indicators
+    source = inspect.getsource(indicators)
+    return ':'.join([fn_id(c) for c in cls.__mro__ if c is not object] +
+                    [hashlib.sha1(source.encode()).hexdigest()])
+
+
+def key(strategy) -> str:
+    """策略在快照中的标识"""
+    return (f'{strategy.symbol}:{type(strategy).__name__}:'
+            f'{sorted(getattr(strategy, "params", {}).items())!r}')
+
+
+class Snapshot:
+    def __init__(self,
+                 path: str,
+                 interval: float = 60,
+                 max_age: float = 0) -> None:
+        """
+        Args:
+            path: 快照文件 \n
+            interval: 写入间隔(秒) \n
+            max_age: 超过该秒数的快照不恢复，0=不限制 \n
+        """
+        self.path = path
+        self.interval = interval
+        self.max_age = max_age
+        self.state = self.load()
+        self.restored = 0  # 恢复的策略数
+        self.saves, self.skipped = 0, 0
+        self.last_size = 0  # 最近一次写入的字节数
+        self._next = time.monotonic() + interval
+        self._thread: Union[threading.Thread, None] = None
+
+    # |-------------------- 读取 --------------------|
+
+    def load(self) -> dict:
+        """读取快照，文件不存在、损坏、版本不同或过期时返回空状态"""
+        try:
+            with open(self.path, 'rb') as f:
+                data = f.read()
+            magic, version, saved = HEADER.unpack_from(data)
+            if magic != MAGIC or version != VERSION:
+                return {}
+            if self.max_age and time.time() - saved > self.max_age:
+                print(f'快照已过期，不恢复: {self.path}')
+                return {}
+            return pickle.loads(zlib.decompress(data[HEADER.size:]))
+        except FileNotFoundError:
+            return {}
+        except Exception as e:
+            print(f'{e}\n快照读取失败，不恢复: {self.path}')
+            return {}
+
+    def get(self, strategy) -> Union[dict, None]:
+        """策略在快照中的状态，没有或策略代码已修改时返回`None`"""
+        saved = self.state.get('strategies', {}).get(key(strategy))
+        if saved is None or saved[0] != identity(type(strategy)):
+            return None
+        self.restored += 1
+        return saved[1]
+
+    def restore(self, trade, tasks: dict, strategies: list) -> None:
+        """
+        恢复目标持仓，在创建策略之后调用
+
+        Args:
+            trade: 交易对象 \n
+            tasks: {合约: 目标持仓对象} \n
+            strategies: 已创建的策略 \n
+        """
+        if 'trade' in self.state:
+            trade.restore(self.state['trade'], tasks,
+                          {key(s): s for s in strategies})
+        if self.state:
+            print(f'从快照恢复: {self.restored}/{len(strategies)}个策略')
+
+    # |-------------------- 写入 --------------------|
+
+    def dumps(self, trade, strategies: list) -> bytes:
+        """序列化当前状态"""
+        return pickle.dumps(
+            {
+                'strategies': {
+                    key(s): (identity(type(s)), s.get_state())
+                    for s in strategies
+                },
+                'trade': trade.state(key),
+            },
+            protocol=pickle.HIGHEST_PROTOCOL)
+
+    def _write(self, data: bytes, saved: float) -> None:
+        data = HEADER.pack(MAGIC, VERSION, saved) + zlib.compress(data)
+        tmp = f'{self.path}.tmp'
+        try:
+            with open(tmp, 'wb') as f:
+                f.write(data)
+            os.replace(tmp, self.path)  # 写入完成后替换，中断时旧快照仍然完整
+            self.last_size = len(data)
+        except OSError as e:
+            print(f'{e}\n快照写入失败: {self.path}')
+
+    def save(self, trade, strategies: list, block: bool = False) -> bool:
+        """
+        写入快照，`block=False`时在后台线程中压缩和写入
+
+        Returns:
+            上一次写入未完成而跳过时返回`False`
+        """
+        if self._thread is not None and self._thread.is_alive():
+            if not block:
+                self.skipped += 1
+                return False
+            self._thread.join()
+        data = self.dumps(trade, strategies)
+        self.saves += 1
+        if block:
+            self._write(data, time.time())
+        else:
+            self._thread = threading.Thread(target=self._write,
+                                            args=(data, time.time()),
+                                            daemon=True)
+            self._thread.start()
+        return True
+
+    def tick(self, trade, strategies: list) -> None:
+        """每次更新后调用，到达写入间隔时写入"""
+        now = time.monotonic()
+        if now >= self._next:
+            self._next = now + self.interval
+            self.save(trade, strategies)
+
+    def close(self, trade, strategies: List) -> None:
+        """结束时写入最终状态"""
+        self.save(trade, strategies, block=True)
+
+    def status(self) -> Dict[str, int]:
+        return {
+            'restored': self.restored,
+            'saves': self.saves,
+            'skipped': self.skipped,
+            'bytes': self.last_size
+        }
@@ -4,24 +4,168 @@
 #CREATE_TIME: 2022-09-21
 #AUTHOR: Sancho
 
-from typing import Dict, Union
-from tqsdk import TqApi
-from tqsdk.objs import Quote
+import math
+import time
+from typing import TYPE_CHECKING, Any, Dict, List, Union
+import numpy as np
 from pandas import DataFrame
 
+if TYPE_CHECKING:
+    from tqsdk import TqApi
+    from tqsdk.objs import Quote
+
+
+class LazySerial:
+    """
+    K线/Tick的延迟订阅句柄，第一次读取时才发出订阅请求，
+    读取方式与`DataFrame`相同，如`kline.iloc[-1]`、`kline['close']`
+    """
+    __slots__ = ('api', 'kind', 'symbol', 'args', 'serial', 'pinned',
+                 'accessed', 'last')
+
+    def __init__(self, api: 'TqApi', kind: str, symbol: str, *args) -> None:
+        """
+        Args:
+            api: 天勤API \n
+            kind: `kline`或`tick` \n
+            symbol: 合约代码 \n
+            args: 订阅参数，K线为(周期, 序列长度)，Tick为(序列长度,) \n
+        """
+        self.api = api
+        self.kind = kind
+        self.symbol = symbol
+        self.args = args
+        self.serial = None
+        self.pinned = False  # 固定的订阅不因闲置释放
+        self.accessed = False  # 上次检查之后是否被读取
+        self.last = time.monotonic()  # 最近一次确认被读取的时间
+
+    def get(self) -> DataFrame:
+        """返回序列，未订阅时订阅"""
+        self.accessed = True
+        if self.serial is None:
+            if self.kind == 'kline':
+                self.serial = self.api.get_kline_serial(self.symbol, *self.args)
+            else:
+                self.serial = self.api.get_tick_serial(self.symbol, *self.args)
+        return self.serial
+
+    def pin(self) -> DataFrame:
+        """订阅并固定，用于调度器、行情录制等需要持续接收更新的地方"""
+        self.pinned = True
+        return self.get()
+
+    @property
+    def subscribed(self) -> bool:
+        return self.serial is not None
+
+    def release(self) -> None:
+        """释放订阅，再次读取时重新订阅"""
+        if self.serial is not None:
+            # 离线回放支持停止更新序列，天勤没有取消订阅的接口(引擎不会开启延迟订阅)
+            if release := getattr(self.api, 'release', None):
+                release(self.serial)
+            self.serial = None
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.get(), name)
+
+    def __getitem__(self, key) -> Any:
+        return self.get()[key]
+
+    def __len__(self) -> int:
+        return len(self.get())
+
+    def __repr__(self) -> str:
+        state = '已订阅' if self.serial is not None else '未订阅'
+        return f'LazySerial({self.kind}, {self.symbol}, {state})'
+
+
+class SerialView:
+    """
+    K线/Tick序列的轻量视图，按列缓存序列底层的NumPy数组，
+    读取最新值和最近N行不创建`Series`，也不复制数据
+
+    天勤和离线回放都原地更新序列的数组，缓存的列始终是最新数据
+
+    Example:
+        kline = SerialView(api.get_kline_serial(symbol, 60))
+        kline.last('close')  # 最新收盘价
+        kline.last('close', 20)  # 最近20根收盘价，ndarray视图
+        kline.to_pandas()  # 原始DataFrame，用于研究
+    """
+    __slots__ = ('serial', '_frame', '_cols', '_lazy')
+
+    def __init__(self, serial: Union[DataFrame, LazySerial]) -> None:
+        self.serial = serial
+        self._lazy = isinstance(serial, LazySerial)
+        self._frame = None if self._lazy else serial
+        self._cols: Dict[str, np.ndarray] = {}
+
+    def to_pandas(self) -> DataFrame:
+        """原始序列，延迟订阅时在此订阅"""
+        if self._lazy:
+            frame = self.serial.get()
+            if frame is not self._frame:  # 重新订阅后是新的序列
+                self._frame = frame
+                self._cols = {}
+        return self._frame
+
+    def col(self, field: str) -> np.ndarray:
+        """整列数据(零拷贝)"""
+        if self._lazy:
+            self.to_pandas()
+        try:
+            return self._cols[field]
+        except KeyError:
+            col = self._cols[field] = self._frame[field].to_numpy()
+            return col
+
+    __getitem__ = col
+
+    def last(self, field: str, n: int = None) -> Union[float, np.ndarray]:
+        """最新一行的字段值，传入`n`时返回最近n行(零拷贝)"""
+        col = self.col(field)
+        return col[-1] if n is None else col[-n:]
+
+    def get(self, field: str, i: int = -1) -> float:
+        """第`i`行的字段值"""
+        return self.col(field)[i]
+
+    def row(self, i: int = -1) -> Dict[str, Any]:
+        """第`i`行的全部字段，会创建字典，只用于打印等非热路径"""
+        return self.to_pandas().iloc[i].to_dict()
+
+    def __len__(self) -> int:
+        return len(self.col('id'))
+
+    def __repr__(self) -> str:
+        return f'SerialView({self.serial!r})'
+
+
+def resolve(obj: Any) -> Any:
+    """
+    视图返回原始序列，延迟订阅句柄返回固定后的序列，其他对象原样返回
+    """
+    if isinstance(obj, SerialView):
+        obj = obj.serial
+    return obj.pin() if isinstance(obj, LazySerial) else obj
+
 
 class Subscription:
     """订阅合约"""
-    def __init__(self, api: TqApi) -> None:
+    def __init__(self, api: 'TqApi') -> None:
         self.api = api
+        self.objs: Dict[str, list] = {}  # {合约: [批量订阅的对象]}
+        self.pending = set()  # 批量订阅中尚未就绪的合约
+        self.lazy: List[LazySerial] = []  # 延迟订阅句柄
+        self.resampler = None  # 本地多周期K线合成，`resample`时创建
 
-    def get_quotes(self, quotes: list) -> Dict[str, Quote]:
+    def get_quotes(self, quotes: list) -> Dict[str, 'Quote']:
         """订阅实时行情"""
         return {symbol: self.api.get_quote(symbol)
                 for symbol in quotes}  # {'symbol1':quote,'symbol2':quote, ...}
 
-    # TODO: 异步订阅实时行情
-
     def get_klines(self,
                    klines: dict,
                    merge: bool = False) -> Dict[Union[list, str], DataFrame]:
@@ -53,3 +197,181 @@ class Subscription:
             symbol: self.api.get_tick_serial(symbol, data_length)
             for symbol, data_length in ticks.items()
         }
+
+    def resample(self,
+                 resample: dict,
+                 klines: dict = None,
+                 ticks: dict = None,
+                 data_length: int = 200) -> Dict[str, Dict[int, DataFrame]]:
+        """
+        本地合成多周期K线，每个合约由已订阅的K线(没有时由Tick)合成，不额外订阅，
+        每次`wait_update()`后需调用`self.resampler.update()`
+
+        Args:
+            resample: {合约: [周期/秒, ...]} \n
+            klines: `get_klines`返回的K线 \n
+            ticks: `get_ticks`返回的Tick \n
+            data_length: 合成序列的长度 \n
+
+        Returns:
+            {合约: {周期: K线序列}}
+        """
+        from resample import Resampler
+        if self.resampler is None:
+            self.resampler = Resampler(self.api)
+        klines, ticks = klines or {}, ticks or {}
+        result = {}
+        for symbol, durations in resample.items():
+            if symbol in klines:
+                source = resolve(klines[symbol])
+                base = int(source['duration'].iloc[-1])
+            elif symbol in ticks:
+                source, base = resolve(ticks[symbol]), None
+            else:
+                raise ValueError(f'合成{symbol}的K线需要在klines或ticks中订阅该合约')
+            result[symbol] = self.resampler.add(source, durations, base,
+                                                data_length)
+        return result
+
+    def get_panel(self,
+                  klines: dict,
+                  data_length: int = 200,
+                  serials: Dict[str, DataFrame] = None):
+        """
+        多合约对齐面板，`(合约 × 时间 × 字段)`数组，每次`wait_update()`后需调用`update()`
+
+        Args:
+            klines: K线设置，格式同`get_klines`，周期可以不同 \n
+            data_length: 时间轴长度 \n
+            serials: （可选）已订阅的K线，未包含的合约在这里订阅 \n
+        """
+        from panel import KlinePanel
+        serials = serials or {}
+        missing = {s: l for s, l in klines.items() if s not in serials}
+        if missing:
+            serials = dict(serials, **self.get_klines(missing))
+        return KlinePanel(self.api,
+                          {s: resolve(serials[s])
+                           for s in klines},
+                          {s: int(l[0])
+                           for s, l in klines.items()}, data_length)
+
+    def lazy_klines(self, klines: dict) -> Dict[str, LazySerial]:
+        """K线的延迟订阅句柄，格式同`get_klines`(不支持合并)"""
+        handles = {
+            symbol: LazySerial(self.api, 'kline', symbol, l[0], l[1])
+            for symbol, l in klines.items()
+        }
+        self.lazy.extend(handles.values())
+        return handles
+
+    def lazy_ticks(self, ticks: dict) -> Dict[str, LazySerial]:
+        """Tick的延迟订阅句柄，格式同`get_ticks`"""
+        handles = {
+            symbol: LazySerial(self.api, 'tick', symbol, data_length)
+            for symbol, data_length in ticks.items()
+        }
+        self.lazy.extend(handles.values())
+        return handles
+
+    def release_idle(self, idle: float) -> List[LazySerial]:
+        """
+        释放超过`idle`秒没有被读取的延迟订阅，需要定时调用
+
+        Returns:
+            本次释放的句柄
+        """
+        now = time.monotonic()
+        released = []
+        for handle in self.lazy:
+            if handle.accessed:
+                handle.accessed = False
+                handle.last = now
+            elif (handle.serial is not None and not handle.pinned
+                  and now - handle.last >= idle):
+                handle.release()
+                released.append(handle)
+        return released
+
+    def subscribe(self,
+                  quotes: list = None,
+                  klines: dict = None,
+                  ticks: dict = None,
+                  merge: bool = False) -> List[Union[dict, None]]:
+        """
+        批量订阅：在一个协程中一次发出全部quote、K线、Tick请求，不逐个等待数据到达，
+        之后用`wait_ready`同时等待，或在事件循环中用`poll`获取陆续就绪的合约
+
+        Returns:
+            [quotes, klines, ticks]，未订阅的项为`None`
+        """
+        subs = [None, None, None]
+
+        async def request():
+            # 协程中的订阅函数不等待数据，请求在同一次`wait_update()`中发出
+            subs[0] = self.get_quotes(quotes) if quotes else None
+            subs[1] = self.get_klines(klines, merge) if klines else None
+            subs[2] = self.get_ticks(ticks) if ticks else None
+
+        task = self.api.create_task(request())
+        while not task.done():
+            self.api.wait_update()
+        task.result()  # 抛出订阅时的异常
+        for sub in subs:
+            for symbol, obj in (sub or {}).items():
+                self.objs.setdefault(symbol, []).append(obj)
+        self.pending = set(self.objs)
+        return subs
+
+    @staticmethod
+    def _is_ready(obj) -> bool:
+        if isinstance(obj, DataFrame):
+            return len(obj) > 0 and not math.isnan(obj['id'].iloc[-1])
+        return bool(obj.datetime)
+
+    def is_ready(self, symbol: str) -> bool:
+        """合约的quote、K线、Tick都已收到数据"""
+        return symbol not in self.pending
+
+    def poll(self) -> List[str]:
+        """
+        检查未就绪的合约，在`wait_update()`之后调用
+
+        Returns:
+            本次新就绪的合约
+        """
+        ready = [
+            symbol for symbol in self.pending
+            if all(map(self._is_ready, self.objs[symbol]))
+        ]
+        self.pending.difference_update(ready)
+        return ready
+
+    def wait_ready(self, timeout: float = 30, interval: float = 1) -> List[str]:
+        """
+        同时等待所有批量订阅的合约就绪，定时打印进度，超时后打印未就绪的合约并返回，
+        未就绪的合约可在事件循环中继续`poll`
+
+        Args:
+            timeout: 最长等待秒数 \n
+            interval: 打印进度的间隔秒数 \n
+
+        Returns:
+            未就绪的合约
+        """
+        start = time.time()
+        deadline, last = start + timeout, start
+        total = len(self.objs)
+        self.poll()
+        while self.pending and time.time() < deadline:
+            if not self.api.wait_update(deadline=deadline):
+                break
+            self.poll()
+            if time.time() - last >= interval:
+                last = time.time()
+                print(f'订阅进度: {total - len(self.pending)}/{total}')
+        if self.pending:
+            print(f'订阅超时({timeout}秒)，未就绪的合约: {sorted(self.pending)}')
+        else:
+            print(f'订阅完成: {total}个合约，耗时{time.time() - start:.2f}秒')
+        return sorted(self.pending)
@@ -0,0 +1,144 @@
+#!/usr/bin/env python
+#-*- coding: utf-8 -*-
+#FILE: sweep.py
+#CREATE_TIME: 2026-10-18
+#AUTHOR: Sancho
+"""
+策略参数扫描
+按`config.yml`中的参数网格在进程池中并行运行向量化回测
+"""
+
+import csv
+import itertools
+import os
+import time
+from multiprocessing import Pool, shared_memory
+from typing import Dict, List
+import numpy as np
+from backtest import Backtest, load_klines
+from shm import attach
+
+_BT = None  # 子进程中的回测对象
+_STRATEGY = None
+_SHM = []  # 子进程持有的共享内存，防止被回收
+LOSSES = {'max_drawdown', 'cost'}  # 越小越好的指标，升序排列
+
+
+def grid(params: Dict[str, list]) -> List[dict]:
+    """展开参数网格，`{'K1': [0.1, 0.2]}` -> `[{'K1': 0.1}, {'K1': 0.2}]`"""
+    names = list(params)
+    return [
+        dict(zip(names, values))
+        for values in itertools.product(*(params[n] for n in names))
+    ]
+
+
+def share(data: Dict[str, np.ndarray]) -> tuple:
+    """
+    把K线列数组复制到共享内存，返回(共享内存列表, 子进程挂载描述)
+    """
+    blocks, layout = [], {}
+    for name, arr in data.items():
+        arr = np.ascontiguousarray(arr)
+        shm = shared_memory.SharedMemory(create=True, size=max(arr.nbytes, 1))
+        np.ndarray(arr.shape, arr.dtype, buffer=shm.buf)[:] = arr
+        blocks.append(shm)
+        layout[name] = (shm.name, arr.shape, arr.dtype.str)
+    return blocks, layout
+
+
+def _init_worker(layout: dict, strategy: str, options: dict) -> None:
+    """子进程初始化：挂载共享内存中的只读K线，不逐任务复制数据"""
+    global _BT, _STRATEGY
+    import monitor
+    data = {}
+    for name, (shm_name, shape, dtype) in layout.items():
+        shm = attach(shm_name)
+        _SHM.append(shm)
+        arr = np.ndarray(shape, np.dtype(dtype), buffer=shm.buf)
+        arr.flags.writeable = False
+        data[name] = arr
+    _BT = Backtest(data, **options)
+    _STRATEGY = getattr(monitor, strategy)
+
+
+def _run(params: dict) -> dict:
+    result = _BT.run(_STRATEGY, **params)
+    row = dict(params)
+    row.update(
+        {k: v
+         for k, v in result.items() if not isinstance(v, np.ndarray)})
+    return row
+
+
+def sweep(data: Dict[str, np.ndarray],
+          strategy: str,
+          params: Dict[str, list],
+          processes: int = None,
+          sort: str = 'pnl',
+          volume_multiple: float = 1,
+          fee: float = 0,
+          slippage: float = 0,
+          bars_per_year: float = None) -> List[dict]:
+    """
+    并行扫描参数网格，返回按`sort`排列的结果表，从好到差
+
+    Args:
+        data: K线列数组，参考`load_klines` \n
+        strategy: `monitor.py`中的策略类名，需实现`signals` \n
+        params: 参数网格，如`{'NDAY': [3, 5], 'K1': [0.1, 0.2]}` \n
+        processes: 进程数，默认使用全部CPU核心 \n
+        sort: 排序指标，如`pnl`、`sharpe`降序，`max_drawdown`等亏损指标升序 \n
+        bars_per_year: 每年K线数，用于年化夏普比率，默认按`datetime`估计 \n
+    """
+    combos = grid(params)
+    processes = processes or os.cpu_count()
+    options = dict(volume_multiple=volume_multiple,
+                   fee=fee,
+                   slippage=slippage,
+                   bars_per_year=bars_per_year)
+    blocks, layout = share(data)
+    try:
+        start = time.time()
+        with Pool(processes, _init_worker,
+                  (layout, strategy, options)) as pool:
+            chunksize = max(1, len(combos) // (processes * 8))
+            rows = []
+            for row in pool.imap_unordered(_run, combos, chunksize):
+                rows.append(row)
+                if len(rows) % 1000 == 0:
+                    print(f'已完成 {len(rows)}/{len(combos)}')
+        print(f'参数组合: {len(combos)}, 进程数: {processes}, '
+              f'耗时: {time.time() - start:.2f}s')
+    finally:
+        for shm in blocks:
+            shm.close()
+            shm.unlink()
+    rows.sort(key=lambda r: r[sort], reverse=sort not in LOSSES)
+    return rows
+
+
+def save(rows: List[dict], path: str) -> None:
+    """结果表写入csv"""
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=list(rows[0]))
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+if __name__ == "__main__":
+    from main import Engine
+    config = Engine.get_config()
+    bt_config, config = config['backtest'], config['sweep']
+    rows = sweep(load_klines(config.get('data') or bt_config['data']),
+                 config.get('strategy') or bt_config['strategy'],
+                 config['grid'],
+                 config.get('processes'),
+                 config.get('sort', 'pnl'),
+                 bt_config['volume_multiple'],
+                 bt_config['fee'],
+                 bt_config['slippage'],
+                 bt_config.get('bars_per_year'))
+    save(rows, config['output'])
+    for row in rows[:10]:
+        print(row)
@@ -5,7 +5,7 @@
 #AUTHOR: Sancho
 
 import datetime
-from tqsdk import TqApi, TqAuth, TqAccount, TqKq, TqSim, TqBacktest, TqMultiAccount, TqMultiAccount
+from tqsdk import TqApi, TqAuth, TqAccount, TqKq, TqSim, TqBacktest, TqMultiAccount
 
 
 class Tq:
@@ -17,28 +17,36 @@ class Tq:
                  balance: int = 9999999,
                  accounts: list = None,
                  start_dt: list = None,
-                 end_dt: list = None) -> None:
+                 end_dt: list = None,
+                 replay: dict = None) -> None:
         """
         登录天勤,请在`config.yml`配置登录信息
 
         Args:
             config:天勤账号 \n
             password:天勤密码 \n
-            _type:`moni`=模拟(默认),`shipan`=实盘,`kq`=快期模拟,`huice`=回测 \n
+            _type:`moni`=模拟(默认),`shipan`=实盘,`kq`=快期模拟,`huice`=回测,`replay`=离线回放 \n
             web_gui:开启网页可视化，默认`False`，`True`=随机端口，或使用固定端口如`:9876` \n
             balance:模拟的初始资金 \n
             accounts:实盘账户列表 \n
             start_dt:回测开始时间，如`[2022,01,01] `\n
             end_dt:回测结束时间 \n
+            replay:离线回放设置，参考`config.yml`中的`replay`项 \n
         """
         # 初始化变量
         self.web_gui = web_gui
-        self.auth = TqAuth(username, password)  # 填充账密
-        self.sim = TqSim(init_balance=balance)
+        self.username = username
+        self.password = password
+        self.balance = balance
         self.start_dt = start_dt
         self.end_dt = end_dt
         self.accounts = accounts
-        # 模式选择
+        self.ratios = None  # 多账户的目标持仓分配比例
+        self.replay = replay
+        # 模式选择，离线回放不需要天勤账号，配置错误直接抛出
+        if _type == "replay":
+            self.api = self._type_replay()
+            return
         try:
             if _type == "huice":
                 self.api = self._type_huice()
@@ -52,10 +60,9 @@ class Tq:
             print(f"{e}\n认证失败!")
 
     def _type_shipan(self):
-        # REVIEW: 未测试
-        self.accounts_count = len(self.accounts)
+        self.accounts_count = len(self.accounts or [])
         if not self.accounts_count:
-            raise '请正确输入实盘账户(accounts)\n'
+            raise ValueError('请正确输入实盘账户(accounts)\n')
         elif self.accounts_count == 1:  # 1个账户
             accounts = self.accounts[0]
             self.accounts = [
@@ -66,12 +73,13 @@ class Tq:
             ]
 
             return self._get_api(self.accounts[0])
-        # 多账户模式
+        # 多账户模式，所有账户共用一个连接，同一次`wait_update()`中发出各账户的委托
+        self.ratios = [account.get('ratio', 1) for account in self.accounts]
         self.accounts = [
             TqAccount(account['com'],
                       account['account'],
                       account['password'],
-                      td_url=account['tcp']) for account in accounts
+                      td_url=account['tcp']) for account in self.accounts
         ]
         return self._get_api(TqMultiAccount(self.accounts))
 
@@ -80,22 +88,35 @@ class Tq:
         return self._get_api(self.accounts[0])
 
     def _type_moni(self):
-        self.accounts = [self.sim]
+        self.accounts = [TqSim(init_balance=self.balance)]
         return self._get_api(self.accounts[0])
 
     def _type_huice(self):
         # REVIEW: 未测试
-        self.accounts = [self.sim]
+        self.accounts = [TqSim(init_balance=self.balance)]
         start_dt = datetime.date(*self.start_dt)
         end_dt = datetime.date(*self.end_dt)
         return self._get_api_huice(self.accounts[0],
                                    TqBacktest(start_dt, end_dt))
 
+    def _type_replay(self):
+        from replay import ReplayApi
+        replay = self.replay or {}
+        api = ReplayApi(replay['path'], replay.get('speed', 0),
+                        replay.get('start_dt'), replay.get('end_dt'),
+                        self.balance, replay.get('volume_multiple', 1),
+                        replay.get('fee', 0))
+        self.accounts = [api.account]
+        return api
+
+    def _auth(self):
+        return TqAuth(self.username, self.password)  # 填充账密
+
     def _get_api(self, _type=None):
-        return TqApi(_type, auth=self.auth, web_gui=self.web_gui)
+        return TqApi(_type, auth=self._auth(), web_gui=self.web_gui)
 
     def _get_api_huice(self, sim, backtest):
         return TqApi(sim,
-                     auth=self.auth,
+                     auth=self._auth(),
                      backtest=backtest,
                      web_gui=self.web_gui)
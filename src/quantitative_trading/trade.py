@@ -4,14 +4,180 @@
 #CREATE_TIME: 2022-09-21
 #AUTHOR: Sancho
 
-from tqsdk import TqApi, TargetPosTask
+from typing import TYPE_CHECKING, Callable, Dict, Hashable, List, Tuple
+
+if TYPE_CHECKING:
+    from tqsdk import TqApi, TargetPosTask
+
+
+class Netting:
+    POLICIES = ('sum', 'weighted', 'priority')
+
+    def __init__(self,
+                 policy: str = 'sum',
+                 weights: Dict[str, float] = None,
+                 priority: List[str] = None) -> None:
+        """
+        目标持仓轧差：收集一次更新中各策略对同一合约(账户)的目标持仓，合并为净目标
+
+        Args:
+            policy: `sum`=各策略目标相加，`weighted`=按策略权重加权后取整，
+                `priority`=取优先级最高的策略的目标 \n
+            weights: 策略类名: 权重，未配置的策略权重为1 \n
+            priority: 策略类名列表，靠前的优先，未列出的最低，同级取最近一次更新 \n
+        """
+        if policy not in self.POLICIES:
+            raise ValueError(f'不支持的轧差方式: {policy}，可选{self.POLICIES}')
+        self.policy = policy
+        self.weights = weights or {}
+        self.rank = {name: i for i, name in enumerate(priority or [])}
+        # {目标持仓对象: {策略: 目标持仓}}，保留各策略最近的目标，按更新先后排列
+        self.targets: Dict[Hashable, dict] = {}
+        self._dirty = set()
+
+    def update(self, key: Hashable, strategy, volume: int) -> None:
+        """记录策略的目标持仓，`flush`时才合并"""
+        targets = self.targets.setdefault(key, {})
+        targets.pop(strategy, None)
+        targets[strategy] = volume
+        self._dirty.add(key)
+
+    def _name(self, strategy) -> str:
+        return type(strategy).__name__ if strategy is not None else ''
+
+    def net(self) -> List[Tuple[Hashable, int]]:
+        """本次更新中目标发生变化的合约及其净目标持仓"""
+        result = []
+        for key in self._dirty:
+            targets = self.targets[key]
+            if self.policy == 'sum':
+                volume = sum(targets.values())
+            elif self.policy == 'weighted':
+                volume = round(
+                    sum(
+                        self.weights.get(self._name(s), 1) * v
+                        for s, v in targets.items()))
+            else:
+                last, best = len(self.rank), None
+                # 按更新先后遍历，排名相同时后更新的覆盖
+                for strategy, v in targets.items():
+                    rank = self.rank.get(self._name(strategy), last)
+                    if best is None or rank <= best[0]:
+                        best = (rank, v)
+                volume = best[1]
+            result.append((key, volume))
+        self._dirty.clear()
+        return result
+
+    def state(self, name: Callable, key: Callable) -> Dict[str, list]:
+        """
+        快照：各策略最近的目标持仓{合约: [(策略标识, 目标持仓)]}
+
+        Args:
+            name: 目标持仓对象转换为合约代码 \n
+            key: 策略转换为快照中的标识 \n
+        """
+        return {
+            name(k): [(key(s), v) for s, v in targets.items() if s is not None]
+            for k, targets in self.targets.items()
+        }
+
+    def restore(self, state: Dict[str, list], tasks: dict,
+                strategies: dict) -> None:
+        """
+        从快照恢复各策略的目标持仓，下次`net`时重新合并
+
+        Args:
+            state: `state`的结果 \n
+            tasks: {合约: 目标持仓对象} \n
+            strategies: {策略标识: 策略} \n
+        """
+        for symbol, targets in state.items():
+            if (task := tasks.get(symbol)) is None:
+                continue
+            restored = {
+                strategies[k]: v
+                for k, v in targets if k in strategies
+            }
+            if restored:
+                self.targets[task] = restored
+                self._dirty.add(task)
+
+
+def allocate(volume: int, ratios: List[float]) -> List[int]:
+    """
+    按比例把目标持仓分配到各账户(最大余数法)，各账户之和等于`volume`
+
+    Example:
+        allocate(5, [1, 1]) == [3, 2]
+        allocate(-4, [3, 1]) == [-3, -1]
+    """
+    total = sum(ratios)
+    if total <= 0:
+        raise ValueError('账户分配比例之和必须大于0')
+    n = abs(volume)
+    shares = [n * r / total for r in ratios]
+    result = [int(x) for x in shares]
+    # 剩余的手数按小数部分从大到小分配，相同时靠前的账户优先
+    order = sorted(range(len(ratios)),
+                   key=lambda i: (result[i] - shares[i], i))
+    for i in order[:n - sum(result)]:
+        result[i] += 1
+    return [v if volume >= 0 else -v for v in result]
+
+
+class AccountsTask:
+    def __init__(self, api: 'TqApi', symbol: str, tasks: list, accounts: list,
+                 ratios: List[float]) -> None:
+        """
+        多账户目标持仓，与`TargetPosTask`用法相同，
+        `set_target_volume`把目标按比例分配后同时设置到各账户，
+        委托在同一次`wait_update()`中发出
+
+        Args:
+            api: 天勤API \n
+            symbol: 合约代码 \n
+            tasks: 各账户的目标持仓对象 \n
+            accounts: 账户列表，与`tasks`一一对应 \n
+            ratios: 各账户的分配比例 \n
+        """
+        if len(ratios) != len(tasks):
+            raise ValueError(f'账户分配比例数量({len(ratios)})与账户数量({len(tasks)})不一致')
+        self.api = api
+        self.symbol = symbol
+        self.tasks = tasks
+        self.accounts = accounts
+        self.ratios = ratios
+        self.targets = [None] * len(tasks)  # 各账户最近一次设置的目标持仓
+        self.positions = [
+            api.get_position(symbol, account=account) for account in accounts
+        ]
+
+    def set_target_volume(self, volume: int) -> None:
+        for i, v in enumerate(allocate(volume, self.ratios)):
+            if self.targets[i] != v:
+                self.tasks[i].set_target_volume(v)
+                self.targets[i] = v
+
+    def status(self) -> List[dict]:
+        """各账户的目标持仓和当前持仓，`filled`表示已调整到目标"""
+        return [{
+            'account': i,
+            'target': target,
+            'pos': position.pos,
+            'filled': target is None or position.pos == target
+        } for i, (target,
+                  position) in enumerate(zip(self.targets, self.positions))]
 
 
 class Trade:
     def __init__(self,
-                 api: TqApi,
+                 api: 'TqApi',
                  quotes: dict,
-                 accounts: list = None) -> None:
+                 accounts: list = None,
+                 netting: dict = None,
+                 ratios: List[float] = None,
+                 risk: dict = None) -> None:
         """
         初始化交易模式
 
@@ -19,13 +185,22 @@ class Trade:
             api: 天勤API \n
             quotes: 订阅的quote，接收字典 \n
             accounts: （可选）可设置多账户列表，元素类型为`TqAccount` \n
+            netting: （可选）目标持仓轧差设置，即`Netting`的参数，
+                设置后`trading`只记录目标，`flush`时每个合约只下一次净目标 \n
+            ratios: （可选）多账户时目标持仓在各账户间的分配比例，默认平均分配 \n
+            risk: （可选）交易前风控设置，即`RiskEngine`的参数，
+                有非0的上限时每个目标持仓下达前检查，需要在每次更新后调用`risk.update()` \n
         """
         self.api = api
         self.quotes = quotes
         self.accounts = accounts
+        self.netting = Netting(**netting) if netting else None
+        self._sent = {}  # {目标持仓对象: 最近一次设置的目标持仓}
+        self._names = {}  # {目标持仓对象: 合约}
         if not self.accounts:
             # 获取账户
             self.accounts = [self.api._account]
+        self.ratios = ratios or [1] * len(self.accounts)
         self.accounts_info, self.positions, self.orders = [], [], []
         # 拉取账户情况
         for account in self.accounts:
@@ -34,6 +209,12 @@ class Trade:
             self.positions.append(
                 self.api.get_position(account=account))  # 持仓情况
             self.orders.append(self.api.get_order(account=account))  # 委托单情况
+        self.risk = None
+        if risk:
+            from risk import RiskEngine
+            if RiskEngine.limited(risk):  # 上限全为0时不检查
+                self.risk = RiskEngine(api, quotes, self.accounts,
+                                       self.accounts_info, **risk)
 
     def _set_trade(self,
                    symbol,
@@ -41,15 +222,20 @@ class Trade:
                    offset_priority='今昨,开',
                    min_volume=None,
                    max_volume=None,
-                   account=None) -> TargetPosTask:
+                   account=None) -> 'TargetPosTask':
         """设置目标持仓对象"""
-        return TargetPosTask(self.api,
-                             symbol,
-                             price,
-                             offset_priority,
-                             min_volume,
-                             max_volume,
-                             account=account)
+        # 离线回放API自带目标持仓任务
+        task = getattr(self.api, 'TargetPosTask', None)
+        if task is None:
+            from tqsdk import TargetPosTask
+            task = TargetPosTask
+        return task(self.api,
+                    symbol,
+                    price,
+                    offset_priority,
+                    min_volume,
+                    max_volume,
+                    account=account)
 
     # TODO: 自定义函数下单方式(TargetPosTask(price=fun))
 
@@ -59,22 +245,116 @@ class Trade:
                    min_volume=None,
                    max_volume=None,
                    account=None) -> dict:
-        """批量设置合约目标持仓对象(单账户)"""
-        return {
-            name: self._set_trade(quote.instrument_id, price, offset_priority,
-                                  min_volume, max_volume, account)
+        """批量设置合约目标持仓对象，多账户时为`AccountsTask`"""
+        if len(self.accounts) > 1 and account is None:
+            return self.set_trades_accounts(price, offset_priority, min_volume,
+                                            max_volume)
+        tasks = {
+            # 批量订阅时未就绪的quote还没有合约代码
+            name:
+            self._set_trade(quote.instrument_id or name, price,
+                            offset_priority, min_volume, max_volume, account)
             for name, quote in self.quotes.items()
         }
+        self._names.update((task, name) for name, task in tasks.items())
+        return tasks
 
-    def set_trades_accounts(self) -> dict:
-        # REVIEW: 未测试
-        """批量设置多账户目标持仓对象"""
-        return {account: self.set_trades(account) for account in self.accounts}
+    def set_trades_accounts(self,
+                            price='ACTIVE',
+                            offset_priority='今昨,开',
+                            min_volume=None,
+                            max_volume=None) -> Dict[str, AccountsTask]:
+        """批量设置多账户目标持仓对象，每个合约的目标按`ratios`分配到各账户"""
+        per_account = [
+            self.set_trades(price, offset_priority, min_volume, max_volume,
+                            account) for account in self.accounts
+        ]
+        tasks = {
+            name: AccountsTask(self.api, quote.instrument_id or name,
+                               [tasks[name] for tasks in per_account],
+                               self.accounts, self.ratios)
+            for name, quote in self.quotes.items()
+        }
+        self._names.update((task, name) for name, task in tasks.items())
+        return tasks
 
-    def trading(self, target_pos_task: TargetPosTask, volume: int):
+    def trading(self,
+                target_pos_task: 'TargetPosTask',
+                volume: int,
+                strategy=None):
         """
         Args:
             target_pos_task (TargetPosTask): 目标持仓对象
             volume (int): 目标持仓手数，正数表示多头，负数表示空头，0表示空仓
+            strategy: （可选）发出目标的策略对象，轧差时区分不同策略
+        """
+        if self.netting:
+            self.netting.update(target_pos_task, strategy, volume)
+        else:
+            self._set_target(target_pos_task, volume)
+
+    def flush(self) -> None:
+        """每次更新结束时调用，按轧差方式下达目标发生变化的净目标持仓"""
+        if self.netting:
+            for task, volume in self.netting.net():
+                self._set_target(task, volume)
+
+    def pending(self) -> bool:
+        """是否有已下达但持仓还未达到的目标持仓"""
+        for task, volume in self._sent.items():
+            if isinstance(task, AccountsTask):
+                if not all(s['filled'] for s in task.status()):
+                    return True
+                continue
+            name = self._names.get(task)
+            quote = self.quotes.get(name)
+            symbol = getattr(quote, 'instrument_id', None) or name
+            if self.api.get_position(symbol,
+                                     account=self.accounts[0]).pos != volume:
+                return True
+        return False
+
+    def state(self, key: Callable) -> dict:
+        """
+        快照：各合约最近下达的目标持仓和轧差中各策略的目标持仓
+
+        Args:
+            key: 策略转换为快照中的标识 \n
+        """
+        return {
+            'targets': {
+                self._names[task]: volume
+                for task, volume in self._sent.items() if task in self._names
+            },
+            'netting':
+            self.netting.state(self._names.get, key) if self.netting else {}
+        }
+
+    def restore(self, state: dict, tasks: dict, strategies: dict) -> None:
         """
+        从快照恢复目标持仓，新的目标持仓对象继续调整到重启前的目标
+
+        Args:
+            state: `state`的结果 \n
+            tasks: {合约: 目标持仓对象} \n
+            strategies: {策略标识: 策略} \n
+        """
+        if self.netting:
+            # 下次`flush`时重新下达净目标
+            self.netting.restore(state.get('netting', {}), tasks, strategies)
+            return
+        for name, volume in state.get('targets', {}).items():
+            if (task := tasks.get(name)) is not None:
+                self._set_target(task, volume)
+
+    def _set_target(self, target_pos_task: 'TargetPosTask',
+                    volume: int) -> None:
+        """目标持仓未变化时不重复设置，开启风控时先检查"""
+        if self._sent.get(target_pos_task) == volume:
+            return
+        if self.risk:
+            volume = self.risk.check(self._names.get(target_pos_task), volume)
+            if volume is None or self._sent.get(target_pos_task) == volume:
+                return
         target_pos_task.set_target_volume(volume)
+        self._sent[target_pos_task] = volume
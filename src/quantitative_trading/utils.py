@@ -0,0 +1,63 @@
+#!/usr/bin/env python
+#-*- coding: utf-8 -*-
+#FILE: utils.py
+#CREATE_TIME: 2026-10-18
+#AUTHOR: Sancho
+"""
+通用工具
+"""
+
+import datetime
+from functools import lru_cache
+
+NS = 1000000000  # 1秒的纳秒数
+DAY = 86400 * NS
+CST = 8 * 3600 * NS  # 北京时间相对UTC的偏移
+NIGHT = 18 * 3600 * NS  # 夜盘开始后归属下一交易日
+_CST = datetime.timezone(datetime.timedelta(hours=8))
+_EPOCH = datetime.datetime(1970, 1, 1, tzinfo=datetime.timezone.utc)
+_US = datetime.timedelta(microseconds=1)
+
+
+@lru_cache(maxsize=4096)
+def _trading_day(days: int) -> int:
+    weekday = (days + 3) % 7  # 1970-01-01为周四，周一=0
+    if weekday == 5:  # 周五夜盘延续到周六凌晨，归属下周一
+        days += 2
+    elif weekday == 6:
+        days += 1
+    d = datetime.date.fromordinal(datetime.date(1970, 1, 1).toordinal() +
+                                  days)
+    return d.year * 10000 + d.month * 100 + d.day
+
+
+def trading_day(ns: int) -> int:
+    """
+    UTC纳秒时间戳所属的期货交易日，如`20220923`
+    夜盘归属下一交易日，不考虑节假日
+
+    Args:
+        ns: 天勤行情中的`datetime`字段 \n
+    """
+    days, rest = divmod(int(ns) + CST, DAY)
+    if rest >= NIGHT:
+        days += 1
+    return _trading_day(days)
+
+
+def parse_datetime(s: str) -> int:
+    """行情中的北京时间字符串转换为UTC纳秒时间戳，如`2022-09-22 09:00:00.000000`"""
+    dt = datetime.datetime.fromisoformat(s).replace(tzinfo=_CST)
+    return (dt - _EPOCH) // _US * 1000
+
+
+def format_datetime(ns: int) -> str:
+    """UTC纳秒时间戳转换为行情中的北京时间字符串"""
+    dt = (_EPOCH + int(ns) // 1000 * _US).astimezone(_CST)
+    return dt.strftime('%Y-%m-%d %H:%M:%S.%f')
+
+
+def to_ns(date: list) -> int:
+    """`config.yml`中的日期如`[2022,01,01]`转换为北京时间零点的UTC纳秒时间戳"""
+    dt = datetime.datetime(*date, tzinfo=_CST)
+    return (dt - _EPOCH) // _US * 1000
@@ -0,0 +1,73 @@
+#!/usr/bin/env python
+#-*- coding: utf-8 -*-
+#FILE: conftest.py
+#CREATE_TIME: 2026-10-18
+#AUTHOR: Sancho
+"""
+离线测试的公共设置
+框架模块按`src/quantitative_trading`目录内的平铺方式导入，
+引擎测试使用离线回放，不需要登录天勤
+"""
+
+import os
+import sys
+import numpy as np
+import pytest
+
+sys.path.insert(
+    0,
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                 'quantitative_trading'))
+
+import recorder
+import utils
+
+START = '2022-09-23 09:00:00'
+
+
+def write_klines(path: str,
+                 symbols=('A', 'B'),
+                 n: int = 300,
+                 period: int = 20,
+                 seed: int = 1,
+                 start: str = START) -> None:
+    """写入随机游走的K线，`period`秒一根，从`start`开始"""
+    store = recorder.Store(path)
+    rng = np.random.default_rng(seed)
+    t0 = utils.parse_datetime(start)
+    for symbol in symbols:
+        close = np.cumsum(rng.normal(0, 1, n)) + 100
+        open_ = close + rng.normal(0, .3, n)
+        store.append(f'kline_{period}', symbol, [
+            (t0 + i * period * utils.NS, i, open_[i],
+             max(open_[i], close[i]) + .5, min(open_[i], close[i]) - .5,
+             close[i], 1.0, 0., 0.) for i in range(n)
+        ])
+
+
+def replay_config(path: str, **kwargs) -> dict:
+    """离线回放的引擎配置"""
+    config = dict(tq_username='',
+                  tq_password='',
+                  type='replay',
+                  gui=False,
+                  balance=100000,
+                  accounts=None,
+                  quotes=['A', 'B'],
+                  klines={
+                      'A': [20, 50],
+                      'B': [20, 50]
+                  },
+                  merge=False,
+                  strategies='DualThrust',
+                  replay=dict(path=path))
+    config.update(kwargs)
+    return config
+
+
+@pytest.fixture
+def replay_path(tmp_path) -> str:
+    """写入了A、B两个合约20秒K线的回放目录"""
+    path = str(tmp_path / 'replay')
+    write_klines(path)
+    return path
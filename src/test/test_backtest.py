@@ -0,0 +1,89 @@
+#!/usr/bin/env python
+#-*- coding: utf-8 -*-
+#FILE: test_backtest.py
+#CREATE_TIME: 2026-10-18
+#AUTHOR: Sancho
+"""
+向量化回测测试
+"""
+
+import math
+import numpy as np
+import pytest
+from backtest import Backtest, annual_bars, shift
+from utils import NS, parse_datetime
+
+
+def times(days: list, bars: int) -> np.ndarray:
+    return np.array([
+        parse_datetime(f'{d} 09:00:00') + i * 60 * NS for d in days
+        for i in range(bars)
+    ])
+
+
+def test_annual_bars_counts_trading_days():
+    # 周五夜盘和下周一日盘属于同一交易日
+    t = np.concatenate([
+        times(['2022-09-22'], 10),
+        [parse_datetime('2022-09-23 21:00:00')],
+        times(['2022-09-26'], 9)
+    ])
+    assert annual_bars(t) == 10 * 252
+
+
+def test_sharpe_annualized():
+    close = np.array([1., 2., 4., 5., 7., 8.])
+    bt = Backtest({'close': close}, bars_per_year=100)
+    result = bt.simulate(np.ones(len(close)))
+    net = np.diff(close, prepend=close[0])
+    assert result['sharpe'] == pytest.approx(net.mean() / net.std() * 10)
+    # 默认按datetime估计，与K线数量无关
+    data = {'close': np.tile(close, 4), 'datetime': times(['2022-09-23'], 24)}
+    bt = Backtest(data)
+    assert bt.bars_per_year == 24 * 252
+    net = np.diff(data['close'], prepend=close[0])
+    assert bt.simulate(np.ones(24))['sharpe'] == pytest.approx(
+        net.mean() / net.std() * math.sqrt(24 * 252))
+
+
+def test_missing_datetime():
+    with pytest.raises(ValueError):
+        Backtest({'close': np.ones(3)})
+
+
+def test_signals_match_execution():
+    """向量化信号与逐根K线调用`execution`的目标持仓一致，`nan`位置也相同"""
+    from monitor import DualThrust
+    rng = np.random.default_rng(0)
+    close = 100 + np.cumsum(rng.normal(0, 1, 400))
+    spread = rng.uniform(0, 2, (2, 400))
+    data = {
+        'open': close + rng.normal(0, 0.5, 400),
+        'high': close + spread[0],
+        'low': close - spread[1],
+        'close': close,
+        'volume': np.ones(400),
+        'id': np.arange(400.),
+        'datetime': times(['2022-09-23'], 400),
+    }
+    bt = Backtest(data)
+    for params in ({}, {'NDAY': 3, 'K1': 0.1, 'K2': 0.3}):
+        np.testing.assert_array_equal(DualThrust.signals(data, **params),
+                                      bt.event_targets(DualThrust, **params))
+
+
+def test_shift_zero():
+    x = np.arange(3.)
+    np.testing.assert_array_equal(shift(x, 0), x)
+
+
+def test_run_requires_signals():
+    from monitor import Monitor
+
+    class NoSignals(Monitor):
+        def execution(self):
+            pass
+
+    bt = Backtest({'close': np.ones(3)}, bars_per_year=1)
+    with pytest.raises(ValueError, match='NoSignals'):
+        bt.run(NoSignals)
@@ -0,0 +1,98 @@
+#!/usr/bin/env python
+#-*- coding: utf-8 -*-
+#FILE: test_cache.py
+#CREATE_TIME: 2026-10-18
+#AUTHOR: Sancho
+"""
+因子缓存测试
+"""
+
+import importlib
+import os
+import numpy as np
+from cache import Cache, fn_id
+
+HELPER = '''
+def scale(x):
+    return x * {factor}
+
+
+def fn(d, n=1):
+    return scale(d['close']) + n
+'''
+
+
+def data(n: int, close: np.ndarray = None) -> dict:
+    return {
+        'datetime': np.arange(n, dtype='i8') * 60,
+        'close': np.arange(n, dtype=float) if close is None else close
+    }
+
+
+def diff(d, n):
+    out = np.full(len(d['close']), np.nan)
+    out[n:] = d['close'][n:] - d['close'][:-n]
+    return out
+
+
+def helper(tmp_path, factor: int):
+    """写入并(重新)导入一个模块，`fn`的源码不变，只修改它调用的`scale`"""
+    path = tmp_path / 'cache_helper.py'
+    path.write_text(HELPER.format(factor=factor))
+    os.utime(path, (factor, factor))  # 确保源码缓存按修改时间刷新
+    import cache_helper
+    return importlib.reload(cache_helper)
+
+
+def test_hit_on_repeat(tmp_path):
+    cache = Cache(str(tmp_path / 'cache'))
+    first = np.array(cache.call(diff, data(10), 'A', 60, n=2))
+    second = cache.call(diff, data(10), 'A', 60, n=2)
+    np.testing.assert_array_equal(first, second)
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_called_function_change_invalidates(tmp_path, monkeypatch):
+    monkeypatch.syspath_prepend(str(tmp_path))
+    cache = Cache(str(tmp_path / 'cache'))
+    module = helper(tmp_path, 2)
+    key = fn_id(module.fn)
+    np.testing.assert_array_equal(cache.call(module.fn, data(3), 'A', 60),
+                                  [1., 3., 5.])
+    module = helper(tmp_path, 3)
+    assert fn_id(module.fn) != key
+    np.testing.assert_array_equal(cache.call(module.fn, data(3), 'A', 60),
+                                  [1., 4., 7.])
+    assert cache.misses == 2
+
+
+def test_data_correction_invalidates(tmp_path):
+    """数据长度和最后时间不变，中间被修正"""
+    cache = Cache(str(tmp_path / 'cache'))
+    cache.call(diff, data(10), 'A', 60, lookback=2, n=2)
+    close = np.arange(10, dtype=float)
+    close[4] = 100.
+    result = cache.call(diff, data(10, close), 'A', 60, lookback=2, n=2)
+    np.testing.assert_array_equal(result, diff(data(10, close), 2))
+    assert (cache.misses, cache.appends) == (2, 0)
+
+
+def test_append_computes_new_rows(tmp_path):
+    cache = Cache(str(tmp_path / 'cache'))
+    close = np.random.default_rng(0).normal(size=20)
+    cache.call(diff, data(15, close[:15]), 'A', 60, lookback=2, n=2)
+    result = cache.call(diff, data(20, close), 'A', 60, lookback=2, n=2)
+    np.testing.assert_array_equal(result, diff(data(20, close), 2))
+    assert cache.appends == 1
+    # 追加后的摘要覆盖全部数据
+    cache.call(diff, data(20, close), 'A', 60, lookback=2, n=2)
+    assert cache.hits == 1
+
+
+def test_evicts_least_recently_used(tmp_path):
+    cache = Cache(str(tmp_path / 'cache'), max_size=1000 * 8 * 1.5 / 2**20)
+    cache.call(diff, data(1000), 'A', 60, n=1)
+    cache.call(diff, data(1000), 'B', 60, n=1)
+    assert len([f for f in os.listdir(cache.root) if f.endswith('.json')]) == 1
+    cache.call(diff, data(1000), 'B', 60, n=1)
+    assert cache.hits == 1
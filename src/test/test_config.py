@@ -0,0 +1,49 @@
+#!/usr/bin/env python
+#-*- coding: utf-8 -*-
+#FILE: test_config.py
+#CREATE_TIME: 2026-10-18
+#AUTHOR: Sancho
+"""
+配置加载测试
+"""
+
+import os
+import pytest
+from config import load_config, validate
+
+ROOT = os.path.dirname(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def test_shipped_config_valid(tmp_path):
+    with open(os.path.join(ROOT, 'config.yml'), encoding='utf-8') as f:
+        text = f.read()
+    path = tmp_path / 'config.yml'
+    path.write_text(text, encoding='utf-8')
+    config = load_config(str(path))
+    assert config['subscribe']['batch'] is False
+    assert not any(config['risk'][k]
+                   for k in ('max_position', 'max_exposure',
+                             'max_margin_ratio', 'max_orders'))
+
+
+def test_cache_returns_copies(tmp_path):
+    path = tmp_path / 'config.yml'
+    path.write_text('type: replay\nreplay: {path: ./data}\nstrategies: Demo\n')
+    config = load_config(str(path))
+    config['strategies'] = 'DualThrust'
+    assert load_config(str(path))['strategies'] == 'Demo'
+    assert (tmp_path / '.config.cache').exists()
+    # 文件修改后重新解析
+    path.write_text('type: replay\nreplay: {path: ./data}\n'
+                    'strategies: [Demo, DualThrust]\n')
+    os.utime(path, ns=(1, 1))
+    assert load_config(str(path))['strategies'] == ['Demo', 'DualThrust']
+
+
+def test_validate_reports_all_errors():
+    with pytest.raises(ValueError) as e:
+        validate({'type': 'live', 'klines': {'A': [20]}, 'strategies': None})
+    message = str(e.value)
+    assert 'type' in message and 'klines.A' in message
+    assert 'strategies' in message
@@ -0,0 +1,94 @@
+#!/usr/bin/env python
+#-*- coding: utf-8 -*-
+#FILE: test_dispatch.py
+#CREATE_TIME: 2026-10-18
+#AUTHOR: Sancho
+"""
+策略调度和合并更新测试
+"""
+
+import pandas
+import pytest
+import dispatch
+from dispatch import Dispatcher
+
+
+class FakeApi:
+    """`changes`中的(对象, 键)视为本次更新发生变化"""
+    def __init__(self) -> None:
+        self.changes = set()
+
+    def is_changing(self, obj, key=None):
+        return (id(obj), key) in self.changes
+
+
+class Strategy:
+    def __init__(self, symbol: str, **inputs) -> None:
+        self.symbol = symbol
+        self._inputs = inputs
+
+    def inputs(self):
+        return [(obj, key) for obj, key in self._inputs.values()]
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(dispatch.time, 'monotonic', lambda: now[0])
+    return now
+
+
+def kline(last_id: int) -> pandas.DataFrame:
+    return pandas.DataFrame({'id': [last_id - 1, last_id], 'duration': 60})
+
+
+def test_wakes_only_changed():
+    api = FakeApi()
+    a, b = {}, {}
+    d = Dispatcher(api)
+    sa = Strategy('A', quote=(a, 'last_price'))
+    sb = Strategy('B', quote=(b, None))
+    d.register(sa)
+    d.register(sb)
+    assert [s for s, _ in d.dispatch()] == [sa, sb]  # 首次更新唤醒全部
+    api.changes = {(id(b), None)}
+    assert [s for s, _ in d.dispatch()] == [sb]
+    assert d.cached(b) is True and d.cached(a, 'last_price') is False
+    api.changes = {(id(a), 'bid_price1')}  # 未声明的字段
+    assert d.dispatch() == []
+
+
+def test_conflate_carries_changes(clock):
+    api = FakeApi()
+    quote = {}
+    d = Dispatcher(api, conflate={'interval': 1, 'symbols': {'A': 2}})
+    s = Strategy('A', quote=(quote, 'last_price'))
+    d.register(s)
+    d.dispatch()
+    api.changes = {(id(quote), 'last_price')}
+    clock[0] += 0.5
+    assert d.dispatch() == []
+    api.changes = set()
+    clock[0] += 1.0
+    assert d.dispatch() == []  # 合约的间隔2秒大于默认值
+    clock[0] += 0.6
+    assert [x for x, _ in d.dispatch()] == [s]
+    # 被合并的变化在执行时仍然可见
+    assert d.cached(quote, 'last_price', s) is True
+    assert d.status() == {'conflated': 1, 'pending': 0, 'bar_closes': 0}
+
+
+def test_bar_close_runs_immediately(clock):
+    api = FakeApi()
+    serial = kline(5)
+    d = Dispatcher(api, conflate={'interval': 10})
+    s = Strategy('A', kline=(serial, None))
+    d.register(s)
+    d.dispatch()
+    api.changes = {(id(serial), None)}
+    clock[0] += 1
+    assert d.dispatch() == []  # 最后一根K线更新，未收盘
+    serial.loc[:, 'id'] = [5, 6]
+    clock[0] += 1
+    assert [x for x, _ in d.dispatch()] == [s]
+    assert d.bar_closes == 1
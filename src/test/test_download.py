@@ -0,0 +1,60 @@
+#!/usr/bin/env python
+#-*- coding: utf-8 -*-
+#FILE: test_download.py
+#CREATE_TIME: 2026-10-18
+#AUTHOR: Sancho
+"""
+历史数据下载测试
+"""
+
+import numpy as np
+import pytest
+import download
+from download import Downloader, Source, StoreSource
+from recorder import Store
+
+KINDS = [('kline_20', 'A'), ('kline_20', 'B')]
+
+
+class FlakySource(StoreSource):
+    """每块第一次下载失败"""
+    def __init__(self, root: str) -> None:
+        super().__init__(root)
+        self.calls = 0
+
+    def fetch(self, kind, symbol, start, end):
+        self.calls += 1
+        if self.calls % 2:
+            raise ConnectionError('断开')
+        return super().fetch(kind, symbol, start, end)
+
+
+def test_download_and_resume(replay_path, tmp_path, monkeypatch):
+    monkeypatch.setattr(download.time, 'sleep', lambda s: None)
+    root = str(tmp_path / 'cache')
+    downloader = Downloader(root,
+                            FlakySource(replay_path),
+                            chunk_days=2,
+                            workers=1,
+                            retries=1)
+    # 2022-09-22至2022-09-26共3个交易日，分为2块
+    result = downloader.run(KINDS, 20220922, 20220927)
+    assert result == {'jobs': 4, 'rows': 600, 'failed': 0}
+    assert downloader.covered('kline_20', 'A', 20220922, 20220927)
+    for kind, symbol in KINDS:
+        np.testing.assert_array_equal(
+            Store(root).read(kind, symbol)['close'],
+            Store(replay_path).read(kind, symbol)['close'])
+    # 重新运行只下载未完成的块
+    assert downloader.jobs(KINDS, 20220922, 20220927) == []
+    # 延长到2022-09-28: 每个合约3块，第一块已完成
+    assert [j[2:] for j in downloader.jobs(KINDS, 20220922, 20220929)
+            ] == [(20220926, 20220927), (20220928, 20220928)] * 2
+
+
+def test_source_requires_fetch():
+    class NoFetch(Source):
+        pass
+
+    with pytest.raises(TypeError):
+        NoFetch()
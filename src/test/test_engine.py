@@ -0,0 +1,99 @@
+#!/usr/bin/env python
+#-*- coding: utf-8 -*-
+#FILE: test_engine.py
+#CREATE_TIME: 2026-10-18
+#AUTHOR: Sancho
+"""
+引擎离线回放测试
+"""
+
+import time
+import pytest
+from conftest import replay_config
+from main import Engine
+from monitor import DualThrust
+
+
+class ThreadedDualThrust(DualThrust):
+    EXECUTOR = True
+    reads = []  # 执行开始和结束时读取的行情
+
+    def execution(self):
+        before = (self.kline.last('id'), self.quote.last_price)
+        time.sleep(0.001)  # 期间主线程继续回放
+        ThreadedDualThrust.reads.append(
+            (before, (self.kline.last('id'), self.quote.last_price)))
+        return super().execution()
+
+
+def result(engine: Engine) -> tuple:
+    """持仓和平仓盈亏"""
+    api = engine.tq.api
+    return ({name: api.get_position(name).pos
+             for name in engine.quotes_dict}, api._close_profit)
+
+
+def test_sync_and_async_agree(replay_path):
+    """同步和异步模式下策略的成交结果相同"""
+    results = []
+    for mode in ('sync', 'async'):
+        engine = Engine(replay_config(replay_path, mode=mode))
+        engine.run()
+        assert len(engine.strategies) == 2
+        results.append(result(engine))
+    assert results[0] == results[1]
+    assert any(results[0][0].values())  # 策略发生了交易
+
+
+def test_executor_reads_snapshot(replay_path):
+    """线程池中执行的策略读取交出前的快照，执行期间不被`wait_update()`修改"""
+    ThreadedDualThrust.reads.clear()
+    engine = Engine(
+        replay_config(replay_path,
+                      mode='async',
+                      strategies=f'{__name__}:ThreadedDualThrust'))
+    engine.run()
+    reads = ThreadedDualThrust.reads
+    assert reads and all(before == after for before, after in reads)
+    assert any(result(engine)[0].values())
+    # 退出快照后恢复为引擎的原对象
+    s = engine.strategies[0]
+    assert s.kline.to_pandas() is engine.klines_dict['A']
+
+
+def test_frozen_inputs(replay_path):
+    engine = Engine(replay_config(replay_path))
+    engine.setup()
+    s = engine.strategies[0]
+    api = engine.tq.api
+    api.wait_update()
+    quote, kline = s.quote, s.kline
+    with s.frozen():
+        price = s.quote.last_price
+        assert s.changed(s.quote, 'last_price')
+        assert s.feed.kline is s.kline
+        with pytest.raises(RuntimeError, match='天勤API'):
+            s.api.get_quote('A')
+        with pytest.raises(RuntimeError, match='INPUTS'):
+            s.changed(quote)
+        api.wait_update()  # 快照不随行情更新
+        assert s.quote.last_price == price and quote.last_price != price
+    assert (s.quote, s.kline, s.api) == (quote, kline, api)
+    assert s.feed.kline is kline
+
+
+def test_optional_stages(replay_path, tmp_path):
+    """录制、合成K线、面板、合并更新和耗时统计同时开启"""
+    config = replay_config(replay_path,
+                           record=dict(path=str(tmp_path / 'record')),
+                           resample=dict(klines={'A': [60]}),
+                           panel=dict(enabled=True),
+                           conflate=dict(enabled=True, interval=0),
+                           metrics=dict(enabled=True,
+                                        path=str(tmp_path / 'metrics.prom')))
+    engine = Engine(config)
+    engine.run()
+    assert engine.strategies[0].bars[60] is not None
+    assert engine.panel is not None
+    assert (tmp_path / 'metrics.prom').exists()
+    assert (tmp_path / 'record' / 'kline_20' / 'A').is_dir()
@@ -0,0 +1,65 @@
+#!/usr/bin/env python
+#-*- coding: utf-8 -*-
+#FILE: test_factor.py
+#CREATE_TIME: 2026-10-18
+#AUTHOR: Sancho
+"""
+截面因子测试
+"""
+
+import numpy as np
+import pytest
+from factor import iter_chunks, rank
+from recorder import Store
+from utils import NS, parse_datetime
+
+DAYS = ['2022-09-19', '2022-09-20', '2022-09-21', '2022-09-22', '2022-09-23']
+
+
+def write(path: str, bars: int = 10) -> None:
+    """每个交易日日盘`bars`根1分钟K线"""
+    store = Store(path)
+    for symbol in ('A', 'B'):
+        rows, i = [], 0
+        for day in DAYS:
+            t0 = parse_datetime(f'{day} 09:00:00')
+            for j in range(bars):
+                rows.append((t0 + j * 60 * NS, i, 1., 1., 1., 1. + i, 1., 0.,
+                             0.))
+                i += 1
+        store.append('kline_60', symbol, rows)
+
+
+def test_rank_ties_average():
+    x = np.array([[1.], [2.], [2.], [np.nan], [3.]])
+    np.testing.assert_array_equal(rank(x)[:, 0], [0., 1.5, 1.5, np.nan, 3.])
+    x = np.array([[5., 1.], [5., 1.], [5., 2.]])
+    np.testing.assert_array_equal(rank(x), [[1., 0.5], [1., 0.5], [1., 2.]])
+
+
+def test_padding_covers_warmup_and_lookahead(tmp_path):
+    """回看25根需要向前读取3个交易日，未来15根需要向后读取2个交易日"""
+    write(str(tmp_path))
+    chunks = list(
+        iter_chunks(str(tmp_path), 'kline_60', ['A', 'B'], 1, 25, 15))
+    assert len(chunks) == 5
+    for k, (times, data, core) in enumerate(chunks):
+        assert core.stop - core.start == 10
+        assert core.start == min(25, 10 * k)
+        assert len(times) - core.stop == min(15, 10 * (4 - k))
+        assert data['close'].shape == (2, len(times))
+
+
+def test_explicit_padding_too_short(tmp_path):
+    write(str(tmp_path))
+    with pytest.raises(ValueError):
+        list(
+            iter_chunks(str(tmp_path),
+                        'kline_60', ['A', 'B'],
+                        1,
+                        25,
+                        0,
+                        pad_days=1))
+    chunks = iter_chunks(str(tmp_path), 'kline_60', ['A', 'B'], 1, 5, 5,
+                         pad_days=1)
+    assert [core.start for _, _, core in chunks] == [0, 5, 5, 5, 5]
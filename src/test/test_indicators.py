@@ -0,0 +1,76 @@
+#!/usr/bin/env python
+#-*- coding: utf-8 -*-
+#FILE: test_indicators.py
+#CREATE_TIME: 2026-10-18
+#AUTHOR: Sancho
+"""
+增量指标测试
+"""
+
+import numpy as np
+import pandas
+import pytest
+from indicators import (ATR, EMA, SMA, BarFeed, DualThrustRange, Indicator,
+                        RollingMax, RollingStd)
+
+
+def kline(n: int, seed: int = 0) -> pandas.DataFrame:
+    close = np.cumsum(np.random.default_rng(seed).normal(size=n)) + 100
+    return pandas.DataFrame({
+        'datetime': np.arange(n) * 60.,
+        'id': np.arange(n, dtype=float),
+        'open': close,
+        'high': close + 1,
+        'low': close - 1,
+        'close': close,
+        'volume': 1.0,
+        'open_oi': 0.0,
+        'close_oi': 0.0
+    })
+
+
+def test_matches_pandas_rolling():
+    df = kline(50)
+    feed = BarFeed(df)
+    sma = feed.add('sma', SMA(5))
+    ema = feed.add('ema', EMA(5))
+    high = feed.add('high', RollingMax(5))
+    std = feed.add('std', RollingStd(5))
+    assert feed.update() == 49  # 最后一根未收盘
+    closed = df.iloc[:-1]
+    assert sma.value == pytest.approx(
+        closed['close'].rolling(5).mean().iat[-1])
+    assert ema.value == pytest.approx(closed['close'].ewm(
+        span=5, adjust=False).mean().iat[-1])
+    assert high.value == closed['high'].rolling(5).max().iat[-1]
+    assert std.value == pytest.approx(
+        closed['close'].rolling(5).std(ddof=0).iat[-1])  # 总体标准差
+    assert feed.update() == 0
+
+
+def test_restore_pushes_only_new_bars():
+    df = kline(30)
+    feed = BarFeed(df.iloc[:20])
+    feed.add('range', DualThrustRange(3))
+    feed.add('atr', ATR(3))
+    feed.update()
+    last_id, indicators = feed.state()
+    restored = BarFeed(df)
+    assert restored.restore(last_id, indicators)
+    rng = restored.add('range', DualThrustRange(3))
+    assert rng is indicators['range']
+    assert restored.update() == 29 - 19
+    fresh = BarFeed(df)
+    fresh.add('range', DualThrustRange(3))
+    fresh.update()
+    assert rng.value == fresh['range'].value
+    # 序列早于快照时不恢复
+    assert not BarFeed(df.iloc[:10]).restore(last_id, indicators)
+
+
+def test_indicator_requires_push():
+    class NoPush(Indicator):
+        pass
+
+    with pytest.raises(TypeError):
+        NoPush()
@@ -0,0 +1,33 @@
+#!/usr/bin/env python
+#-*- coding: utf-8 -*-
+#FILE: test_metrics.py
+#CREATE_TIME: 2026-10-18
+#AUTHOR: Sancho
+"""
+耗时统计测试
+"""
+
+from metrics import Metrics
+
+
+def test_render_prometheus(tmp_path):
+    metrics = Metrics('t')
+    metrics.observe('execution', 3, 'Demo', 'A')
+    metrics.observe('execution', 1000, 'Demo', 'A')
+    metrics.count('conflated', 2, 'Demo', 'A')
+    wrapped = metrics.timed('wait', lambda x: x + 1)
+    assert wrapped(1) == 2
+    text = metrics.render()
+    labels = 'stage="execution",strategy="Demo",symbol="A"'
+    assert f't_stage_seconds_count{{{labels}}} 2' in text
+    assert f't_stage_seconds_bucket{{{labels},le="+Inf"}} 2' in text
+    # 3ns落在le=4ns的桶中
+    assert f't_stage_seconds_bucket{{{labels},le="4e-09"}} 1' in text
+    assert ('t_events_total{event="conflated",strategy="Demo",symbol="A"} 2'
+            in text)
+    # 等待行情的空闲时间不计入各阶段耗时
+    assert 't_idle_seconds_count{stage="wait",strategy="",symbol=""} 1' in text
+    assert 't_stage_seconds_count{stage="wait"' not in text
+    path = tmp_path / 'metrics.prom'
+    metrics.write(str(path))
+    assert path.read_text(encoding='utf-8') == metrics.render()
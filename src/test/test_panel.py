@@ -0,0 +1,75 @@
+#!/usr/bin/env python
+#-*- coding: utf-8 -*-
+#FILE: test_panel.py
+#CREATE_TIME: 2026-10-18
+#AUTHOR: Sancho
+"""
+多合约对齐面板测试
+"""
+
+import numpy as np
+import pandas
+from panel import KlinePanel
+from utils import NS
+
+
+class FakeApi:
+    def is_changing(self, obj, key=None):
+        return True
+
+
+def kline(period: int, closes: list, start: int = 0) -> pandas.DataFrame:
+    n = len(closes)
+    return pandas.DataFrame({
+        'id': np.arange(n, dtype=float),
+        'datetime': [(start + i * period) * NS for i in range(n)],
+        'open': closes,
+        'high': closes,
+        'low': closes,
+        'close': closes,
+        'volume': 1.0,
+        'open_oi': 0.0,
+        'close_oi': 0.0,
+    })
+
+
+def append(df: pandas.DataFrame, period: int,
+           close: float) -> pandas.DataFrame:
+    """模拟天勤序列：新K线追加在最后，长度不变"""
+    row = df.iloc[[-1]].copy()
+    row[['open', 'high', 'low', 'close']] = close
+    row['id'] += 1
+    row['datetime'] += period * NS
+    return pandas.concat([df.iloc[1:], row], ignore_index=True)
+
+
+def test_same_period_alignment():
+    a = kline(60, [1., 2., 3.])
+    b = kline(60, [10., 20.], start=60)
+    panel = KlinePanel(FakeApi(), {'a': a, 'b': b}, {'a': 60, 'b': 60}, 5)
+    assert np.array_equal(panel.datetime[-3:], np.array([0, 60, 120]) * NS)
+    np.testing.assert_array_equal(panel['a', 'close'][-3:], [1, 2, 3])
+    np.testing.assert_array_equal(panel['b', 'close'][-3:], [np.nan, 10, 20])
+
+
+def test_coarser_bars_placed_at_close():
+    """5分钟K线在收盘(起点+5分钟)后才出现在1分钟时间轴上"""
+    a = kline(60, [float(i) for i in range(10)])  # 0..540秒
+    b = kline(300, [100., 200.])  # 0秒的K线已收盘，300秒的K线未收盘
+    panel = KlinePanel(FakeApi(), {'a': a, 'b': b}, {'a': 60, 'b': 300}, 10)
+    close = panel['b', 'close']
+    assert np.isnan(close[:5]).all()  # 0..240秒看不到0秒K线的收盘价
+    np.testing.assert_array_equal(close[5:], [100.] * 5)  # 未收盘的200不写入
+
+
+def test_coarser_bar_written_when_closed():
+    a = kline(60, [float(i) for i in range(10)])
+    b = kline(300, [100., 200.])
+    panel = KlinePanel(FakeApi(), {'a': a, 'b': b}, {'a': 60, 'b': 300}, 10)
+    # 600秒: 1分钟和5分钟都出现新K线，300秒的5分钟K线收盘
+    panel._serials = [append(a, 60, 10.), append(b, 300, 300.)]
+    panel.update()
+    assert panel.appended == 1
+    assert panel.datetime[-1] == 600 * NS
+    np.testing.assert_array_equal(panel['b', 'close'][-2:], [100., 200.])
+    np.testing.assert_array_equal(panel.last('close'), [10., 200.])
@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+#-*- coding: utf-8 -*-
+#FILE: test_recorder.py
+#CREATE_TIME: 2026-10-18
+#AUTHOR: Sancho
+"""
+行情录制测试
+"""
+
+import os
+import numpy as np
+import pandas
+from recorder import KLINE, Recorder, Store
+from utils import NS, parse_datetime
+
+T0 = parse_datetime('2022-09-23 09:00:00')
+
+
+def rows(start: int, n: int) -> list:
+    return [(T0 + i * 60 * NS, i, 1., 2., 0., float(i), 1., 0., 0.)
+            for i in range(start, start + n)]
+
+
+class FakeApi:
+    def is_changing(self, obj, key=None):
+        return True
+
+
+def kline(start: int, n: int) -> pandas.DataFrame:
+    df = pandas.DataFrame(rows(start, n), columns=list(KLINE))
+    df['duration'] = 60
+    return df
+
+
+def test_append_and_read(tmp_path):
+    store = Store(str(tmp_path))
+    store.append('kline_60', 'A', rows(0, 3))
+    store.append('kline_60', 'A', rows(3, 2))
+    cols = store.read('kline_60', 'A')
+    np.testing.assert_array_equal(cols['id'], np.arange(5))
+    assert store.days('kline_60', 'A') == [20220923]
+    assert store.last_id('kline_60', 'A') == 4
+    assert store.last_id('kline_60', 'B') == -1
+
+
+def test_interrupted_append_is_discarded(tmp_path):
+    """中断时只写入了部分字段：读取时忽略，下次追加前截断，各字段保持对齐"""
+    store = Store(str(tmp_path))
+    store.append('kline_60', 'A', rows(0, 3))
+    day = store.path('kline_60', 'A', 20220923)
+    for name in ('datetime', 'id'):  # 只有前两个字段写入了新行
+        with open(os.path.join(day, f'{name}.bin'), 'ab') as f:
+            f.write(np.array([99, 99], dtype='i8').tobytes())
+    assert len(store.read('kline_60', 'A')['id']) == 3
+    store.append('kline_60', 'A', rows(3, 1))
+    cols = store.read('kline_60', 'A')
+    np.testing.assert_array_equal(cols['id'], np.arange(4))
+    np.testing.assert_array_equal(cols['close'], np.arange(4.))
+
+
+def test_write_day_replaces(tmp_path):
+    store = Store(str(tmp_path))
+    store.append('kline_60', 'A', rows(0, 5))
+    cols = {k: np.asarray(v) for k, v in zip(KLINE, zip(*rows(0, 2)))}
+    store.write_day('kline_60', 'A', 20220923, cols)
+    np.testing.assert_array_equal(store.read('kline_60', 'A')['id'], [0, 1])
+
+
+def test_restart_does_not_duplicate_bars(tmp_path):
+    """重启后序列中已录制的K线不再录制"""
+    recorder = Recorder(FakeApi(), str(tmp_path))
+    recorder.watch(klines={'A': kline(0, 10)})
+    recorder.record()
+    recorder.close()
+    recorder = Recorder(FakeApi(), str(tmp_path))
+    recorder.watch(klines={'A': kline(5, 10)})  # 重启后的窗口与已录制的部分重叠
+    recorder.record()
+    recorder.close()
+    ids = Store(str(tmp_path)).read('kline_60', 'A')['id']
+    # 最后一根未收盘，不录制
+    np.testing.assert_array_equal(ids, np.arange(14))
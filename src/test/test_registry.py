@@ -0,0 +1,51 @@
+#!/usr/bin/env python
+#-*- coding: utf-8 -*-
+#FILE: test_registry.py
+#CREATE_TIME: 2026-10-18
+#AUTHOR: Sancho
+"""
+策略注册表测试
+"""
+
+import os
+import subprocess
+import sys
+import pytest
+from registry import StrategyRegistry
+
+
+def test_entries():
+    spec = {'A': ['DualThrust', {'Demo': {'X': 1}}], 'default': 'Demo'}
+    registry = StrategyRegistry(spec)
+    assert registry.entries('A') == [('DualThrust', {}), ('Demo', {'X': 1})]
+    assert registry.entries('B') == [('Demo', {})]
+    assert StrategyRegistry({'A': 'Demo'}).entries('B') == []
+
+
+def test_create_once_per_params():
+    registry = StrategyRegistry(
+        ['DualThrust', {
+            'DualThrust': {
+                'NDAY': 10
+            }
+        }, 'monitor:DualThrust'])
+    strategies = registry.create('A')
+    assert [s.NDAY for s in strategies] == [5, 10, 5]
+    assert registry.create('A') == []
+    assert len(registry.create('B')) == 3
+
+
+def test_unknown_strategy():
+    with pytest.raises(ValueError):
+        StrategyRegistry('Missing').create('A')
+    with pytest.raises(AttributeError):  # 策略没有的参数
+        StrategyRegistry([{'DualThrust': {'N': 1}}]).create('A')
+
+
+def test_main_imports_without_tqsdk():
+    """导入引擎和读取配置不导入天勤，天勤在登录时才导入"""
+    code = ('import sys, main, dispatch, trade; '
+            'assert "tqsdk" not in sys.modules')
+    cwd = os.path.join(os.path.dirname(os.path.dirname(__file__)),
+                       'quantitative_trading')
+    subprocess.run([sys.executable, '-c', code], cwd=cwd, check=True)
@@ -0,0 +1,47 @@
+#!/usr/bin/env python
+#-*- coding: utf-8 -*-
+#FILE: test_replay.py
+#CREATE_TIME: 2026-10-18
+#AUTHOR: Sancho
+"""
+离线回放测试
+"""
+
+import math
+import numpy as np
+import pytest
+from conftest import replay_config
+from main import Engine
+from recorder import QUOTE, Store
+from replay import ReplayApi
+from tq import Tq
+
+
+def test_quote_has_all_fields(replay_path):
+    api = ReplayApi(replay_path)
+    quote = api.get_quote('A')
+    assert set(QUOTE) <= set(quote)
+    api.wait_update()
+    assert not math.isnan(quote.last_price)
+    assert math.isnan(quote.ask_volume1)  # 由K线推算，没有盘口
+
+
+def test_replay_error_propagates():
+    """回放设置错误直接抛出，不被当作认证失败吞掉"""
+    with pytest.raises(KeyError):
+        Tq('', '', 'replay', replay={})
+
+
+def test_record_replay(replay_path, tmp_path):
+    """回放时录制，已收盘的K线与原始数据相同"""
+    path = str(tmp_path / 'record')
+    engine = Engine(replay_config(replay_path, record=dict(path=path)))
+    engine.run()
+    source, recorded = Store(replay_path), Store(path)
+    for symbol in ('A', 'B'):
+        closes = recorded.read('kline_20', symbol)['close']
+        assert len(closes) == 299  # 最后一根未收盘
+        np.testing.assert_array_equal(
+            closes,
+            source.read('kline_20', symbol)['close'][:299])
+        assert len(recorded.read('quote', symbol)['last_price']) > 0
@@ -0,0 +1,65 @@
+#!/usr/bin/env python
+#-*- coding: utf-8 -*-
+#FILE: test_resample.py
+#CREATE_TIME: 2026-10-18
+#AUTHOR: Sancho
+"""
+本地多周期K线合成测试
+"""
+
+import numpy as np
+import pandas
+import pytest
+from resample import Resampler
+from utils import NS, parse_datetime
+
+T0 = parse_datetime('2022-09-23 09:00:00')
+
+
+class FakeApi:
+    def is_changing(self, obj, key=None):
+        return True
+
+
+def kline(n: int) -> pandas.DataFrame:
+    """`n`根1分钟K线，最后一根未收盘"""
+    i = np.arange(n, dtype=float)
+    return pandas.DataFrame({
+        'datetime': T0 + np.arange(n) * 60 * NS,
+        'id': i,
+        'open': i + 1,
+        'high': i + 2,
+        'low': i,
+        'close': i + 1.5,
+        'volume': 1.0,
+        'open_oi': 0.0,
+        'close_oi': i,
+        'symbol': 'A',
+        'duration': 60
+    })
+
+
+def test_resample_five_minutes():
+    source = kline(12)
+    resampler = Resampler(FakeApi())
+    bars = resampler.add(source, [300], 60, data_length=5)[300]
+    resampler.update()
+    last = bars.iloc[-3:]
+    np.testing.assert_array_equal(last['datetime'],
+                                  T0 + np.array([0, 300, 600]) * NS)
+    np.testing.assert_array_equal(last['open'], [1., 6., 11.])
+    np.testing.assert_array_equal(last['high'], [6., 11., 13.])
+    np.testing.assert_array_equal(last['low'], [0., 5., 10.])
+    np.testing.assert_array_equal(last['close'], [5.5, 10.5, 12.5])
+    # 未收盘的09:10K线包括最后一根1分钟K线
+    np.testing.assert_array_equal(last['volume'], [5., 5., 2.])
+    assert resampler.is_changing(bars) is True
+    assert np.isnan(bars['close'].iloc[0])
+
+
+def test_invalid_durations():
+    resampler = Resampler(FakeApi())
+    with pytest.raises(ValueError):
+        resampler.add(kline(3), [7 * 60], 60)  # 不整除一天
+    with pytest.raises(ValueError):
+        resampler.add(kline(3), [90], 60)  # 不是基础周期的整数倍
@@ -0,0 +1,122 @@
+#!/usr/bin/env python
+#-*- coding: utf-8 -*-
+#FILE: test_risk.py
+#CREATE_TIME: 2026-10-18
+#AUTHOR: Sancho
+"""
+交易前风控测试
+"""
+
+import pytest
+from risk import RiskEngine
+
+
+class Obj(dict):
+    __getattr__ = dict.__getitem__
+
+    def __setattr__(self, name, value):
+        self[name] = value
+
+
+class FakeApi:
+    """持仓、委托可直接修改，每次`update`视为全部变化"""
+    def __init__(self) -> None:
+        self.positions = {}
+        self.orders = Obj()
+
+    def get_position(self, symbol, account=None):
+        return self.positions.setdefault((symbol, account), Obj(pos=0))
+
+    def get_order(self, account=None):
+        return self.orders
+
+    def is_changing(self, obj, key=None):
+        return True
+
+
+def engine(**kwargs):
+    api = FakeApi()
+    quotes = {
+        name: Obj(last_price=100.0, volume_multiple=10, margin=500.0)
+        for name in ('A', 'B')
+    }
+    return api, RiskEngine(api, quotes, [None], [Obj(balance=10000.0)],
+                           **kwargs)
+
+
+def test_no_limits_passes_through():
+    _, risk = engine()
+    assert risk.check('A', 7) == 7
+    assert risk.check('B', -3) == -3
+    assert not risk.breaches
+
+
+def test_limited():
+    assert not RiskEngine.limited(
+        dict(action='clip', max_position=0, max_exposure=0, window=60))
+    assert not RiskEngine.limited(dict(max_position={'A': 0}))
+    assert RiskEngine.limited(dict(max_position={'A': 0, 'B': 2}))
+    assert RiskEngine.limited(dict(max_orders=60))
+
+
+def test_position_clip_and_reject():
+    _, risk = engine(max_position=2)
+    assert risk.check('A', 5) == 2
+    assert risk.check('B', -5) == -2
+    _, risk = engine(max_position={'A': 1}, action='reject')
+    assert risk.check('A', 3) is None
+    assert risk.check('B', 3) == 3  # 未配置的合约不限制
+    assert risk.breaches == {('position', 'A'): 1}
+
+
+def test_reduction_always_allowed():
+    api, risk = engine(max_position=1)
+    api.get_position('A').pos = 5  # 超限的存量持仓
+    risk.update()
+    assert risk.check('A', 3) == 3
+    assert risk.check('A', 0) == 0
+    # 同方向截断不强制减仓
+    assert risk.check('A', 8) == 5
+
+
+def test_pending_targets_count_towards_exposure():
+    """同一次更新中下达、尚未成交的目标也计入合计"""
+    _, risk = engine(max_exposure=3000)  # 每手1000
+    assert risk.check('A', 2) == 2
+    assert risk.check('B', 3) == 1
+    assert risk.total_exposure == 3000
+    assert risk.check('B', -5) == -1
+
+
+def test_pending_targets_count_towards_margin():
+    _, risk = engine(max_margin_ratio=0.5)  # 5000 / 每手500
+    assert risk.check('A', 6) == 6
+    assert risk.check('B', 6) == 4
+
+
+def test_filled_target_released():
+    api, risk = engine(max_exposure=3000)
+    assert risk.check('A', 3) == 3
+    api.get_position('A').pos = 3
+    risk.update()
+    assert risk.targets == {}
+    assert risk.total_exposure == 3000
+    # 减仓成交后释放额度
+    assert risk.check('A', 1) == 1
+    api.get_position('A').pos = 1
+    risk.update()
+    assert risk.check('B', 5) == 2
+
+
+def test_order_rate_rejects():
+    api, risk = engine(max_orders=2, action='clip')
+    api.orders.update(o1=Obj(), o2=Obj())
+    risk.update()
+    assert risk.orders_in_window == 2
+    assert risk.check('A', 1) is None
+    assert risk.check('A', 0) == 0  # 平仓不受限制
+
+
+def test_invalid_action():
+    with pytest.raises(ValueError):
+        engine(action='ignore')
@@ -0,0 +1,62 @@
+#!/usr/bin/env python
+#-*- coding: utf-8 -*-
+#FILE: test_shard.py
+#CREATE_TIME: 2026-10-18
+#AUTHOR: Sancho
+"""
+多进程分片测试
+"""
+
+import multiprocessing
+import threading
+import time
+import pytest
+from conftest import replay_config
+from shard import PACK, Coordinator, ShardEngine, split, symbols_of
+
+
+def test_split_keeps_symbol_together():
+    config = replay_config('', quotes=['A', 'B', 'C'], ticks={'C': 10})
+    parts = split(config, 2)
+    assert [p['quotes'] for p in parts] == [['A', 'C'], ['B']]
+    assert parts[0]['ticks'] == {'C': 10} and parts[1]['ticks'] == {}
+    assert all(p['mode'] == 'sync' for p in parts)
+    assert symbols_of(config) == ['A', 'B', 'C']
+
+
+def test_shard_engine_starts_with_risk(replay_path):
+    """风控在协调进程检查，工作进程的引擎不应依赖`Trade.risk`"""
+    config = replay_config(replay_path, risk=dict(max_position=2))
+    part = split(config, 1)[0]
+    recv, send = multiprocessing.Pipe(duplex=False)
+    engine = ShardEngine(part, send, {'A': 0, 'B': 1})
+    assert engine.trade.risk is None
+    engine.run()
+    data = b''
+    while recv.poll():
+        data += recv.recv_bytes()
+    targets = list(PACK.iter_unpack(data))
+    assert targets and {i for i, _ in targets} <= {0, 1}
+
+
+def test_split_rejects_huice():
+    config = replay_config('', type='huice')
+    with pytest.raises(ValueError, match='huice'):
+        split(config, 2)
+
+
+def test_coordinator_runs_replay(replay_path):
+    """工作进程结束后协调进程退出，收到的目标持仓已成交"""
+    coordinator = Coordinator(replay_config(replay_path), 2)
+    coordinator.run()
+    assert not coordinator.trade.pending()
+    assert coordinator.trade._sent
+
+
+def test_coordinator_stop(replay_path):
+    coordinator = Coordinator(
+        replay_config(replay_path, replay=dict(path=replay_path, speed=1)), 2)
+    threading.Timer(0.5, coordinator.stop).start()
+    start = time.time()
+    coordinator.run()
+    assert time.time() - start < 5
@@ -0,0 +1,75 @@
+#!/usr/bin/env python
+#-*- coding: utf-8 -*-
+#FILE: test_shm.py
+#CREATE_TIME: 2026-10-18
+#AUTHOR: Sancho
+"""
+共享内存行情测试
+"""
+
+import os
+import numpy as np
+import pandas
+import pytest
+from recorder import KLINE
+from shm import VERSION, Ring, ShmPublisher, ShmReader
+
+
+class FakeApi:
+    def is_changing(self, obj, key=None):
+        return True
+
+
+def test_ring_wraps_and_replaces_last():
+    name = f'rt_test_ring_{os.getpid()}'
+    ring = Ring(name, ['a', 'b'], 4)
+    try:
+        ring.write(np.array([[i, -i] for i in range(6)], dtype=float))
+        view, version = ring.view()
+        np.testing.assert_array_equal(view[:, 0], [2, 3, 4, 5])
+        ring.write(np.array([[50., -50.]]), replace_last=True)
+        assert not ring.valid(version)
+        reader = Ring(name)  # 其他进程挂载
+        np.testing.assert_array_equal(reader.snapshot(2)[:, 0], [4, 50])
+        assert not reader.data.flags.writeable
+        reader.close()
+    finally:
+        ring.close()
+
+
+def test_reader_times_out_on_dead_writer():
+    """写进程在写入中退出，版本号停在奇数，读取超时而不是一直等待"""
+    name = f'rt_test_dead_{os.getpid()}'
+    ring = Ring(name, ['a'], 4)
+    try:
+        ring.write(np.array([[1.]]))
+        ring.header[VERSION] += 1
+        reader = Ring(name)
+        with pytest.raises(TimeoutError):
+            reader.view(timeout=0.05)
+        with pytest.raises(TimeoutError):
+            reader.snapshot(timeout=0.05)
+        reader.close()
+    finally:
+        ring.close()
+
+
+def test_publisher_and_reader():
+    symbol = f'TEST.s{os.getpid()}'
+    df = pandas.DataFrame({f: np.arange(3, dtype=float) for f in KLINE})
+    df['duration'] = 20
+    publisher = ShmPublisher(FakeApi(), klines={symbol: df}, capacity=8)
+    try:
+        reader = ShmReader('kline_20', symbol)
+        close, _ = reader.column('close')
+        np.testing.assert_array_equal(close, [0, 1, 2])
+        # 最后一根K线更新，同时出现新K线
+        df.loc[2, 'close'] = 2.5
+        df.loc[3] = df.loc[2]
+        df.loc[3, ['id', 'close']] = 3, 3.5
+        publisher.publish()
+        np.testing.assert_array_equal(reader.snapshot()['close'],
+                                      [0, 1, 2.5, 3.5])
+        reader.close()
+    finally:
+        publisher.close()
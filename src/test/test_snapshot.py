@@ -0,0 +1,65 @@
+#!/usr/bin/env python
+#-*- coding: utf-8 -*-
+#FILE: test_snapshot.py
+#CREATE_TIME: 2026-10-18
+#AUTHOR: Sancho
+"""
+热重启快照测试
+"""
+
+import importlib
+import os
+from snapshot import Snapshot, identity, key
+
+HELPER = '''
+class Base:
+    def on_bar(self):
+        return {value}
+
+
+class Strategy(Base):
+    symbol = 'A'
+    params = {{'N': 3}}
+
+    def __init__(self, state=None):
+        self.state = state
+
+    def get_state(self):
+        return self.state
+'''
+
+
+class FakeTrade:
+    def state(self, key):
+        return {}
+
+
+def helper(tmp_path, value: int):
+    """只修改基类，策略类的源码不变"""
+    path = tmp_path / 'snapshot_helper.py'
+    path.write_text(HELPER.format(value=value))
+    os.utime(path, (value, value))
+    import snapshot_helper
+    return importlib.reload(snapshot_helper)
+
+
+def test_roundtrip(tmp_path, monkeypatch):
+    monkeypatch.syspath_prepend(str(tmp_path))
+    module = helper(tmp_path, 1)
+    path = str(tmp_path / 'snapshot.bin')
+    Snapshot(path).close(FakeTrade(), [module.Strategy({'count': 5})])
+    snapshot = Snapshot(path)
+    assert key(module.Strategy()) == "A:Strategy:[('N', 3)]"
+    assert snapshot.get(module.Strategy()) == {'count': 5}
+    assert snapshot.status()['restored'] == 1
+
+
+def test_base_class_change_invalidates(tmp_path, monkeypatch):
+    monkeypatch.syspath_prepend(str(tmp_path))
+    module = helper(tmp_path, 1)
+    path = str(tmp_path / 'snapshot.bin')
+    Snapshot(path).close(FakeTrade(), [module.Strategy({'count': 5})])
+    old = identity(module.Strategy)
+    module = helper(tmp_path, 2)
+    assert identity(module.Strategy) != old
+    assert Snapshot(path).get(module.Strategy()) is None
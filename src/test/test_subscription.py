@@ -0,0 +1,117 @@
+#!/usr/bin/env python
+#-*- coding: utf-8 -*-
+#FILE: test_subscription.py
+#CREATE_TIME: 2026-10-18
+#AUTHOR: Sancho
+"""
+延迟订阅测试
+"""
+
+import math
+from types import SimpleNamespace
+import numpy as np
+import pandas
+from conftest import replay_config, write_klines
+from main import Engine
+from monitor import DualThrust
+from subscription import LazySerial, SerialView
+
+
+class Counted(DualThrust):
+    """记录每次执行时的合约和最新K线id"""
+    calls = []
+
+    def execution(self):
+        Counted.calls.append((self.symbol, self.kline.last('id')))
+        return super().execution()
+
+
+class FakeApi:
+    def __init__(self) -> None:
+        self.subscribed, self.released = [], []
+
+    def get_kline_serial(self, symbol, duration, data_length=200):
+        serial = object()
+        self.subscribed.append((symbol, duration, data_length))
+        return serial
+
+    def release(self, serial):
+        self.released.append(serial)
+
+
+def test_serial_view():
+    """最新值、最近N行和整行读取，原地更新的数据立即可见"""
+    buf = np.array([[0., 1., 10.], [1., 2., 11.], [2., 3., 12.]])
+    frame = pandas.DataFrame(buf, columns=['id', 'open', 'close'], copy=False)
+    view = SerialView(frame)
+    assert view.to_pandas() is frame
+    assert view.last('close') == 12.
+    np.testing.assert_array_equal(view.last('close', 2), [11., 12.])
+    assert view['open'] is view.col('open')  # 列数组缓存
+    assert view.get('open', 0) == 1.
+    assert view.row() == {'id': 2., 'open': 3., 'close': 12.}
+    assert len(view) == 3
+    # 与天勤和离线回放一致，新数据原地写入序列底层的数组
+    buf += 1
+    assert view.last('close') == 13.
+    assert view.row(0) == {'id': 1., 'open': 2., 'close': 11.}
+
+
+def test_release_and_resubscribe():
+    api = FakeApi()
+    handle = LazySerial(api, 'kline', 'A', 60, 10)
+    assert not handle.subscribed and not api.subscribed
+    serial = handle.get()
+    handle.release()
+    assert api.released == [serial] and not handle.subscribed
+    handle.get()
+    assert len(api.subscribed) == 2
+
+
+def test_lazy_only_with_release():
+    """天勤没有取消订阅的接口，不开启延迟订阅"""
+    config = dict(lazy=dict(enabled=True), merge=False)
+    engine = SimpleNamespace(config=config, tq=SimpleNamespace(api=object()))
+    assert not Engine._lazy(engine)
+    engine.tq.api = FakeApi()
+    assert Engine._lazy(engine)
+
+
+def test_replay_engine_lazy(replay_path):
+    engine = Engine(replay_config(replay_path, lazy=dict(enabled=True)))
+    assert engine._lazy()
+    handles = engine.subscription.lazy
+    assert handles and all(isinstance(h, LazySerial) for h in handles)
+    engine.run()
+
+
+def test_batch_late_ready(tmp_path):
+    """批量订阅超时未就绪的合约，就绪后启动策略、收到行情并被调度"""
+    path = str(tmp_path / 'replay')
+    write_klines(path, ('A', ))
+    write_klines(path, ('B', ), seed=2, start='2022-09-23 09:01:00')
+    engine = Engine(
+        replay_config(path,
+                      strategies=f'{__name__}:Counted',
+                      subscribe=dict(batch=True, timeout=0)))
+    # 订阅请求的第一次更新中只有A收到数据
+    assert engine.subscription.pending == {'B'}
+    engine.setup()
+    assert [s.symbol for s in engine.strategies] == ['A']
+    assert engine._start_ready in engine.stages
+    api = engine.tq.api
+    Counted.calls.clear()
+    steps = 0
+    while engine.subscription.pending:
+        assert api.wait_update()
+        engine.step()
+        steps += 1
+    assert steps > 1
+    b = engine.strategies[-1]
+    assert b.symbol == 'B' and len(engine.strategies) == 2
+    assert b.kline.to_pandas() is engine.klines_dict['B']
+    assert not math.isnan(b.quote.last_price)
+    # B在就绪的那次更新中执行，之前只有A执行
+    assert {s for s, _ in Counted.calls[:-1]} == {'A'}
+    assert Counted.calls[-1] == ('B', 0)
+    assert engine._start_ready not in engine.stages
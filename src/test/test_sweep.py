@@ -0,0 +1,30 @@
+#!/usr/bin/env python
+#-*- coding: utf-8 -*-
+#FILE: test_sweep.py
+#CREATE_TIME: 2026-10-18
+#AUTHOR: Sancho
+"""
+参数扫描测试
+"""
+
+import os
+from backtest import load_klines
+from sweep import grid, sweep
+
+GRID = {'NDAY': [3, 5], 'K1': [0.2, 0.5]}
+
+
+def test_grid():
+    assert grid({'a': [1, 2], 'b': [3]}) == [{'a': 1, 'b': 3}, {'a': 2, 'b': 3}]
+
+
+def test_sort_direction(replay_path):
+    """收益类指标降序，回撤升序，最好的结果在前"""
+    data = load_klines(os.path.join(replay_path, 'kline_20', 'A'))
+    rows = sweep(data, 'DualThrust', GRID, 2, 'max_drawdown')
+    assert len(rows) == 4
+    drawdowns = [r['max_drawdown'] for r in rows]
+    assert drawdowns == sorted(drawdowns)
+    rows = sweep(data, 'DualThrust', GRID, 2, 'pnl')
+    pnls = [r['pnl'] for r in rows]
+    assert pnls == sorted(pnls, reverse=True)
@@ -0,0 +1,124 @@
+#!/usr/bin/env python
+#-*- coding: utf-8 -*-
+#FILE: test_trade.py
+#CREATE_TIME: 2026-10-18
+#AUTHOR: Sancho
+"""
+目标持仓轧差和多账户分配测试
+"""
+
+from types import SimpleNamespace
+import pytest
+from trade import AccountsTask, Netting, Trade, allocate
+
+
+class Demo:
+    pass
+
+
+class DualThrust:
+    pass
+
+
+class FakeTask:
+    def __init__(self, api, symbol, *args, account=None) -> None:
+        self.api = api
+        self.symbol = symbol
+        self.account = account
+        self.volumes = []  # 每次设置的目标持仓
+
+    def set_target_volume(self, volume: int) -> None:
+        self.volumes.append(volume)
+
+
+class FakeApi:
+    """多账户的天勤API，持仓由测试直接修改"""
+    TargetPosTask = FakeTask
+
+    def __init__(self) -> None:
+        self._positions = {}
+
+    def get_account(self, account=None):
+        return SimpleNamespace()
+
+    def get_order(self, account=None):
+        return {}
+
+    def get_position(self, symbol=None, account=None):
+        key = (symbol, account)
+        if key not in self._positions:
+            self._positions[key] = SimpleNamespace(pos=0)
+        return self._positions[key]
+
+
+def test_allocate():
+    assert allocate(5, [1, 1]) == [3, 2]
+    assert allocate(-4, [3, 1]) == [-3, -1]
+    assert sum(allocate(7, [1, 2, 4])) == 7
+    with pytest.raises(ValueError):
+        allocate(1, [0, 0])
+
+
+def test_netting_policies():
+    a, b = Demo(), DualThrust()
+    netting = Netting()
+    netting.update('A', a, 2)
+    netting.update('A', b, -3)
+    assert netting.net() == [('A', -1)]
+    assert netting.net() == []  # 没有新目标时不重复下达
+    netting = Netting('weighted', weights={'Demo': 0.5})
+    netting.update('A', a, 3)
+    netting.update('A', b, 1)
+    assert netting.net() == [('A', 2)]  # round(1.5 + 1)
+    netting = Netting('priority', priority=['DualThrust'])
+    netting.update('A', b, 4)
+    netting.update('A', a, -2)
+    assert netting.net() == [('A', 4)]
+    with pytest.raises(ValueError):
+        Netting('max')
+
+
+def test_netting_state_roundtrip():
+    a, b = Demo(), DualThrust()
+    netting = Netting()
+    netting.update('task', a, 2)
+    netting.update('task', b, 1)
+    netting.net()
+    state = netting.state(lambda k: 'A', lambda s: type(s).__name__)
+    assert state == {'A': [('Demo', 2), ('DualThrust', 1)]}
+    restored = Netting()
+    restored.restore(state, {'A': 'task'}, {'Demo': a, 'DualThrust': b})
+    assert restored.net() == [('task', 3)]
+
+
+def test_accounts_task():
+    """每个账户收到分配的目标，分配不变的账户不重复下达，持仓达到后为`filled`"""
+    api = FakeApi()
+    quotes = {'A': SimpleNamespace(instrument_id='SHFE.a')}
+    trade = Trade(api, quotes, ['acc1', 'acc2'], ratios=[2, 1])
+    task = trade.set_trades()['A']
+    assert isinstance(task, AccountsTask)
+    assert [t.account for t in task.tasks] == ['acc1', 'acc2']
+    assert {t.symbol for t in task.tasks} == {'SHFE.a'}
+    trade.trading(task, 3)
+    assert [t.volumes for t in task.tasks] == [[2], [1]]
+    trade.trading(task, 4)  # 4 -> [3, 1]，第二个账户不变
+    assert [t.volumes for t in task.tasks] == [[2, 3], [1]]
+    trade.trading(task, 4)  # 总目标不变，不再下达
+    assert [t.volumes for t in task.tasks] == [[2, 3], [1]]
+    assert [s['filled'] for s in task.status()] == [False, False]
+    assert trade.pending()
+    api.get_position('SHFE.a', 'acc1').pos = 3
+    api.get_position('SHFE.a', 'acc2').pos = 1
+    assert [s['filled'] for s in task.status()] == [True, True]
+    assert not trade.pending()
+
+
+def test_risk_only_with_limits():
+    """`config.yml`中的风控上限全为0时不创建风控"""
+    api = FakeApi()
+    quotes = {'A': SimpleNamespace(instrument_id='SHFE.a')}
+    risk = dict(action='clip', max_position=0, max_exposure=0, window=60)
+    assert Trade(api, quotes, ['acc'], risk=risk).risk is None
+    risk['max_position'] = 2
+    assert Trade(api, quotes, ['acc'], risk=risk).risk is not None